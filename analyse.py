@@ -1,6 +1,9 @@
 from datetime import date
+from instrumentation import instrumented
+from database import day_key, week_key, key_to_date, week_label, fetch_streak_state, resolve_connection
 
 
+@instrumented
 def current_streak_calculation(db, name,periodicity):
     """
        Calculate the current streak for a given habit and store streak_count and the message to print for the app-user in a dictionary.
@@ -10,21 +13,19 @@ def current_streak_calculation(db, name,periodicity):
        :param periodicity: Periodicity of the habit ("daily" or "weekly").
        :return: Dictionary with the current streak details.
        """
-    cur = db.cursor()
     today = date.today()
     # create dictionary template
     streak_dict = {"current_streak": 0, "message": "", "periodicity": periodicity}
+    # the materialized streak state holds the streak ending in the last checked-off period
+    state = fetch_streak_state(db, name)
 
     # update dictionary template with correct input
     if periodicity == "daily":
-        # check if a streak exists
-        cur.execute("SELECT 1 FROM check_offs WHERE habit_name=? AND check_off_date=?", (name, str(today)))
-        bool = cur.fetchone()
-        if not bool:
+        # check if a streak exists, it has to include today
+        if state is None or state[1] != day_key(today):
             streak_dict["message"] = f"\nCurrent Streak: Check \"{name}\" off today to continue or start a streak."
         else:
-            cur.execute("SELECT streak_day_count FROM check_offs WHERE habit_name=? AND check_off_date=?", (name, str(today)))
-            streak = cur.fetchone()[0]
+            streak = state[0]
             streak_dict["current_streak"] = streak
             # differentiate between a streak that just started and anything else
             if streak == 1:
@@ -33,17 +34,11 @@ def current_streak_calculation(db, name,periodicity):
                 streak_dict["message"] = f"\nCurrent Streak: Well done! You've kept your \"{name}\"-streak alive for {streak} consecutive days already."
 
     else:  # periodicity == "weekly"
-        year, week, _ = today.isocalendar()
-        calendar_week = f"{week}-{year}"
-
-        # check if a streak exists
-        cur.execute("SELECT 1 FROM check_offs WHERE habit_name=? AND calendar_week=?", (name, calendar_week))
-        bool = cur.fetchone()
-        if not bool:
+        # check if a streak exists, it has to include this week
+        if state is None or state[1] != week_key(today):
             streak_dict["message"] = f"\nCurrent Streak: Check \"{name}\" off this week to continue or start a streak."
         else:
-            cur.execute("SELECT streak_week_count FROM check_offs WHERE habit_name=? AND calendar_week=?", (name, calendar_week))
-            streak = cur.fetchone()[0]
+            streak = state[0]
             streak_dict["current_streak"] = streak
             # differentiate between a streak that just started and anything else
             if streak == 1:
@@ -54,6 +49,7 @@ def current_streak_calculation(db, name,periodicity):
     return streak_dict
 
 
+@instrumented
 def longest_streak_calculation(db, name, periodicity):
     """
     Calculate the longest streak for a given habit and store streak_count and the message to print for the app-user in a dictionary.
@@ -63,27 +59,20 @@ def longest_streak_calculation(db, name, periodicity):
     :param periodicity: Periodicity of the habit ("daily" or "weekly").
     :return: Dictionary with the longest streak details.
     """
-    cur = db.cursor()
     today = date.today()
     # create dictionary template
     streak_dict = {"longest_streak": 0, "message": "", "periodicity": periodicity}
+    # the materialized streak state holds the record, the end of its most recent occurrence and the number of ties
+    state = fetch_streak_state(db, name)
 
     # update dictionary template with correct input
     if periodicity == "daily":
-        cur.execute("SELECT 1 FROM check_offs WHERE habit_name=? AND streak_day_count >= 1", (name,))
-        bool = cur.fetchone()
-        if not bool:
+        if state is None:
             streak_dict["message"] = f"\nLongest Streak: You haven't started checking off \"{name}\" yet."
         else:
-            # fetch all entries with the maximum streak_count and their respective check_off_date
-            cur.execute("SELECT streak_day_count, check_off_date FROM check_offs WHERE habit_name = ? "
-                        "AND streak_day_count = (SELECT MAX(streak_day_count) FROM check_offs WHERE habit_name = ?) "
-                        "ORDER BY check_off_date DESC", (name, name))
-            fetch = cur.fetchall()
-            streak = fetch[0][0]
-            streak_last_date = fetch[0][1] # last check_off date of last streak
+            _, _, streak, streak_last_key, nr_of_occasions = state
+            streak_last_date = str(key_to_date(streak_last_key, "daily")) # last check_off date of last streak
             streak_dict["longest_streak"] = streak
-            nr_of_occasions = len(fetch) # how many different longest streaks
 
             # differentiate between 1 vs many longest streaks AND longest=current vs longest!=current
             if nr_of_occasions == 1:
@@ -98,31 +87,23 @@ def longest_streak_calculation(db, name, periodicity):
                     streak_dict["message"] = f"\nLongest Streak: You've had {nr_of_occasions} separate longest streaks of {streak} day(s) for \"{name}\", with the most recent one ending on {streak_last_date}."
 
     else:  # periodicity == "weekly"   analogue to daily procedure
-        year, week, _ = today.isocalendar()
-        calendar_week = f"{week}-{year}"
+        this_week = week_key(today)
 
-        cur.execute("SELECT 1 FROM check_offs WHERE habit_name=? AND streak_week_count >= 1", (name,))
-        bool = cur.fetchone()
-        if not bool:
+        if state is None:
             streak_dict["message"] = f"\nLongest Streak: You haven't started checking off \"{name}\" yet."
         else:
-            cur.execute("SELECT streak_week_count, calendar_week FROM check_offs WHERE habit_name = ? "
-                        "AND streak_week_count = (SELECT MAX(streak_week_count) FROM check_offs WHERE habit_name = ?) "
-                        "ORDER BY check_off_date DESC", (name, name))
-            fetch = cur.fetchall()
-            streak = fetch[0][0]
-            streak_last_week = fetch[0][1]
+            _, _, streak, streak_last_key, nr_of_occasions = state
+            streak_last_week = week_label(streak_last_key)
             streak_dict["longest_streak"] = streak
-            nr_of_occasions = len(fetch)
 
             # differentiate between 1 vs many longest streaks AND ongoing longest=current vs longest!=current
             if nr_of_occasions == 1:
-                if streak_last_week == calendar_week:
+                if streak_last_key == this_week:
                     streak_dict["message"] = f"\nLongest Streak: Your longest \"{name}\"-streak is {streak} week(s) and is still going. Don't stop here."
                 else:
                     streak_dict["message"] = f"\nLongest Streak: Your longest \"{name}\"-streak was {streak} week(s) and ended in week: {streak_last_week}."
             else:
-                if streak_last_week == calendar_week:
+                if streak_last_key == this_week:
                     streak_dict["message"] = f"\nLongest Streak: You've had {nr_of_occasions} separate longest streaks of {streak} week(s) for \"{name}\". Check it off next week to set a new record."
                 else:
                     streak_dict["message"] = f"\nLongest Streak: You've had {nr_of_occasions} separate longest streaks of {streak} week(s) for \"{name}\", with the most recent one ending in week: {streak_last_week}."
@@ -130,6 +111,16 @@ def longest_streak_calculation(db, name, periodicity):
     return streak_dict
 
 
+def _record_streak(cur, periodicity):
+    """
+    Longest streak across all habits of one periodicity, read from the streak state.
+    """
+    cur.execute("SELECT MAX(longest_streak) FROM habit_streak_state JOIN habits USING (habit_id) WHERE periodicity = ?",
+                (periodicity,))
+    return cur.fetchone()[0]
+
+
+@instrumented
 def hyper_streak_daily(db):
     """
     Fetch all longest daily streaks across all daily habits.
@@ -137,11 +128,12 @@ def hyper_streak_daily(db):
     :param db: SQLite database connection object.
     :return: List of dictionaries containing habit name, streak count, and last date.
     """
-    cur = db.cursor()
+    cur = resolve_connection(db).cursor()
+    # the record comes from the streak state, its occurrences are index seeks on (habit_id, streak_day_count)
     cur.execute(
-        "SELECT habit_name, streak_day_count, check_off_date FROM check_offs "
-        "WHERE streak_day_count = (SELECT MAX(streak_day_count) FROM check_offs) "
-        "ORDER BY check_off_date")
+        "SELECT name, streak_day_count, check_off_date FROM check_offs JOIN habits USING (habit_id) "
+        "WHERE habit_id IN (SELECT habit_id FROM habit_streak_state WHERE longest_streak = ?) "
+        "AND streak_day_count = ? ORDER BY check_off_date", (_record_streak(cur, "daily"),) * 2)
     fetch = cur.fetchall()
 
     # Check if no results were found
@@ -156,6 +148,7 @@ def hyper_streak_daily(db):
     return longest_streaks
 
 
+@instrumented
 def hyper_streak_weekly(db):
     """
     Fetch all longest weekly streaks across habits.
@@ -163,11 +156,11 @@ def hyper_streak_weekly(db):
     :param db: SQLite database connection object.
     :return: List of dictionaries containing habit name, streak count, last week, and last date.
     """
-    cur = db.cursor()
+    cur = resolve_connection(db).cursor()
     cur.execute(
-        "SELECT habit_name, streak_week_count, calendar_week, check_off_date FROM check_offs "
-        "WHERE streak_week_count = (SELECT MAX(streak_week_count) FROM check_offs) "
-        "ORDER BY check_off_date")
+        "SELECT name, streak_week_count, period_key, check_off_date FROM check_offs JOIN habits USING (habit_id) "
+        "WHERE habit_id IN (SELECT habit_id FROM habit_streak_state WHERE longest_streak = ?) "
+        "AND streak_week_count = ? ORDER BY check_off_date", (_record_streak(cur, "weekly"),) * 2)
     fetch = cur.fetchall()
 
     # Check if no results were found
@@ -177,6 +170,37 @@ def hyper_streak_weekly(db):
     # Collect all longest streaks in a list of dictionaries
     longest_streaks = []
     for row in fetch:
-        longest_streaks.append({"habit": row[0], "streak": row[1], "last_week": row[2], "last_date": row[3]})
+        longest_streaks.append({"habit": row[0], "streak": row[1], "last_week": week_label(row[2]), "last_date": row[3]})
 
     return longest_streaks
+
+
+@instrumented
+def dashboard(db, today=None):
+    """
+    Streak overview of all habits in one set-based query instead of several lookups per habit.
+
+    :param db: SQLite database connection object or ConnectionPool.
+    :param today: Reference date, defaults to today's date.
+    :return: List of dictionaries with habit, periodicity, current_streak, longest_streak, last_check_off (date string
+             or None) and due (True if not yet checked off today/this week), ordered like the statistics menu.
+    """
+    if today is None:
+        today = date.today()
+    cur = resolve_connection(db).cursor()
+    # the streak state gives both streaks, the (habit_id, period_key) index the date of the last check-off
+    cur.execute("""SELECT h.name, h.periodicity, s.current_streak, s.longest_streak, c.check_off_date,
+            s.last_period_key = CASE h.periodicity WHEN 'weekly' THEN ? ELSE ? END AS done
+        FROM habits h
+        LEFT JOIN habit_streak_state s ON s.habit_id = h.habit_id
+        LEFT JOIN check_offs c ON c.habit_id = h.habit_id AND c.period_key = s.last_period_key
+        ORDER BY h.periodicity, h.name COLLATE NOCASE""", (week_key(today), day_key(today)))
+
+    overview = []
+    for name, periodicity, current_streak, longest_streak, last_check_off, done in cur.fetchall():
+        overview.append({"habit": name, "periodicity": periodicity,
+                         "current_streak": current_streak if done else 0,
+                         "longest_streak": longest_streak or 0,
+                         "last_check_off": last_check_off,
+                         "due": not done})
+    return overview
@@ -0,0 +1,219 @@
+"""
+Completion rates and trends over time windows, for all habits at once.
+
+Everything is computed by SQLite with window functions over the (habit_id, period_key) index of check_offs: one query
+per report, the Python side only shapes the result rows. Windows count periods, days for daily and ISO weeks for
+weekly habits. Every report ends on an explicit `as_of` date and ignores later check-offs, so it can be reproduced.
+A habit's history starts at its first check-off, like streak_engine.streak_summary, and habits that were never
+checked off count the whole window.
+"""
+from datetime import date
+from itertools import groupby
+from instrumentation import instrumented
+from database import day_key, week_key, key_to_date, week_label, resolve_connection
+
+WINDOWS = (7, 30, 90, 365)
+
+# period key of `as_of` and first check-off key up to it, for every habit
+_HABIT_BOUNDS = """bounds(periodicity, as_of_key) AS (VALUES ('daily', :day), ('weekly', :week)),
+    habit_bounds AS MATERIALIZED (
+        SELECT h.habit_id, h.name, h.periodicity, b.as_of_key,
+            (SELECT MIN(period_key) FROM check_offs c WHERE c.habit_id = h.habit_id AND c.period_key <= b.as_of_key)
+                AS first_key
+        FROM habits h JOIN bounds b USING (periodicity)
+        WHERE :periodicity IS NULL OR h.periodicity = :periodicity)"""
+
+# one grouped pass over the check-offs in the longest window counts every window in its own FILTER column,
+# _completion_rates_query fills in {windows}, {counts} and {picks} for the number of windows. The pass is driven by
+# habits in habit_id order, so grouping needs no sort of the check-offs.
+_COMPLETION_RATES = """WITH bounds(periodicity, as_of_key) AS (VALUES ('daily', :day), ('weekly', :week)),
+    windows(position, length) AS (VALUES {windows}),
+    window_counts AS (
+        SELECT h.habit_id, h.name, h.periodicity, b.as_of_key,
+            (SELECT MIN(period_key) FROM check_offs f WHERE f.habit_id = h.habit_id AND f.period_key <= b.as_of_key)
+                AS first_key,
+            {counts}
+        FROM habits h CROSS JOIN bounds b LEFT JOIN check_offs c ON c.habit_id = h.habit_id
+            AND c.period_key BETWEEN b.as_of_key - :longest + 1 AND b.as_of_key
+        WHERE h.periodicity = b.periodicity AND (:periodicity IS NULL OR h.periodicity = :periodicity)
+        GROUP BY h.habit_id),
+    counted AS (
+        SELECT wc.habit_id, wc.name, wc.periodicity, w.length, CASE w.position {picks} END AS check_offs,
+            wc.as_of_key - MAX(wc.as_of_key - w.length + 1, COALESCE(wc.first_key, wc.as_of_key - w.length + 1)) + 1
+                AS periods
+        FROM window_counts wc CROSS JOIN windows w)
+    SELECT length, name, periodicity, check_offs, periods, CAST(check_offs AS REAL) / periods AS rate,
+        RANK() OVER (PARTITION BY length, periodicity ORDER BY CAST(check_offs AS REAL) / periods DESC) AS rank
+    FROM counted
+    ORDER BY length, periodicity, name COLLATE NOCASE, habit_id"""
+
+# periods before a habit's first check-off are NULL, AVG skips them
+_ROLLING_COMPLETION = f"""WITH RECURSIVE offsets(n) AS (SELECT 0 UNION ALL SELECT n + 1 FROM offsets WHERE n + 1 < :span),
+    {_HABIT_BOUNDS},
+    series AS (
+        SELECT hb.habit_id, hb.name, hb.periodicity, hb.as_of_key, hb.as_of_key - o.n AS key,
+            CASE WHEN hb.as_of_key - o.n < hb.first_key THEN NULL
+                ELSE EXISTS (SELECT 1 FROM check_offs c WHERE c.habit_id = hb.habit_id AND c.period_key = hb.as_of_key - o.n)
+            END AS done
+        FROM habit_bounds hb CROSS JOIN offsets o),
+    rolled AS (
+        SELECT habit_id, name, periodicity, as_of_key, key, done,
+            AVG(done) OVER (PARTITION BY habit_id ORDER BY key ROWS BETWEEN :window - 1 PRECEDING AND CURRENT ROW)
+                AS rate
+        FROM series)
+    SELECT habit_id, name, periodicity, key, done, rate FROM rolled
+    WHERE key > as_of_key - :periods
+    ORDER BY periodicity, name COLLATE NOCASE, habit_id, key"""
+
+# every ISO week covers 7 daily or 1 weekly period, cut to the habit's history and to `as_of`
+_WEEKLY_TREND = f"""WITH RECURSIVE offsets(n) AS (SELECT 0 UNION ALL SELECT n + 1 FROM offsets WHERE n + 1 < :span),
+    {_HABIT_BOUNDS},
+    weeks AS (
+        SELECT hb.habit_id, hb.name, hb.periodicity, hb.as_of_key, hb.first_key, :week - o.n AS week,
+            CASE hb.periodicity WHEN 'weekly' THEN :week - o.n ELSE (:week - o.n) * 7 - 3 END AS first_period,
+            CASE hb.periodicity WHEN 'weekly' THEN :week - o.n ELSE (:week - o.n) * 7 + 3 END AS last_period
+        FROM habit_bounds hb CROSS JOIN offsets o),
+    buckets AS (
+        SELECT habit_id, name, periodicity, week, MAX(first_period, COALESCE(first_key, first_period)) AS low,
+            MIN(last_period, as_of_key) AS high
+        FROM weeks),
+    counted AS (
+        SELECT habit_id, name, periodicity, week, MAX(high - low + 1, 0) AS periods,
+            (SELECT COUNT(*) FROM check_offs c WHERE c.habit_id = b.habit_id AND c.period_key BETWEEN low AND high)
+                AS check_offs
+        FROM buckets b),
+    rates AS (
+        SELECT *, CASE WHEN periods > 0 THEN CAST(check_offs AS REAL) / periods END AS rate FROM counted),
+    trend AS (
+        SELECT habit_id, name, periodicity, week, check_offs, periods, rate,
+            rate - LAG(rate) OVER (PARTITION BY habit_id ORDER BY week) AS delta
+        FROM rates)
+    SELECT habit_id, name, periodicity, week, check_offs, periods, rate, delta FROM trend
+    WHERE week > :week - :weeks
+    ORDER BY periodicity, name COLLATE NOCASE, habit_id, week"""
+
+
+def _parameters(as_of, periodicity):
+    if as_of is None:
+        as_of = date.today()
+    return {"day": day_key(as_of), "week": week_key(as_of), "periodicity": periodicity}
+
+
+def _completion_rates_query(count):
+    """
+    _COMPLETION_RATES for `count` windows, bound as :window_0, :window_1, ...
+    """
+    positions = range(count)
+    return _COMPLETION_RATES.format(
+        windows=", ".join(f"({position}, :window_{position})" for position in positions),
+        counts=", ".join(f"COUNT(c.period_key) FILTER (WHERE c.period_key > b.as_of_key - :window_{position}) "
+                         f"AS count_{position}" for position in positions),
+        picks=" ".join(f"WHEN {position} THEN wc.count_{position}" for position in positions))
+
+
+def _completion_rates(db, windows, as_of, periodicity):
+    """
+    Rows (window, habit, periodicity, check_offs, periods, rate, rank) of all windows, from one query.
+    """
+    windows = list(windows)
+    if not windows:
+        return []
+    parameters = {**_parameters(as_of, periodicity), "longest": max(windows),
+                  **{f"window_{position}": window for position, window in enumerate(windows)}}
+    cur = resolve_connection(db).cursor()
+    cur.execute(_completion_rates_query(len(windows)), parameters)
+    return cur.fetchall()
+
+
+@instrumented
+def completion_rates(db, window, as_of=None, periodicity=None):
+    """
+    Completion rate of every habit over its last `window` periods up to `as_of`, in one query.
+
+    :param db: SQLite database connection object or ConnectionPool.
+    :param window: Number of periods, e.g. 30 for the last 30 days of daily and the last 30 weeks of weekly habits.
+    :param as_of: Last date of the window, defaults to today's date.
+    :param periodicity: Only "daily" or "weekly" habits, None for all habits.
+    :return: List of dictionaries with habit, periodicity, check_offs, periods (window periods since the first
+             check-off), completion_rate and rank (1 for the best rate among the habits of the same periodicity),
+             ordered like the statistics menu.
+    """
+    return [{"habit": name, "periodicity": habit_periodicity, "check_offs": check_offs, "periods": periods,
+             "completion_rate": rate, "rank": rank}
+            for _, name, habit_periodicity, check_offs, periods, rate, rank
+            in _completion_rates(db, [window], as_of, periodicity)]
+
+
+@instrumented
+def completion_report(db, windows=WINDOWS, as_of=None, periodicity=None):
+    """
+    Completion rates over several windows, all of them counted in one query.
+
+    :param db: SQLite database connection object or ConnectionPool.
+    :param windows: Window lengths in periods.
+    :param as_of: Last date of the windows, defaults to today's date.
+    :param periodicity: Only "daily" or "weekly" habits, None for all habits.
+    :return: List of dictionaries with habit, periodicity and completion_rates (dictionary window -> rate).
+    """
+    report = {}
+    for window, name, habit_periodicity, _, _, rate, _ in _completion_rates(db, windows, as_of, periodicity):
+        row = report.setdefault(name, {"habit": name, "periodicity": habit_periodicity, "completion_rates": {}})
+        row["completion_rates"][window] = rate
+    return list(report.values())
+
+
+@instrumented
+def rolling_completion(db, window=7, periods=30, as_of=None, periodicity=None):
+    """
+    Rolling average of the completion over the trailing `window` periods, for the last `periods` periods of every
+    habit, in one query. Missed periods count as 0, periods before the first check-off are left out of the average.
+
+    :param db: SQLite database connection object or ConnectionPool.
+    :param window: Periods per average.
+    :param periods: Number of periods returned per habit, ending with the period of `as_of`.
+    :param as_of: Last date, defaults to today's date.
+    :param periodicity: Only "daily" or "weekly" habits, None for all habits.
+    :return: List of dictionaries with habit, periodicity and the lists periods (first date of every period),
+             checked_off (True, False or None before the first check-off) and rolling_rate (None before the first
+             check-off).
+    """
+    cur = resolve_connection(db).cursor()
+    cur.execute(_ROLLING_COMPLETION, {**_parameters(as_of, periodicity), "window": window, "periods": periods,
+                                      "span": periods + window - 1})
+    rolling = []
+    # names may differ only by case and sort together, the rows of one habit are grouped by its id
+    for _, rows in groupby(cur.fetchall(), key=lambda row: row[0]):
+        rows = list(rows)
+        _, name, habit_periodicity = rows[0][:3]
+        rolling.append({"habit": name, "periodicity": habit_periodicity,
+                        "periods": [key_to_date(row[3], habit_periodicity) for row in rows],
+                        "checked_off": [None if row[4] is None else bool(row[4]) for row in rows],
+                        "rolling_rate": [row[5] for row in rows]})
+    return rolling
+
+
+@instrumented
+def weekly_trend(db, weeks=12, as_of=None, periodicity=None):
+    """
+    Completion rate per ISO week and the change against the week before, for the last `weeks` weeks of every habit,
+    in one query. The week of `as_of` only counts the days up to it.
+
+    :param db: SQLite database connection object or ConnectionPool.
+    :param weeks: Number of weeks returned per habit, ending with the week of `as_of`.
+    :param as_of: Last date, defaults to today's date.
+    :param periodicity: Only "daily" or "weekly" habits, None for all habits.
+    :return: List of dictionaries with habit, periodicity and weeks, a list of dictionaries with week ("week-year"),
+             check_offs, periods, completion_rate and delta (week-over-week change of the rate; None for weeks
+             before the first check-off and for the first week after it).
+    """
+    cur = resolve_connection(db).cursor()
+    cur.execute(_WEEKLY_TREND, {**_parameters(as_of, periodicity), "weeks": weeks, "span": weeks + 1})
+    trend = []
+    for _, rows in groupby(cur.fetchall(), key=lambda row: row[0]):
+        rows = list(rows)
+        _, name, habit_periodicity = rows[0][:3]
+        trend.append({"habit": name, "periodicity": habit_periodicity,
+                      "weeks": [{"week": week_label(week), "check_offs": check_offs, "periods": week_periods,
+                                 "completion_rate": rate, "delta": delta}
+                                for _, _, _, week, check_offs, week_periods, rate, delta in rows]})
+    return trend
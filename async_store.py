@@ -0,0 +1,136 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from analyse import current_streak_calculation, longest_streak_calculation, hyper_streak_daily, hyper_streak_weekly, dashboard
+from database import ConnectionPool, add_habit, check_off_habit, check_off_many
+
+
+class AsyncHabitStore:
+    """
+    asyncio facade over the blocking database and analyse functions.
+    Writes run on a single writer thread with its own connection, reads on a bounded pool of reader threads with one
+    connection each (WAL mode lets them read while the writer commits), so a slow query never blocks the event loop.
+    At most `max_pending` calls are queued or running at a time, further callers wait without holding a thread.
+    """
+
+    def __init__(self, name="main.db", readers=4, max_pending=64, timeout=None, busy_timeout=5000, synchronous="NORMAL"):
+        """
+        :param name: The name of the database file, default is "main.db".
+        :param readers: Number of reader threads/connections.
+        :param max_pending: Maximum number of calls queued or running at once.
+        :param timeout: Default timeout in seconds for every call, None waits forever.
+        :param busy_timeout: Milliseconds a connection waits for a lock before raising.
+        :param synchronous: PRAGMA synchronous mode of the connections.
+        """
+        self._pool = ConnectionPool(name, busy_timeout, synchronous)
+        self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="habit-reader")
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="habit-writer")
+        self._slots = asyncio.Semaphore(max_pending)
+        self.timeout = timeout
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _run(self, executor, function, args, timeout):
+        """
+        Run function(connection, *args) on one of the executor's threads.
+        On timeout or cancellation a call that hasn't started yet is dropped, and a running statement is interrupted
+        (a write is then rolled back as a whole). The call keeps its slot until its thread is done with it.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        lock = threading.Lock()
+        # the connection while the job runs; set and cleared under the lock, so an interrupt never reaches a later
+        # call on the same thread-local connection
+        state = {"db": None, "abandoned": False}
+
+        def job():
+            with lock:
+                if state["abandoned"]:
+                    return None
+                state["db"] = db = self._pool.connection()
+            try:
+                return function(db, *args)
+            finally:
+                with lock:
+                    state["db"] = None
+
+        await self._slots.acquire()
+        try:
+            submitted = executor.submit(job)
+        except BaseException:
+            self._slots.release()
+            raise
+        submitted.add_done_callback(lambda _: loop.call_soon_threadsafe(self._slots.release))
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(submitted), timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            with lock:
+                state["abandoned"] = True
+                if state["db"] is not None:
+                    state["db"].interrupt()
+            raise
+
+    async def read(self, function, *args, timeout=None):
+        """
+        Run any blocking read function(db, *args) on a reader connection.
+
+        :param function: Function taking a SQLite database connection as first argument.
+        :param timeout: Timeout in seconds, defaults to the store's timeout.
+        :return: The function's return value.
+        """
+        return await self._run(self._readers, function, args, timeout)
+
+    async def write(self, function, *args, timeout=None):
+        """
+        Run any blocking write function(db, *args) on the writer connection.
+
+        :param function: Function taking a SQLite database connection as first argument.
+        :param timeout: Timeout in seconds, defaults to the store's timeout.
+        :return: The function's return value.
+        """
+        return await self._run(self._writer, function, args, timeout)
+
+    async def add_habit(self, name, description, periodicity, create_date=None, timeout=None):
+        """Async database.add_habit."""
+        return await self.write(add_habit, name, description, periodicity, create_date, timeout=timeout)
+
+    async def check_off_habit(self, name, periodicity, check_off_date=None, check_off_time=None, timeout=None):
+        """Async database.check_off_habit."""
+        return await self.write(check_off_habit, name, periodicity, check_off_date, check_off_time, timeout=timeout)
+
+    async def check_off_many(self, records, timeout=None):
+        """Async database.check_off_many."""
+        return await self.write(check_off_many, list(records), timeout=timeout)
+
+    async def current_streak_calculation(self, name, periodicity, timeout=None):
+        """Async analyse.current_streak_calculation."""
+        return await self.read(current_streak_calculation, name, periodicity, timeout=timeout)
+
+    async def longest_streak_calculation(self, name, periodicity, timeout=None):
+        """Async analyse.longest_streak_calculation."""
+        return await self.read(longest_streak_calculation, name, periodicity, timeout=timeout)
+
+    async def hyper_streak_daily(self, timeout=None):
+        """Async analyse.hyper_streak_daily."""
+        return await self.read(hyper_streak_daily, timeout=timeout)
+
+    async def hyper_streak_weekly(self, timeout=None):
+        """Async analyse.hyper_streak_weekly."""
+        return await self.read(hyper_streak_weekly, timeout=timeout)
+
+    async def dashboard(self, today=None, timeout=None):
+        """Async analyse.dashboard."""
+        return await self.read(dashboard, today, timeout=timeout)
+
+    async def close(self):
+        """
+        Wait for running calls, then shut down the threads and close all connections.
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._writer.shutdown)
+        await loop.run_in_executor(None, self._readers.shutdown)
+        self._pool.close()
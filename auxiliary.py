@@ -47,7 +47,10 @@ Welcome to the Habit Tracker Help Center! Below you’ll find guidance on how to
 - Select this option to delete a habit and all its related data, including check-offs.  
 - Be careful — this action cannot be undone.  
 
-\033[1m4. Statistics Menu\033[22m  
+\033[1m4. Rename Habit\033[22m  
+- Give a habit a new name, its check-offs and streaks are kept.  
+
+\033[1m5. Statistics Menu\033[22m  
 Dive deeper into your habits and streaks with the following options:  
 1. \033[1mView Your Habits:\033[22m  
    - Display all habits or habits with the same periodicity (daily or weekly).  
@@ -60,13 +63,13 @@ Dive deeper into your habits and streaks with the following options:
    - See your longest overall streaks for both daily and weekly habits.  
    - In case of a tie, it shows all of the longest streaks.
 
-\033[1m5. Helpcenter\033[22m  
+\033[1m6. Helpcenter\033[22m  
 - Displays this guide.  
 
-\033[1m5. Mock Data\033[22m  
+\033[1m7. Mock Data\033[22m  
 - Load (or delete) preconfigured mock data to explore and fully understand the app's functionality. 
 
-\033[1m6. Exit\033[22m  
+\033[1m8. Exit\033[22m  
 - Close the application.  
 
 ---
@@ -0,0 +1,136 @@
+"""
+Nightly batch job: record streaks and longest streaks of many per-user databases, computed in parallel.
+
+Run from the repository root:
+    python batch.py /srv/habits --workers 8 --output report.json
+"""
+import argparse
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from urllib.parse import quote
+from analyse import hyper_streak_daily, hyper_streak_weekly
+from database import SCHEMA_VERSION
+
+
+def find_databases(paths, pattern="*.db"):
+    """
+    Expand directories into the database files they contain.
+
+    :param paths: Database files and/or directories.
+    :param pattern: Glob pattern of database files inside directories.
+    :return: Sorted list of database paths.
+    """
+    databases = []
+    for path in paths:
+        path = Path(path)
+        if path.is_dir():
+            databases.extend(str(file) for file in path.glob(pattern) if file.is_file())
+        else:
+            databases.append(str(path))
+    return sorted(databases)
+
+
+def open_read_only(path):
+    """
+    Open an existing database read-only, so the job can neither change nor lock out the user's data.
+
+    :param path: Path of the database file.
+    :return: SQLite database connection.
+    """
+    return sqlite3.connect(f"file:{quote(os.path.abspath(path))}?mode=ro", uri=True)
+
+
+def analyse_database(path):
+    """
+    Record streaks and per-habit longest streaks of one database. Runs in a worker process.
+
+    :param path: Path of the database file.
+    :return: Dictionary with path, hyper_streak_daily, hyper_streak_weekly and longest_streaks (habit -> streak), or
+             path and error if the database can't be read.
+    """
+    try:
+        db = open_read_only(path)
+        try:
+            version = db.execute("PRAGMA user_version").fetchone()[0]
+            if version != SCHEMA_VERSION:
+                # read-only connections can't migrate, the app upgrades the file the next time it opens it
+                return {"path": path, "error": f"schema version {version}, expected {SCHEMA_VERSION}"}
+            longest_streaks = dict(db.execute("SELECT name, longest_streak FROM habit_streak_state "
+                                              "JOIN habits USING (habit_id) ORDER BY name"))
+            return {
+                "path": path,
+                "hyper_streak_daily": hyper_streak_daily(db),
+                "hyper_streak_weekly": hyper_streak_weekly(db),
+                "longest_streaks": longest_streaks,
+            }
+        finally:
+            db.close()
+    except sqlite3.Error as error:
+        return {"path": path, "error": str(error)}
+
+
+def recompute_all(paths, workers=None, chunk_size=None):
+    """
+    Analyse many databases on a pool of worker processes.
+
+    :param paths: Database paths.
+    :param workers: Number of worker processes, defaults to the number of CPUs.
+    :param chunk_size: Databases sent to a worker at once, defaults to about four chunks per worker, which keeps the
+                       inter-process overhead low while the workers still finish at about the same time.
+    :return: List of analyse_database results in the order of `paths`.
+    """
+    paths = list(paths)
+    workers = workers or os.cpu_count() or 1
+    if chunk_size is None:
+        chunk_size = max(1, len(paths) // (workers * 4))
+    if workers == 1:
+        return [analyse_database(path) for path in paths]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(analyse_database, paths, chunksize=chunk_size))
+
+
+def build_report(results, seconds=None):
+    """
+    Aggregate the results of all databases into one report.
+
+    :param results: List of analyse_database results.
+    :param seconds: Runtime of the job, stored in the summary if given.
+    :return: Dictionary with summary and databases.
+    """
+    failed = [result for result in results if "error" in result]
+    summary = {"databases": len(results), "failed": len(failed)}
+    for periodicity in ("daily", "weekly"):
+        records = [result[f"hyper_streak_{periodicity}"][0]["streak"] for result in results
+                   if result.get(f"hyper_streak_{periodicity}")]
+        summary[f"best_{periodicity}_streak"] = max(records, default=0)
+    summary["habits"] = sum(len(result.get("longest_streaks", {})) for result in results)
+    if seconds is not None:
+        summary["seconds"] = seconds
+    return {"summary": summary, "databases": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("paths", nargs="+", help="database files or directories containing them")
+    parser.add_argument("--pattern", default="*.db", help="database file pattern inside directories")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, defaults to the CPU count")
+    parser.add_argument("--chunk-size", type=int, default=None, help="databases per task sent to a worker")
+    parser.add_argument("--output", default="report.json", help="path of the JSON report")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    paths = find_databases(args.paths, args.pattern)
+    results = recompute_all(paths, args.workers, args.chunk_size)
+    report = build_report(results, time.perf_counter() - start)
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"{report['summary']['databases']} databases ({report['summary']['failed']} failed) "
+          f"in {report['summary']['seconds']:.2f} s, report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Load test for AsyncHabitStore: event-loop latency while concurrent check-offs run.
+
+Run from the repository root:
+    python -m benchmarks.async_load --concurrency 10 100 1000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+
+from async_store import AsyncHabitStore
+
+HABITS = 50
+
+
+async def heartbeat(stop, lags, interval=0.001):
+    """Record how late every sleep(interval) wakes up, i.e. how long the event loop was blocked."""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def run(path, concurrency):
+    """
+    Fire `concurrency` check-offs at once and measure the loop latency meanwhile.
+
+    :return: Tuple (seconds, lags).
+    """
+    async with AsyncHabitStore(path) as store:
+        for number in range(HABITS):
+            await store.add_habit(f"habit {number}", "load test", "daily")
+        stop, lags = asyncio.Event(), []
+        ticker = asyncio.create_task(heartbeat(stop, lags))
+        start = time.perf_counter()
+        await asyncio.gather(*(store.check_off_habit(f"habit {i % HABITS}", "daily",
+                                                     date(2024, 1, 1) + timedelta(days=i // HABITS), "08:00")
+                               for i in range(concurrency)))
+        seconds = time.perf_counter() - start
+        stop.set()
+        await ticker
+    return seconds, lags
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 100, 1000])
+    args = parser.parse_args()
+
+    print(f"{'concurrent':>10} {'ops/s':>10} {'lag p50 ms':>11} {'lag p99 ms':>11} {'lag max ms':>11}")
+    for concurrency in args.concurrency:
+        with tempfile.TemporaryDirectory() as tmp:
+            seconds, lags = asyncio.run(run(os.path.join(tmp, "load.db"), concurrency))
+        lags = sorted(lags) or [0.0]
+        p99 = lags[min(len(lags) - 1, int(len(lags) * 0.99))]
+        print(f"{concurrency:>10} {concurrency / seconds:>10.0f} {statistics.median(lags) * 1000:>11.3f} "
+              f"{p99 * 1000:>11.3f} {lags[-1] * 1000:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
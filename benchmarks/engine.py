@@ -0,0 +1,55 @@
+"""
+Benchmark the vectorized streak engine: ranking many habits at once.
+
+Run from the repository root:
+    python -m benchmarks.engine --habits 100000 --periods 30
+"""
+import argparse
+import time
+from datetime import date
+
+import numpy as np
+
+from database import get_db, day_key
+from streak_engine import load_period_keys, compute_streaks, streak_summary
+
+
+def synthetic_history(habits, periods, seed=0):
+    """
+    Sorted habit_ids/keys arrays where every habit is checked off in about 70 % of `periods` consecutive periods.
+    """
+    rng = np.random.default_rng(seed)
+    checked = rng.random((habits, periods)) < 0.7
+    habit_ids, offsets = np.nonzero(checked)
+    return habit_ids.astype(np.int64), offsets.astype(np.int64) + day_key(date(2024, 1, 1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--habits", type=int, default=100_000)
+    parser.add_argument("--periods", type=int, default=30)
+    args = parser.parse_args()
+
+    habit_ids, keys = synthetic_history(args.habits, args.periods)
+    start = time.perf_counter()
+    compute_streaks(habit_ids, keys)
+    print(f"compute_streaks: {args.habits} habits, {len(keys)} check-offs in {time.perf_counter() - start:.3f} s")
+
+    db = get_db(":memory:")
+    db.executemany("INSERT INTO habits (habit_id, name, description, periodicity, create_date) VALUES (?, ?, ?, ?, ?)",
+                   ((h + 1, f"habit {h:06}", "benchmark habit", "daily", "2024-01-01") for h in range(args.habits)))
+    db.executemany("INSERT INTO check_offs (habit_id, check_off_date, check_off_time, period_key) VALUES (?, ?, ?, ?)",
+                   ((h + 1, "2024-01-01", "08:00", k) for h, k in zip(habit_ids.tolist(), keys.tolist())))
+    db.commit()
+
+    start = time.perf_counter()
+    load_period_keys(db)
+    print(f"load_period_keys: {time.perf_counter() - start:.3f} s")
+    start = time.perf_counter()
+    streak_summary(db, today=date(2024, 1, 1), limit=100)
+    print(f"streak_summary (load + rank, top 100): {time.perf_counter() - start:.3f} s")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Compare check-offs keyed by habit name (schema version 4) with integer habit_id keys (version 5): file size and the
+latency of per-habit lookups, renames and deletes.
+
+Run from the repository root:
+    python -m benchmarks.habit_ids --habits 10000 --days 365
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from database import MIGRATIONS, create_tables, get_db, delete_habit, rename_habit
+
+NAMED_SCHEMA_VERSION = 4
+NAMED_LOOKUP = ("SELECT check_off_date, period_key FROM check_offs WHERE habit_name = ? AND period_key > ? "
+                "ORDER BY period_key LIMIT 500")
+ID_LOOKUP = ("SELECT check_off_date, period_key FROM check_offs WHERE habit_id = "
+             "(SELECT habit_id FROM habits WHERE name = ?) AND period_key > ? ORDER BY period_key LIMIT 500")
+
+
+def habit_name(h):
+    return f"tenant {h % 1000:03} habit {h:06} - daily practice"
+
+
+def build_named_database(path, habits, days):
+    """
+    Create a schema version 4 database with `days` consecutive daily check-offs per habit.
+    """
+    db = sqlite3.connect(path)
+    create_tables(db)
+    cur = db.cursor()
+    for migration in MIGRATIONS[:NAMED_SCHEMA_VERSION]:
+        migration(cur)
+    cur.execute(f"PRAGMA user_version = {NAMED_SCHEMA_VERSION}")
+    cur.executemany("INSERT INTO habits VALUES (?, ?, ?, ?)",
+                    ((habit_name(h), "benchmark habit", "daily", "2024-01-01") for h in range(habits)))
+    cur.executemany("INSERT INTO check_offs (habit_name, check_off_date, check_off_time, period_key, streak_day_count) "
+                    "VALUES (?, date(? * 86400, 'unixepoch'), '08:00', ?, ?)",
+                    ((habit_name(h), 19723 + d, 19723 + d, d + 1) for h in range(habits) for d in range(days)))
+    cur.executemany("INSERT INTO habit_streak_state VALUES (?, ?, ?, ?, ?, ?)",
+                    ((habit_name(h), days, 19723 + days - 1, days, 19723 + days - 1, 1) for h in range(habits)))
+    db.commit()
+    db.close()
+
+
+def file_size(path):
+    """
+    Size in MB after VACUUM, so free pages left behind by the migration don't count.
+    """
+    db = sqlite3.connect(path)
+    db.execute("VACUUM")
+    db.close()
+    return os.path.getsize(path) / 1e6
+
+
+def time_calls(call, names):
+    start = time.perf_counter()
+    for name in names:
+        call(name)
+    return (time.perf_counter() - start) / len(names) * 1000
+
+
+def run(habits, days, repeat):
+    """
+    :return: Dictionary with the file sizes (MB), the migration time (s) and the operation latencies (ms).
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        named_path, id_path = os.path.join(tmp, "named.db"), os.path.join(tmp, "ids.db")
+        build_named_database(named_path, habits, days)
+        results["named size MB"] = file_size(named_path)
+        shutil.copy(named_path, id_path)
+
+        start = time.perf_counter()
+        get_db(id_path).close()
+        results["migration s"] = time.perf_counter() - start
+        results["id size MB"] = file_size(id_path)
+
+        step = max(1, habits // repeat)
+        names = [habit_name(h) for h in range(0, habits, step)][:repeat]
+        renamed, deleted = names[:len(names) // 2], names[len(names) // 2:]
+
+        db = sqlite3.connect(named_path)
+
+        def named_rename(name):
+            # the name is repeated in every check-off row, all of them change
+            with db:
+                for table, column in (("habits", "name"), ("check_offs", "habit_name"),
+                                      ("habit_streak_state", "habit_name")):
+                    db.execute(f"UPDATE {table} SET {column} = ? WHERE {column} = ?", (name + " (renamed)", name))
+
+        def named_delete(name):
+            with db:
+                db.execute("DELETE FROM habits WHERE name = ?", (name,))
+                db.execute("DELETE FROM check_offs WHERE habit_name = ?", (name,))
+                db.execute("DELETE FROM habit_streak_state WHERE habit_name = ?", (name,))
+
+        results["named lookup ms"] = time_calls(lambda name: db.execute(NAMED_LOOKUP, (name, 0)).fetchall(), names)
+        results["named rename ms"] = time_calls(named_rename, renamed)
+        results["named delete ms"] = time_calls(named_delete, deleted)
+        db.close()
+
+        db = get_db(id_path)
+        results["id lookup ms"] = time_calls(lambda name: db.execute(ID_LOOKUP, (name, 0)).fetchall(), names)
+        results["id rename ms"] = time_calls(lambda name: rename_habit(db, name, name + " (renamed)"), renamed)
+        results["id delete ms"] = time_calls(lambda name: delete_habit(db, name), deleted)
+        db.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--habits", type=int, default=10_000)
+    parser.add_argument("--days", type=int, default=365, help="check-offs per habit")
+    parser.add_argument("--repeat", type=int, default=100, help="habits timed per operation")
+    args = parser.parse_args()
+
+    results = run(args.habits, args.days, args.repeat)
+    print(f"{args.habits} habits x {args.days} check-offs, migrated in {results['migration s']:.1f} s")
+    print(f"{'':<10} {'by name':>10} {'by id':>10}")
+    print(f"{'size MB':<10} {results['named size MB']:>10.1f} {results['id size MB']:>10.1f}")
+    for operation in ("lookup", "rename", "delete"):
+        print(f"{operation + ' ms':<10} {results[f'named {operation} ms']:>10.3f} {results[f'id {operation} ms']:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
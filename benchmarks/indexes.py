@@ -0,0 +1,103 @@
+"""
+Benchmark the per-operation latency of the check-off hot paths without and with the check_offs indexes.
+
+Run from the repository root:
+    python -m benchmarks.indexes --rows 10000 100000 1000000
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import date, timedelta
+
+from analyse import current_streak_calculation, longest_streak_calculation, hyper_streak_daily
+from database import get_db, check_off_habit, check_off_many
+
+HABITS = 100
+START = date(2000, 1, 1)
+
+
+def build_database(path, rows):
+    """
+    Create a database holding `rows` daily check-offs spread over HABITS habits.
+
+    :param path: File path of the database to create.
+    :param rows: Total number of check-off rows.
+    """
+    db = get_db(path)
+    per_habit = rows // HABITS
+    db.executemany("INSERT INTO habits (name, description, periodicity, create_date) VALUES (?, ?, ?, ?)",
+                   [(f"habit {h}", "benchmark habit", "daily", str(START)) for h in range(HABITS)])
+    db.commit()
+    check_off_many(db, ((f"habit {h}", START + timedelta(days=d), "08:00") for h in range(HABITS) for d in range(per_habit)))
+    db.close()
+    return per_habit
+
+
+def time_operations(db, per_habit, repeat):
+    """
+    Time the hot paths on an open connection.
+
+    :return: Dictionary mapping operation name to mean latency in milliseconds.
+    """
+    results = {}
+    names = [f"habit {h}" for h in range(repeat)]
+    # every check-off extends a streak, so it has to read the previous day's row
+    next_day = START + timedelta(days=per_habit)
+    operations = {
+        "check_off_habit": lambda name: check_off_habit(db, name, "daily", next_day, "09:00"),
+        "current_streak_calculation": lambda name: current_streak_calculation(db, name, "daily"),
+        "longest_streak_calculation": lambda name: longest_streak_calculation(db, name, "daily"),
+        "hyper_streak_daily": lambda name: hyper_streak_daily(db),
+    }
+    for operation, call in operations.items():
+        start = time.perf_counter()
+        for name in names:
+            call(name)
+        results[operation] = (time.perf_counter() - start) / len(names) * 1000
+    return results
+
+
+def run(rows, repeat):
+    """
+    Benchmark one database size with the secondary check_offs indexes dropped and after recreating them.
+
+    :return: Tuple of (before, after) result dictionaries.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        per_habit = build_database(path, rows)
+
+        db = sqlite3.connect(path)
+        indexes = db.execute("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = 'check_offs' "
+                             "AND sql IS NOT NULL").fetchall()
+        for name, _ in indexes:
+            db.execute(f"DROP INDEX {name}")
+        before = time_operations(db, per_habit, repeat)
+        db.execute("DELETE FROM check_offs WHERE check_off_date = ?", (str(START + timedelta(days=per_habit)),))
+
+        for _, sql in indexes:
+            db.execute(sql)
+        db.commit()
+        after = time_operations(db, per_habit, repeat)
+        db.close()
+    return before, after
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=20, help="operations timed per measurement (max %d)" % HABITS)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10}  {'operation':<28} {'before ms':>10} {'after ms':>10} {'speed-up':>9}")
+    for rows in args.rows:
+        before, after = run(rows, min(args.repeat, HABITS))
+        for operation in before:
+            speed_up = before[operation] / after[operation] if after[operation] else float("inf")
+            print(f"{rows:>10}  {operation:<28} {before[operation]:>10.3f} {after[operation]:>10.3f} {speed_up:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Compare the memory of many habits held as plain objects, as __slots__ Habit objects and as a HabitCollection.
+
+Run from the repository root:
+    python -m benchmarks.memory --habits 1000000
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+from database import get_db
+from habit import Habit, HabitCollection
+
+
+class PlainHabit:
+    """The habit object as it was before __slots__: every instance carries a __dict__."""
+
+    def __init__(self, name, description, periodicity, create_date=None):
+        self.name = name
+        self.description = description
+        self.periodicity = periodicity
+        self.create_date = create_date
+
+
+def measure(build):
+    """
+    Build a structure and report the memory it holds on to and the peak while building it.
+
+    :return: Tuple (structure, megabytes, peak megabytes, seconds).
+    """
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    structure = build()
+    seconds = time.perf_counter() - start
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return structure, size / 1024 ** 2, peak / 1024 ** 2, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--habits", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    db = get_db(":memory:")
+    db.executemany("INSERT INTO habits (name, description, periodicity, create_date) VALUES (?, ?, ?, ?)",
+                   ((f"tenant {h % 1000:03} habit {h:07}", f"benchmark habit {h % 50}", ("daily", "weekly")[h % 2],
+                     f"2024-{h % 12 + 1:02}-{h % 28 + 1:02}") for h in range(args.habits)))
+    db.commit()
+    query = "SELECT name, description, periodicity, create_date FROM habits"
+
+    variants = {
+        "list of plain objects": lambda: [PlainHabit(*row) for row in db.execute(query)],
+        "list of __slots__ Habit": lambda: [Habit(*row) for row in db.execute(query)],
+        "HabitCollection": lambda: HabitCollection.from_db(db),
+    }
+    print(f"{args.habits} habits")
+    print(f"{'structure':<26} {'MB':>10} {'peak MB':>10} {'load s':>8}")
+    for label, build in variants.items():
+        structure, megabytes, peak, seconds = measure(build)
+        print(f"{label:<26} {megabytes:>10.1f} {peak:>10.1f} {seconds:>8.2f}")
+        del structure
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
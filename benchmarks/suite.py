@@ -0,0 +1,189 @@
+"""
+Benchmark suite for the database and analyse hot paths, with a baseline to catch performance regressions.
+
+Run from the repository root:
+    python -m benchmarks.suite --habits 100 --years 5 --output results.json
+    python -m benchmarks.suite --baseline results.json --threshold 0.25
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from analyse import current_streak_calculation, longest_streak_calculation, hyper_streak_daily, hyper_streak_weekly
+from database import get_db, add_habit, check_off_habit, check_off_many, display_check_offs_table
+
+END = date(2024, 12, 31)
+STEP = {"daily": timedelta(days=1), "weekly": timedelta(weeks=1)}
+BACKENDS = ("memory", "disk")
+
+
+def synthetic_habits(habits, years, seed=0, rate=0.8):
+    """
+    Generate N habits × M years of check-offs ending on END, every other habit weekly.
+    Every period is checked off with probability `rate`, so the history has streaks of varying length.
+
+    :param habits: Number of habits.
+    :param years: Years of history per habit.
+    :param seed: Random seed, the same arguments always give the same data.
+    :param rate: Probability that a period is checked off.
+    :return: Tuple (habits, check_offs): lists of (name, description, periodicity, create_date) and
+             (name, check_off_date, check_off_time) records.
+    """
+    rng = random.Random(seed)
+    start = END - timedelta(days=365 * years)
+    habit_rows, check_offs = [], []
+    for h in range(habits):
+        name = f"habit {h:05}"
+        periodicity = "weekly" if h % 2 else "daily"
+        habit_rows.append((name, "benchmark habit", periodicity, str(start)))
+        day = start
+        while day <= END:
+            if rng.random() < rate:
+                check_offs.append((name, day, f"{rng.randrange(24):02}:{rng.randrange(60):02}"))
+            day += STEP[periodicity]
+    return habit_rows, check_offs
+
+
+def build_database(db, habits, check_offs):
+    """
+    Store the synthetic habits and check-offs in a freshly created database.
+    """
+    db.executemany("INSERT INTO habits (name, description, periodicity, create_date) VALUES (?, ?, ?, ?)", habits)
+    db.commit()
+    check_off_many(db, check_offs)
+
+
+def _measure(call, arguments):
+    """
+    Call `call` once per argument tuple and return the single latencies in milliseconds.
+    """
+    latencies = []
+    for args in arguments:
+        start = time.perf_counter()
+        call(*args)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def time_operations(db, habits, repeat):
+    """
+    Time every hot path `repeat` times on an open database.
+
+    :param db: SQLite database connection object holding the synthetic data.
+    :param habits: The synthetic habit rows stored in the database.
+    :param repeat: Number of calls per operation, spread over different habits.
+    :return: Dictionary mapping operation name to {"mean_ms", "median_ms", "min_ms", "calls"}.
+    """
+    sample = [habits[i % len(habits)] for i in range(repeat)]
+    # check off the period after END of distinct habits, so every call is a real insert extending a streak
+    appends = list({name: (name, periodicity) for name, _, periodicity, _ in sample}.values())
+    operations = {
+        "add_habit": (add_habit, [(f"new habit {i}", "benchmark habit", "daily", str(END)) for i in range(repeat)]),
+        "check_off_habit": (check_off_habit, [(name, periodicity, END + STEP[periodicity], "08:00")
+                                              for name, periodicity in appends]),
+        "current_streak_calculation": (current_streak_calculation, [(name, p) for name, _, p, _ in sample]),
+        "longest_streak_calculation": (longest_streak_calculation, [(name, p) for name, _, p, _ in sample]),
+        "hyper_streak_daily": (hyper_streak_daily, [()] * repeat),
+        "hyper_streak_weekly": (hyper_streak_weekly, [()] * repeat),
+        "display_check_offs_table": (display_check_offs_table, [(name, p) for name, _, p, _ in sample]),
+    }
+    results = {}
+    for operation, (function, arguments) in operations.items():
+        latencies = _measure(lambda *args: function(db, *args), arguments)
+        results[operation] = {
+            "mean_ms": statistics.fmean(latencies),
+            "median_ms": statistics.median(latencies),
+            "min_ms": min(latencies),
+            "calls": len(latencies),
+        }
+    return results
+
+
+def run(habits, years, repeat, backends=BACKENDS, seed=0):
+    """
+    Run the suite against an in-memory and/or an on-disk database.
+
+    :return: JSON-serializable dictionary with the parameters ("meta") and the results per backend.
+    """
+    habit_rows, check_offs = synthetic_habits(habits, years, seed)
+    results = {}
+    for backend in backends:
+        with tempfile.TemporaryDirectory() as tmp:
+            db = get_db(":memory:" if backend == "memory" else os.path.join(tmp, "bench.db"))
+            build_database(db, habit_rows, check_offs)
+            results[backend] = time_operations(db, habit_rows, repeat)
+            db.close()
+    meta = {"habits": habits, "years": years, "check_offs": len(check_offs), "repeat": repeat, "seed": seed,
+            "python": platform.python_version(), "sqlite": sqlite3.sqlite_version}
+    return {"meta": meta, "results": results}
+
+
+def compare(results, baseline, threshold, min_delta_ms=0.05):
+    """
+    Compare median latencies to a baseline run.
+
+    :param results: Output of run().
+    :param baseline: Output of an earlier run() with the same parameters.
+    :param threshold: Allowed slowdown as a fraction, 0.2 allows medians up to 20 % above the baseline.
+    :param min_delta_ms: Slowdowns below this many milliseconds are timer noise and never count as regressions.
+    :return: List of (backend, operation, baseline_ms, current_ms) tuples for every regression.
+    """
+    regressions = []
+    for backend, operations in results["results"].items():
+        for operation, timing in operations.items():
+            reference = baseline["results"].get(backend, {}).get(operation)
+            if reference is None:
+                continue
+            slowdown = timing["median_ms"] - reference["median_ms"]
+            if slowdown > reference["median_ms"] * threshold and slowdown > min_delta_ms:
+                regressions.append((backend, operation, reference["median_ms"], timing["median_ms"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--habits", type=int, default=100)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=50, help="calls timed per operation")
+    parser.add_argument("--backend", choices=BACKENDS, nargs="+", default=list(BACKENDS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--min-delta", type=float, default=0.05, help="ignore slowdowns below this many ms")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown against the baseline (0.2 = 20 %%)")
+    args = parser.parse_args()
+
+    results = run(args.habits, args.years, args.repeat, args.backend, args.seed)
+    print(f"{results['meta']['habits']} habits, {results['meta']['check_offs']} check-offs")
+    print(f"{'backend':<8} {'operation':<28} {'median ms':>10} {'mean ms':>10} {'min ms':>10}")
+    for backend, operations in results["results"].items():
+        for operation, timing in operations.items():
+            print(f"{backend:<8} {operation:<28} {timing['median_ms']:>10.3f} {timing['mean_ms']:>10.3f} {timing['min_ms']:>10.3f}")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if baseline["meta"]["habits"] != args.habits or baseline["meta"]["years"] != args.years:
+            print("warning: the baseline was recorded with a different data size")
+        regressions = compare(results, baseline, args.threshold, args.min_delta)
+        for backend, operation, before, after in regressions:
+            print(f"REGRESSION {backend} {operation}: {before:.3f} ms -> {after:.3f} ms")
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions above {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import threading
+from collections import OrderedDict
+
+
+class HabitCache:
+    """
+    Bounded LRU cache of habit records plus the sorted habit name lists of the menus.
+    Habit metadata only changes through add_habit, delete_habit and the mock data loader, which invalidate the cache,
+    so lookups between those writes are served from memory. Thread-safe, one cache is shared by all connections of a
+    ConnectionPool. Writes by other processes aren't seen until the next invalidation.
+    """
+
+    def __init__(self, maxsize=256):
+        """
+        :param maxsize: Maximum number of habit records kept, the least recently used one is dropped first.
+        """
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._records = OrderedDict()
+        self._name_lists = {}
+        self._generation = 0  # bumped by invalidate(), a load that raced an invalidation isn't stored
+        self.hits = 0
+        self.misses = 0
+
+    def get_record(self, name, load):
+        """
+        Habit record of `name`, loaded with load(name) on a miss. None results aren't cached.
+        """
+        with self._lock:
+            record = self._records.get(name)
+            if record is not None:
+                self._records.move_to_end(name)
+                self.hits += 1
+                return record
+            self.misses += 1
+            generation = self._generation
+        record = load(name)
+        if record is not None:
+            with self._lock:
+                if generation != self._generation:
+                    return record
+                self._records[name] = record
+                if len(self._records) > self.maxsize:
+                    self._records.popitem(last=False)
+        return record
+
+    def get_names(self, order, load):
+        """
+        Sorted name list for the given ordering, loaded with load() on a miss.
+        Returns a new list on every call, so callers may extend it.
+        """
+        with self._lock:
+            names = self._name_lists.get(order)
+            if names is not None:
+                self.hits += 1
+                return list(names)
+            self.misses += 1
+            generation = self._generation
+        names = tuple(load())
+        with self._lock:
+            if generation == self._generation:
+                self._name_lists[order] = names
+        return list(names)
+
+    def invalidate(self):
+        """
+        Drop all cached records and name lists.
+        """
+        with self._lock:
+            self._generation += 1
+            self._records.clear()
+            self._name_lists.clear()
+
+    def stats(self):
+        """
+        :return: Dictionary with hits, misses, size (cached records) and maxsize.
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._records), "maxsize": self.maxsize}
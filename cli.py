@@ -0,0 +1,246 @@
+"""
+Non-interactive habit commands for scripts and cron jobs.
+
+Run from the repository root:
+    python cli.py add "read" --periodicity daily --description "20 pages"
+    python cli.py checkoff "read" "stretching" --date 2024-12-01
+    python cli.py stats --json
+    python cli.py report --as-of 2024-12-31 --windows 7 30
+    python cli.py import check_offs.csv
+    python cli.py rebuild-rollups
+"""
+import argparse
+import csv
+import json
+import re
+import sqlite3
+import sys
+from datetime import date, time
+from database import get_db, write_transaction, add_habit, check_off_habit, check_off_many, rebuild_rollups
+
+COMMANDS = ("add", "checkoff", "stats", "report", "import", "rebuild-rollups")
+# stats and report only read, they don't take the write lock
+WRITE_COMMANDS = ("add", "checkoff", "import", "rebuild-rollups")
+ERROR = "error"
+_TIME_FORMAT = re.compile(r"\d{2}:\d{2}(:\d{2})?")
+
+
+def iso_date(value):
+    """
+    Argument type of create dates: a valid YYYY-MM-DD date, kept as its ISO string.
+    """
+    return str(date.fromisoformat(value))
+
+
+def time_of_day(value):
+    """
+    Argument type of check-off times: a valid HH:MM (or HH:MM:SS) time, kept as given.
+    """
+    if not _TIME_FORMAT.fullmatch(value):
+        raise ValueError(f"invalid time {value!r}, expected HH:MM")
+    time.fromisoformat(value)
+    return value
+
+
+def _json_default(value):
+    # check-off results carry date objects for daily periods
+    return str(value)
+
+
+def command_add(db, args):
+    """
+    Add habits, skipping names that already exist.
+
+    :return: Dictionary with the add_habit result of every name.
+    """
+    return {"results": [add_habit(db, name, args.description, args.periodicity, args.create_date)
+                        for name in args.names]}
+
+
+def command_checkoff(db, args):
+    """
+    Check off habits for one date, unknown habits are reported as errors.
+
+    :return: Dictionary with the check_off_habit result (or an error) of every name.
+    """
+    results = []
+    for name in args.names:
+        habit = db.execute("SELECT periodicity FROM habits WHERE name = ?", (name,)).fetchone()
+        if habit is None:
+            results.append({"status": ERROR, "habit": name, "error": "unknown habit"})
+        else:
+            results.append(check_off_habit(db, name, habit[0], args.date, args.time))
+    return {"results": results}
+
+
+def command_stats(db, args):
+    """
+    Streak overview of all or the given habits.
+
+    :return: Dictionary with the analyse.dashboard entries.
+    """
+    from analyse import dashboard
+    overview = dashboard(db, args.today)
+    if args.names:
+        overview = [entry for entry in overview if entry["habit"] in args.names]
+    return {"habits": overview}
+
+
+def command_report(db, args):
+    """
+    Completion rates of all habits over several windows up to an as-of date.
+
+    :return: Dictionary with the as_of date and the analytics.completion_report entries.
+    """
+    from analytics import completion_report
+    as_of = args.as_of or date.today()
+    return {"as_of": as_of, "habits": completion_report(db, args.windows, as_of)}
+
+
+def command_import(db, args):
+    """
+    Bulk import check-offs from CSV rows of habit, date (YYYY-MM-DD) and optional time (HH:MM).
+    Rows of unknown habits are skipped and listed under "unknown".
+
+    :return: Dictionary with the check_off_many counts and the unknown habit names.
+    :raises ValueError: If a row has no date or an invalid one, nothing is imported then.
+    """
+    file = sys.stdin if args.file == "-" else open(args.file, newline="", encoding="utf-8")
+    try:
+        records = []
+        for line, row in enumerate(csv.reader(file), 1):
+            if not row or row[0].startswith("#"):
+                continue
+            if len(row) < 2:
+                raise ValueError(f"line {line}: expected habit,date[,time], got {','.join(row)!r}")
+            try:
+                check_off_date = date.fromisoformat(row[1])
+            except ValueError:
+                raise ValueError(f"line {line}: invalid date {row[1]!r}, expected YYYY-MM-DD") from None
+            check_off_time = row[2] if len(row) > 2 and row[2] else None
+            if check_off_time is not None:
+                try:
+                    time_of_day(check_off_time)
+                except ValueError:
+                    raise ValueError(f"line {line}: invalid time {check_off_time!r}, expected HH:MM") from None
+            records.append((row[0], check_off_date, check_off_time))
+    finally:
+        if file is not sys.stdin:
+            file.close()
+    habits = {name for (name,) in db.execute("SELECT name FROM habits")}
+    imported = check_off_many(db, records)
+    imported["unknown"] = sorted({name for name, _, _ in records if name not in habits})
+    return imported
+
+
+def command_rebuild_rollups(db, args):
+    """
+    Recompute the day and week rollups behind the calendar heatmaps from the check-offs.
+
+    :return: Dictionary with the rebuild_rollups row counts.
+    """
+    return rebuild_rollups(db)
+
+
+def _print_text(command, output):
+    """
+    Human-readable output for the terminal.
+    """
+    if command == "stats":
+        from prettytable import PrettyTable
+        table = PrettyTable()
+        table.field_names = ["Habit", "Periodicity", "Current", "Longest", "Last Check-Off", "Due"]
+        for entry in output["habits"]:
+            table.add_row([entry["habit"], entry["periodicity"], entry["current_streak"], entry["longest_streak"],
+                           entry["last_check_off"] or "-", "yes" if entry["due"] else "no"])
+        print(table)
+    elif command == "report":
+        from prettytable import PrettyTable
+        table = PrettyTable()
+        windows = output["habits"][0]["completion_rates"] if output["habits"] else {}
+        table.field_names = ["Habit", "Periodicity"] + [f"Last {window}" for window in windows]
+        for entry in output["habits"]:
+            table.add_row([entry["habit"], entry["periodicity"]] +
+                          [f"{rate:.0%}" for rate in entry["completion_rates"].values()])
+        print(f"Completion rates as of {output['as_of']} (days for daily, weeks for weekly habits)")
+        print(table)
+    elif "results" in output:
+        for result in output["results"]:
+            details = f" for {result['period']} (streak {result['streak_count']})" if result.get("streak_count") else ""
+            print(f"{result['habit']}: {result.get('error', result['status'])}{details}")
+    else:
+        print(", ".join(f"{key}: {value}" for key, value in output.items()))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="habit", description=__doc__.splitlines()[1])
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--db", default="main.db", help="database file, default main.db")
+    common.add_argument("--json", action="store_true", help="print the result as JSON")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    add = subparsers.add_parser("add", parents=[common], help="create habits")
+    add.add_argument("names", nargs="+")
+    add.add_argument("--periodicity", choices=["daily", "weekly"], required=True)
+    add.add_argument("--description", default="")
+    add.add_argument("--create-date", type=iso_date, default=None, help="YYYY-MM-DD, defaults to today")
+
+    checkoff = subparsers.add_parser("checkoff", parents=[common], help="check off habits")
+    checkoff.add_argument("names", nargs="+")
+    checkoff.add_argument("--date", type=date.fromisoformat, default=None, help="YYYY-MM-DD, defaults to today")
+    checkoff.add_argument("--time", type=time_of_day, default=None, help="HH:MM, defaults to now")
+
+    stats = subparsers.add_parser("stats", parents=[common], help="current and longest streaks")
+    stats.add_argument("names", nargs="*", help="only these habits")
+    stats.add_argument("--today", type=date.fromisoformat, default=None, help="reference date, defaults to today")
+
+    report = subparsers.add_parser("report", parents=[common], help="completion rates over time windows")
+    report.add_argument("--as-of", type=date.fromisoformat, default=None, help="last date, defaults to today")
+    report.add_argument("--windows", type=int, nargs="+", default=[7, 30, 90, 365], help="window lengths in periods")
+
+    import_ = subparsers.add_parser("import", parents=[common], help="bulk import check-offs from CSV (habit,date[,time])")
+    import_.add_argument("file", help='CSV file, "-" for stdin')
+
+    subparsers.add_parser("rebuild-rollups", parents=[common], help="recompute the check-off counts of the heatmaps")
+    return parser
+
+
+def main(argv=None):
+    """
+    Run one command on one connection, writing commands inside one transaction.
+    Invalid input (dates, CSV rows, missing files) rolls the transaction back and is reported as an error.
+
+    :param argv: Command-line arguments, defaults to sys.argv[1:].
+    :return: Exit status, 1 if any habit failed, a habit doesn't exist or the input is invalid.
+    """
+    args = build_parser().parse_args(argv)
+    handler = {"add": command_add, "checkoff": command_checkoff, "stats": command_stats, "report": command_report,
+               "import": command_import, "rebuild-rollups": command_rebuild_rollups}[args.command]
+    try:
+        db = get_db(args.db)
+        try:
+            if args.command in WRITE_COMMANDS:
+                # the handlers' writes join this transaction, so a whole invocation commits once
+                with write_transaction(db):
+                    output = handler(db, args)
+            else:
+                output = handler(db, args)
+        finally:
+            db.close()
+    except (ValueError, OSError, IndexError, sqlite3.Error) as error:
+        if args.json:
+            print(json.dumps({"status": ERROR, "error": str(error)}))
+        else:
+            print(f"error: {error}", file=sys.stderr)
+        return 1
+
+    if args.json:
+        print(json.dumps(output, default=_json_default))
+    else:
+        _print_text(args.command, output)
+    failed = any(result["status"] == ERROR for result in output.get("results", []))
+    return 1 if failed or output.get("unknown") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
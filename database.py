@@ -1,6 +1,114 @@
+import csv
+import logging
 import sqlite3
-from datetime import date, timedelta, datetime
-from prettytable import PrettyTable
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from abc import ABC, abstractmethod
+from datetime import date, datetime
+from instrumentation import instrumented
+from cache import HabitCache
+
+logger = logging.getLogger(__name__)
+
+# status of the result dictionaries of add_habit, check_off_habit and rename_habit
+INSERTED = "inserted"
+DUPLICATE = "duplicate"
+ALREADY_CHECKED_OFF = "already_checked_off"
+RENAMED = "renamed"
+
+# sources of habits, any other string (e.g. an import batch id) works as well
+SOURCE_USER = "user"
+SOURCE_PREDEFINED = "predefined"
+SOURCE_MOCK = "mock"
+
+# Period keys are plain integers so consecutive periods differ by exactly 1:
+# daily habits count days since 1970-01-01, weekly habits count ISO weeks since the Monday of the epoch's ISO week.
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+EPOCH_MONDAY_ORDINAL = date(1969, 12, 29).toordinal()
+STREAK_COLUMNS = {"daily": "streak_day_count", "weekly": "streak_week_count"}
+
+
+def day_key(day):
+    """
+    Epoch-day ordinal of a date, the period key of daily habits.
+
+    :param day: datetime.date object.
+    :return: Number of days since 1970-01-01.
+    """
+    return day.toordinal() - EPOCH_ORDINAL
+
+
+def week_key(day):
+    """
+    ISO-week ordinal of a date, the period key of weekly habits.
+
+    :param day: datetime.date object.
+    :return: Number of ISO weeks since the week containing 1970-01-01.
+    """
+    return (day.toordinal() - EPOCH_MONDAY_ORDINAL) // 7
+
+
+def period_key(day, periodicity):
+    """
+    Period key of a date for the given periodicity.
+
+    :param day: datetime.date object.
+    :param periodicity: Periodicity of the habit ("daily" or "weekly").
+    :return: Integer period key.
+    """
+    if periodicity == "weekly":
+        return week_key(day)
+    return day_key(day)
+
+
+def key_to_date(key, periodicity):
+    """
+    First date of the period identified by a period key (the Monday for weekly keys).
+
+    :param key: Integer period key.
+    :param periodicity: Periodicity of the habit ("daily" or "weekly").
+    :return: datetime.date object.
+    """
+    if periodicity == "weekly":
+        return date.fromordinal(EPOCH_MONDAY_ORDINAL + key * 7)
+    return date.fromordinal(EPOCH_ORDINAL + key)
+
+
+def week_label(key):
+    """
+    Display format "week-year" of a weekly period key, e.g. "46-2024".
+
+    :param key: Integer ISO-week ordinal.
+    :return: String with ISO calendar week and ISO year.
+    """
+    year, week, _ = key_to_date(key, "weekly").isocalendar()
+    return f"{week}-{year}"
+
+
+HABIT_CACHE_SIZE = 256
+
+
+class HabitConnection(sqlite3.Connection):
+    """
+    SQLite connection that carries the habit metadata cache of its database and remembers its trace and progress
+    callbacks, so the profiler can chain and restore them. Plain sqlite3 connections work everywhere as well, they
+    just read habits without caching.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.habit_cache = HabitCache(HABIT_CACHE_SIZE)
+        self.trace_callback = None
+        self.progress_handler = None  # (handler, n) tuple
+
+    def set_trace_callback(self, trace_callback):
+        super().set_trace_callback(trace_callback)
+        self.trace_callback = trace_callback
+
+    def set_progress_handler(self, progress_handler, n):
+        super().set_progress_handler(progress_handler, n)
+        self.progress_handler = None if progress_handler is None else (progress_handler, n)
 
 
 def get_db(name="main.db"):
@@ -10,11 +118,155 @@ def get_db(name="main.db"):
     :param name: The name of the database file, default is "main.db".
     :return: SQLite database connection.
     """
-    db = sqlite3.connect(name)
-    create_tables(db)
+    db = sqlite3.connect(name, factory=HabitConnection)
+    # an up-to-date database skips the CREATE TABLE IF NOT EXISTS round, new and old ones are set up or upgraded
+    if db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+        create_tables(db)
+        migrate(db)
+    # per connection and off by default: deleting a habit cascades to its check-offs and streak state
+    db.execute("PRAGMA foreign_keys = ON")
     return db
 
 
+class ConnectionPool:
+    """
+    Thread-safe access to one database file for multi-threaded services.
+    Every thread gets its own connection, opened on first use and reused afterwards. The schema is checked once per
+    pool, the database runs in WAL mode so readers don't block the writer, and busy_timeout makes writers wait for
+    each other instead of failing with "database is locked".
+    Every function in this module (and in analyse, loading and Habit) accepts a pool wherever it accepts a connection.
+    """
+
+    SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+    def __init__(self, name="main.db", busy_timeout=5000, synchronous="NORMAL"):
+        """
+        :param name: The name of the database file, default is "main.db".
+        :param busy_timeout: Milliseconds a connection waits for a lock before raising.
+        :param synchronous: PRAGMA synchronous mode, "NORMAL" is safe in WAL mode and skips most fsyncs.
+        """
+        if synchronous.upper() not in self.SYNCHRONOUS_MODES:
+            raise ValueError(f"synchronous must be one of {self.SYNCHRONOUS_MODES}, not {synchronous!r}")
+        self.name = name
+        self.busy_timeout = int(busy_timeout)
+        self.synchronous = synchronous.upper()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._schema_checked = False
+        self._connections = []
+        self.habit_cache = HabitCache(HABIT_CACHE_SIZE)  # shared by all threads, writes on any thread invalidate it
+
+    def connection(self):
+        """
+        Connection of the calling thread.
+
+        :return: SQLite database connection.
+        """
+        db = getattr(self._local, "db", None)
+        if db is None:
+            # check_same_thread is off so close() can clean up, the thread-local keeps every connection on its thread
+            db = sqlite3.connect(self.name, timeout=self.busy_timeout / 1000, check_same_thread=False,
+                                 factory=HabitConnection)
+            db.habit_cache = self.habit_cache
+            db.execute(f"PRAGMA busy_timeout = {self.busy_timeout}")
+            db.execute(f"PRAGMA synchronous = {self.synchronous}")
+            with self._lock:
+                if not self._schema_checked:
+                    db.execute("PRAGMA journal_mode = WAL")  # persisted in the database file
+                    create_tables(db)
+                    migrate(db)
+                    self._schema_checked = True
+                self._connections.append(db)
+            db.execute("PRAGMA foreign_keys = ON")
+            self._local.db = db
+        return db
+
+    def close(self):
+        """
+        Close all connections handed out by the pool.
+        """
+        with self._lock:
+            for db in self._connections:
+                db.close()
+            self._connections = []
+            self._local = threading.local()
+
+
+def resolve_connection(db):
+    """
+    Connection to work with: the calling thread's connection of a ConnectionPool, or the connection itself.
+
+    :param db: SQLite database connection or ConnectionPool.
+    :return: SQLite database connection.
+    :raises TypeError: For a StorageBackend, the SQL functions can't run on it.
+    """
+    if isinstance(db, StorageBackend):
+        raise TypeError(f"{type(db).__name__} only supports the StorageBackend functions, this one needs a SQLite "
+                        "database or ConnectionPool")
+    if isinstance(db, ConnectionPool):
+        return db.connection()
+    return db
+
+
+class StorageBackend(ABC):
+    """
+    Interface of the habit and check-off storage behind add_habit, check_off_habit, fetch_streak_state,
+    fetch_habit_from_db, iter_check_offs and delete_habit. A backend can be passed wherever these functions (and
+    Habit and the analyse streak functions built on them) take `db`. SQLite connections and pools are the default
+    storage, storage.SQLiteBackend wraps them in this interface and storage.MmapLogBackend is an append-only file.
+    All other functions in this module, analyse.hyper_streak_daily, hyper_streak_weekly and dashboard and the
+    analytics and rollups reports work on SQLite only and raise TypeError for a backend.
+    """
+
+    @abstractmethod
+    def add_habit(self, name, description, periodicity, create_date):
+        """Same contract as add_habit."""
+
+    @abstractmethod
+    def check_off(self, name, periodicity, check_off_date, check_off_time):
+        """Same contract as check_off_habit, with date and time already filled in."""
+
+    @abstractmethod
+    def streak_state(self, name):
+        """Same contract as fetch_streak_state."""
+
+    @abstractmethod
+    def habit(self, name):
+        """Same contract as fetch_habit_from_db."""
+
+    @abstractmethod
+    def check_offs(self, name, after=None):
+        """Same contract as iter_check_offs."""
+
+    @abstractmethod
+    def delete_habit(self, name):
+        """Same contract as delete_habit."""
+
+    def close(self):
+        """Release the storage."""
+
+
+@contextmanager
+def write_transaction(db):
+    """
+    Run a read-modify-write as one BEGIN IMMEDIATE transaction, committed on success and rolled back on errors.
+    Taking the write lock up front means concurrent writers queue on busy_timeout instead of deadlocking on a lock
+    upgrade, and no other writer can change the rows read in between. Inside an open transaction it simply joins it.
+
+    :param db: SQLite database connection.
+    """
+    if db.in_transaction:
+        yield
+        return
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        yield
+    except BaseException:
+        db.rollback()
+        raise
+    db.commit()
+
+
 def create_tables(db):
     """
     Creates the two tables for the actual habit tracking and one table to just store the flag for predefined habits upload.
@@ -33,7 +285,175 @@ def create_tables(db):
     db.commit()
 
 
-def add_habit(db, name, description, periodicity, create_date=None): #
+def _add_check_off_indexes(cur):
+    """
+    Schema version 1: covering indexes for the per-habit check-off lookups.
+    """
+    cur.execute("""CREATE INDEX IF NOT EXISTS idx_check_offs_habit_date
+        ON check_offs(habit_name, check_off_date, streak_day_count)""")
+    cur.execute("""CREATE INDEX IF NOT EXISTS idx_check_offs_habit_week
+        ON check_offs(habit_name, calendar_week, streak_week_count)""")
+    cur.execute("""CREATE INDEX IF NOT EXISTS idx_check_offs_habit_streak_day
+        ON check_offs(habit_name, streak_day_count, check_off_date)""")
+    cur.execute("""CREATE INDEX IF NOT EXISTS idx_check_offs_habit_streak_week
+        ON check_offs(habit_name, streak_week_count, calendar_week, check_off_date)""")
+
+
+def _add_period_keys(cur):
+    """
+    Schema version 2: replace the "week-year" text column calendar_week by an integer period_key for both periodicities.
+    """
+    cur.execute("ALTER TABLE check_offs ADD COLUMN period_key INTEGER")
+    # only weekly check-offs ever stored a calendar_week; the keys round down like day_key and week_key, also before 1970
+    cur.execute(f"""UPDATE check_offs SET period_key = CASE
+        WHEN calendar_week IS NULL THEN {ROLLUP_DAY_KEY} ELSE {ROLLUP_WEEK_KEY} END""")
+    cur.execute("DROP INDEX IF EXISTS idx_check_offs_habit_date")
+    cur.execute("DROP INDEX IF EXISTS idx_check_offs_habit_week")
+    cur.execute("DROP INDEX IF EXISTS idx_check_offs_habit_streak_day")
+    cur.execute("DROP INDEX IF EXISTS idx_check_offs_habit_streak_week")
+    cur.execute("ALTER TABLE check_offs DROP COLUMN calendar_week")
+    cur.execute("CREATE UNIQUE INDEX idx_check_offs_habit_period ON check_offs(habit_name, period_key)")
+    cur.execute("""CREATE INDEX idx_check_offs_habit_streak_day
+        ON check_offs(habit_name, streak_day_count, period_key)""")
+    cur.execute("""CREATE INDEX idx_check_offs_habit_streak_week
+        ON check_offs(habit_name, streak_week_count, period_key)""")
+
+
+def _add_streak_state(cur):
+    """
+    Schema version 3: materialized per-habit streak state, backfilled from the stored streak counts.
+    """
+    cur.execute("""CREATE TABLE habit_streak_state(habit_name TEXT PRIMARY KEY, current_streak INT,
+        last_period_key INT, longest_streak INT, longest_streak_end INT, longest_streak_ties INT)""")
+    cur.execute("""INSERT INTO habit_streak_state
+        SELECT habit_name,
+            (SELECT COALESCE(streak_day_count, streak_week_count) FROM check_offs c
+                WHERE c.habit_name = g.habit_name AND c.period_key = g.last_period_key),
+            last_period_key, longest_streak,
+            (SELECT MAX(period_key) FROM check_offs c
+                WHERE c.habit_name = g.habit_name AND COALESCE(streak_day_count, streak_week_count) = g.longest_streak),
+            (SELECT COUNT(*) FROM check_offs c
+                WHERE c.habit_name = g.habit_name AND COALESCE(streak_day_count, streak_week_count) = g.longest_streak)
+        FROM (SELECT habit_name, MAX(period_key) AS last_period_key,
+                MAX(COALESCE(streak_day_count, streak_week_count)) AS longest_streak
+              FROM check_offs GROUP BY habit_name) g""")
+
+
+def _add_habit_listing_index(cur):
+    """
+    Schema version 4: index in display order of the habits table, for keyset pagination.
+    """
+    cur.execute("CREATE INDEX idx_habits_listing ON habits(periodicity, create_date, name)")
+
+
+def _add_habit_ids(cur):
+    """
+    Schema version 5: integer habit_id keys instead of the habit name in check_offs and habit_streak_state.
+    Both reference habits(habit_id) with ON DELETE CASCADE, so deleting or renaming a habit touches its habits row
+    only. The tables are rebuilt (SQLite can't add a foreign key to an existing table), check-offs and streak states
+    of habits that don't exist anymore are dropped.
+    """
+    cur.execute("""CREATE TABLE habits_new(habit_id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE, description TEXT,
+        periodicity TEXT, create_date TEXT)""")
+    cur.execute("""INSERT INTO habits_new (name, description, periodicity, create_date)
+        SELECT name, description, periodicity, create_date FROM habits ORDER BY rowid""")
+    cur.execute("""CREATE TABLE check_offs_new(check_off_ID INTEGER PRIMARY KEY AUTOINCREMENT,
+        habit_id INTEGER NOT NULL REFERENCES habits(habit_id) ON DELETE CASCADE, check_off_date TEXT,
+        check_off_time TEXT, streak_day_count INT, streak_week_count INT, period_key INTEGER)""")
+    cur.execute("""INSERT INTO check_offs_new
+        SELECT c.check_off_ID, h.habit_id, c.check_off_date, c.check_off_time, c.streak_day_count, c.streak_week_count,
+            c.period_key
+        FROM check_offs c JOIN habits_new h ON h.name = c.habit_name""")
+    cur.execute("""CREATE TABLE habit_streak_state_new(
+        habit_id INTEGER PRIMARY KEY REFERENCES habits(habit_id) ON DELETE CASCADE, current_streak INT,
+        last_period_key INT, longest_streak INT, longest_streak_end INT, longest_streak_ties INT)""")
+    cur.execute("""INSERT INTO habit_streak_state_new
+        SELECT h.habit_id, s.current_streak, s.last_period_key, s.longest_streak, s.longest_streak_end,
+            s.longest_streak_ties
+        FROM habit_streak_state s JOIN habits_new h ON h.name = s.habit_name""")
+    for table in ("check_offs", "habit_streak_state", "habits"):
+        cur.execute(f"DROP TABLE {table}")
+        cur.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+    cur.execute("CREATE INDEX idx_habits_listing ON habits(periodicity, create_date, name)")
+    cur.execute("CREATE UNIQUE INDEX idx_check_offs_habit_period ON check_offs(habit_id, period_key)")
+    cur.execute("CREATE INDEX idx_check_offs_habit_streak_day ON check_offs(habit_id, streak_day_count, period_key)")
+    cur.execute("CREATE INDEX idx_check_offs_habit_streak_week ON check_offs(habit_id, streak_week_count, period_key)")
+
+
+def _add_habit_sources(cur):
+    """
+    Schema version 6: a source column tagging where a habit came from (SOURCE_USER, SOURCE_PREDEFINED, SOURCE_MOCK or
+    an import batch id), indexed so a whole batch is listed or deleted with one index range.
+    Predefined habits stored "predefined" as create date, they get their first check-off date (or today) instead.
+    """
+    cur.execute(f"ALTER TABLE habits ADD COLUMN source TEXT NOT NULL DEFAULT '{SOURCE_USER}'")
+    cur.execute("""UPDATE habits SET source = ?, create_date = COALESCE(
+            (SELECT MIN(check_off_date) FROM check_offs WHERE check_offs.habit_id = habits.habit_id), date('now', 'localtime'))
+        WHERE create_date = 'predefined'""", (SOURCE_PREDEFINED,))
+    cur.execute("UPDATE habits SET source = ? WHERE name LIKE 'MOCK - %'", (SOURCE_MOCK,))
+    cur.execute("CREATE INDEX idx_habits_source ON habits(source, periodicity, create_date, name)")
+
+
+# day and ISO-week key of a check-off row; the modulo rounds down, so weeks before 1970 get the right key too
+ROLLUP_DAY_KEY = "CAST(julianday(check_off_date) - 2440587.5 AS INTEGER)"
+ROLLUP_WEEK_KEY = f"(({ROLLUP_DAY_KEY} + 3 - (({ROLLUP_DAY_KEY} + 3) % 7 + 7) % 7) / 7)"
+
+
+def _fill_rollups(cur):
+    """
+    Count all stored check-offs into the empty rollup tables.
+    """
+    cur.execute(f"INSERT INTO habit_week_rollups SELECT habit_id, {ROLLUP_WEEK_KEY} AS week, COUNT(*) FROM check_offs "
+                "GROUP BY habit_id, week")
+    cur.execute("INSERT INTO week_rollups SELECT week_key, SUM(check_offs) FROM habit_week_rollups GROUP BY week_key")
+    cur.execute(f"INSERT INTO day_rollups SELECT {ROLLUP_DAY_KEY} AS day, COUNT(*) FROM check_offs GROUP BY day")
+
+
+def _add_check_off_rollups(cur):
+    """
+    Schema version 7: check-off counts per day and per ISO week over all habits and per ISO week of every habit, so
+    calendar heatmaps read one row per cell instead of every check-off. Every function in this module that writes
+    or deletes check-offs keeps them up to date, rebuild_rollups recomputes them.
+    """
+    cur.execute("CREATE TABLE day_rollups(day_key INTEGER PRIMARY KEY, check_offs INT NOT NULL)")
+    cur.execute("CREATE TABLE week_rollups(week_key INTEGER PRIMARY KEY, check_offs INT NOT NULL)")
+    cur.execute("""CREATE TABLE habit_week_rollups(
+        habit_id INTEGER NOT NULL REFERENCES habits(habit_id) ON DELETE CASCADE, week_key INTEGER NOT NULL,
+        check_offs INT NOT NULL, PRIMARY KEY (habit_id, week_key)) WITHOUT ROWID""")
+    _fill_rollups(cur)
+
+
+# Ordered schema upgrades. Step n brings a database from user_version n-1 to n, never reorder or edit shipped steps.
+MIGRATIONS = [_add_check_off_indexes, _add_period_keys, _add_streak_state, _add_habit_listing_index, _add_habit_ids,
+              _add_habit_sources, _add_check_off_rollups]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def migrate(db):
+    """
+    Bring the database schema up to SCHEMA_VERSION, using PRAGMA user_version to remember the applied steps.
+    Every step runs in its own transaction, so an existing database file is upgraded in place.
+
+    :param db: SQLite database connection.
+    :return: Schema version after the upgrade.
+    """
+    cur = db.cursor()
+    cur.execute("PRAGMA user_version")
+    version = cur.fetchone()[0]
+    for number in range(version + 1, SCHEMA_VERSION + 1):
+        cur.execute("BEGIN")
+        try:
+            MIGRATIONS[number - 1](cur)
+            cur.execute(f"PRAGMA user_version = {number}")  # pragmas don't accept parameters
+        except Exception:
+            db.rollback()
+            raise
+        db.commit()
+    return max(version, SCHEMA_VERSION)
+
+
+@instrumented
+def add_habit(db, name, description, periodicity, create_date=None, source=SOURCE_USER): #
     """
     Add a new habit to the database, ensuring the habit name is unique.
 
@@ -42,147 +462,615 @@ def add_habit(db, name, description, periodicity, create_date=None): #
     :param description: Description of the habit.
     :param periodicity: Periodicity of the habit ("daily" or "weekly").
     :param create_date: Date the habit was created, defaults to today's date.
+    :param source: Where the habit comes from, see delete_habits_by_source. Storage backends don't keep it.
+    :return: Dictionary with status (INSERTED or DUPLICATE) and habit.
     """
-    cur = db.cursor()
     if create_date is None:
         create_date = str(date.today())
-    # Check if habit already exists in the database
-    cur.execute("SELECT 1 FROM habits WHERE name=?", (name,))
-    if cur.fetchone():
-        print("Habit already exists") # delete
-        return
-    # Insert new habit into the database if it doesn't exist
-    cur.execute("INSERT INTO habits VALUES (?, ?, ?, ?)", (name, description, periodicity, create_date))
-    db.commit()
+    if isinstance(db, StorageBackend):
+        return db.add_habit(name, description, periodicity, create_date)
+    db = resolve_connection(db)
+    cur = db.cursor()
+    with write_transaction(db):
+        # Check if habit already exists in the database
+        cur.execute("SELECT 1 FROM habits WHERE name=?", (name,))
+        if cur.fetchone():
+            logger.info("Habit '%s' already exists", name)
+            return {"status": DUPLICATE, "habit": name}
+        # Insert new habit into the database if it doesn't exist
+        cur.execute("INSERT INTO habits (name, description, periodicity, create_date, source) VALUES (?, ?, ?, ?, ?)",
+                    (name, description, periodicity, create_date, source))
+    invalidate_habit_cache(db)
+    logger.info("Habit '%s' has been added", name)
+    return {"status": INSERTED, "habit": name}
 
 
+@instrumented
 def check_off_habit(db, name, periodicity, check_off_date=None, check_off_time=None):
     """
-    Record a habit check-off in the database (check_offs table), ensuring the date is unique.
+    Record a habit check-off in the database (check_offs table), ensuring the period is unique.
     Auto-increments the streak-count if it was checked-off in previous period.
+    Check-offs may be backdated, a check-off that fills a gap renumbers the streak that follows it.
 
     :param db: SQLite database connection object.
     :param name: Name of the habit.
     :param periodicity: Periodicity of the habit ("daily" or "weekly").
     :param check_off_date: Date of check-off, defaults to today's date.
     :param check_off_time: Time of check-off, defaults to current time.
+    :return: Dictionary with status (INSERTED or ALREADY_CHECKED_OFF), habit, period (date or "week-year") and
+             streak_count (the check-off's streak count, None if it wasn't inserted).
+    :raises KeyError: If the habit doesn't exist.
     """
-    cur = db.cursor()
-
     # Assign today's date and time if nothing is provided
     if check_off_date is None:
         check_off_date = date.today()
     if check_off_time is None:
         now = datetime.now()
         check_off_time = now.strftime("%H:%M") # from https://www.geeksforgeeks.org/python-strftime-function/
+    if isinstance(db, StorageBackend):
+        return db.check_off(name, periodicity, check_off_date, check_off_time)
+    db = resolve_connection(db)
+    cur = db.cursor()
 
-    if periodicity == "daily":
-        # check if habit is already checked off that day
-        cur.execute("SELECT 1 FROM check_offs WHERE habit_name = ? AND check_off_date = ?",
-            (name, str(check_off_date)))
-        if cur.fetchone():  # If a record is found  -> abort
-            print(f"Habit '{name}' is already checked off for {check_off_date}.")  # not relevant for app, leave in for testing
-            return
+    key = period_key(check_off_date, periodicity)
+    streak_column = STREAK_COLUMNS[periodicity]
+    period = check_off_date if periodicity == "daily" else week_label(key)
+
+    with write_transaction(db):
+        # the habit's id and streak state in one seek on the name index
+        cur.execute("""SELECT h.habit_id, s.current_streak, s.last_period_key, s.longest_streak, s.longest_streak_end,
+            s.longest_streak_ties FROM habits h LEFT JOIN habit_streak_state s USING (habit_id) WHERE h.name = ?""", (name,))
+        row = cur.fetchone()
+        if row is None:
+            raise KeyError(f"Habit '{name}' doesn't exist")
+        habit_id, state = row[0], row[1:] if row[1] is not None else None
+        appending = state is None or key > state[1]
+        if appending:
+            # a period after the last stored one can't be a duplicate, and the state row knows the streak it may continue
+            streak_count = state[0] + 1 if state is not None and state[1] == key - 1 else 1
         else:
-            # Check if habit was checked off 1 day prior to the check-off date
-            check_off_date_minus_1 = str(check_off_date - timedelta(days=1))
-            cur.execute(
-                "SELECT 1 FROM check_offs WHERE habit_name = ? AND check_off_date = ?",
-                (name, check_off_date_minus_1))
-            bool_day_before = cur.fetchone()
-
-            #calculate streak_count
-            if not bool_day_before:
-                streak_day_count = 1 # for a new streak-start
-            else:
-                cur.execute(
-                    "SELECT streak_day_count FROM check_offs WHERE habit_name = ? AND check_off_date = ?",
-                    (name, check_off_date_minus_1),)
-                streak_day_count = int(cur.fetchone()[0]) + 1 # add 1 to streak_count from day before
-
-            # Insert the new check-off entry
-            cur.execute(
-                "INSERT INTO check_offs (check_off_date, check_off_time, habit_name, streak_day_count) "
-                "VALUES (?, ?, ?, ?)",
-                (str(check_off_date), check_off_time, name, streak_day_count))
-            print(f"Habit '{name}' has been successfully checked off for {check_off_date}.")  # delete
-
-
-    else:  # periodicity == "weekly"
-        year, week, _ = check_off_date.isocalendar()
-        calendar_week = f"{week}-{year}"
-        # check if habit is already checked off that week
-        cur.execute("SELECT 1 FROM check_offs WHERE habit_name = ? AND calendar_week = ?",
-                    (name, calendar_week))
-        if cur.fetchone():  # If a record is found -> abort
-            print(f"Habit '{name}' is already checked off for {calendar_week}.")  # delete!!!!!!!!!!!!!!!1
-            return
+            # check if habit is already checked off that day/week
+            cur.execute("SELECT 1 FROM check_offs WHERE habit_id = ? AND period_key = ?", (habit_id, key))
+            if cur.fetchone():  # If a record is found  -> abort
+                logger.info("Habit '%s' is already checked off for %s", name, period)
+                return {"status": ALREADY_CHECKED_OFF, "habit": name, "period": period, "streak_count": None}
+
+            # the streak continues if the habit was checked off in the previous period
+            cur.execute(f"SELECT {streak_column} FROM check_offs WHERE habit_id = ? AND period_key = ?", (habit_id, key - 1))
+            previous = cur.fetchone()
+            streak_count = previous[0] + 1 if previous else 1
+
+        # Insert the new check-off entry and keep the streak state in the same transaction
+        cur.execute(
+            f"INSERT INTO check_offs (check_off_date, check_off_time, habit_id, period_key, {streak_column}) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (str(check_off_date), check_off_time, habit_id, key, streak_count))
+        _rollup_check_offs(cur, [(habit_id, check_off_date)])
+        if appending:
+            _advance_streak_state(cur, habit_id, state, key, streak_count)
         else:
-            check_off_date_minus_7 = check_off_date - timedelta(days=7)
-            year_minus_1, week_minus_1, _ = check_off_date_minus_7.isocalendar()
-            calendar_week_minus_1 = f"{week_minus_1}-{year_minus_1}"
-
-            # Check if habit was checked off 1 week prior to the current week
-            cur.execute(
-                "SELECT 1 FROM check_offs WHERE habit_name = ? AND calendar_week = ?",
-                (name, calendar_week_minus_1))
-            bool_week_before = cur.fetchone()
-
-            # calculate streak_count
-            if not bool_week_before:
-                streak_week_count = 1
-            else:
-                cur.execute(
-                    "SELECT streak_week_count FROM check_offs WHERE habit_name = ? AND calendar_week = ?",
-                    (name, calendar_week_minus_1))
-                streak_week_count = int(cur.fetchone()[0]) + 1 # add 1 to streak_count
-
-            # Insert the new check-off entry
-            cur.execute(
-                "INSERT INTO check_offs "
-                "(check_off_date, check_off_time, habit_name, calendar_week, streak_week_count) "
-                "VALUES (?, ?, ?, ?, ?)",
-                (str(check_off_date), check_off_time, name, calendar_week, streak_week_count))
-
-            print(f"Habit '{name}' has been successfully checked off for {calendar_week}.") # delete
+            # a backdated check-off may join a later streak, which then has to be renumbered
+            _shift_following_run(cur, habit_id, periodicity, key, streak_count)
+            _refresh_streak_state(cur, habit_id, periodicity)
+    logger.info("Habit '%s' has been checked off for %s with streak %d", name, period, streak_count)
+    return {"status": INSERTED, "habit": name, "period": period, "streak_count": streak_count}
 
-    db.commit()
 
+@instrumented
+def fetch_streak_state(db, name):
+    """
+    Fetch the materialized streak state of a habit.
 
-def display_habits_table(db,periodicity=None):
+    :param db: SQLite database connection object.
+    :param name: Name of the habit.
+    :return: Tuple (current_streak, last_period_key, longest_streak, longest_streak_end, longest_streak_ties),
+             None if the habit has never been checked off.
     """
-    Display the habits table with optional filtering by periodicity.
+    if isinstance(db, StorageBackend):
+        return db.streak_state(name)
+    cur = resolve_connection(db).cursor()
+    cur.execute("SELECT current_streak, last_period_key, longest_streak, longest_streak_end, longest_streak_ties "
+                "FROM habit_streak_state JOIN habits USING (habit_id) WHERE name = ?", (name,))
+    return cur.fetchone()
+
+
+def _advance_streak_state(cur, habit_id, state, key, streak_count):
+    """
+    Update the streak state for a check-off in a period after the last stored one, without reading check_offs.
+    """
+    if state is None:
+        longest_streak, longest_streak_end, longest_streak_ties = streak_count, key, 1
+    else:
+        _, _, longest_streak, longest_streak_end, longest_streak_ties = state
+        if streak_count > longest_streak:  # new record
+            longest_streak, longest_streak_end, longest_streak_ties = streak_count, key, 1
+        elif streak_count == longest_streak:  # another streak ties the record
+            longest_streak_end, longest_streak_ties = key, longest_streak_ties + 1
+    cur.execute("INSERT OR REPLACE INTO habit_streak_state VALUES (?, ?, ?, ?, ?, ?)",
+                (habit_id, streak_count, key, longest_streak, longest_streak_end, longest_streak_ties))
+
+
+def _shift_following_run(cur, habit_id, periodicity, key, delta):
+    """
+    Add delta to the streak counts of the gapless run of check-offs directly after period `key`.
+    Used after the streak count at `key` changed by delta (a newly inserted period counts as a change from 0).
+    The run end is found by walking the (habit_id, period_key) index to the first row without a successor,
+    so the update touches exactly the affected rows instead of the whole history.
+    """
+    if delta == 0:
+        return
+    cur.execute("SELECT 1 FROM check_offs WHERE habit_id = ? AND period_key = ?", (habit_id, key + 1))
+    if cur.fetchone() is None:  # nothing follows directly
+        return
+    cur.execute("""SELECT period_key FROM check_offs c WHERE habit_id = ? AND period_key > ? AND NOT EXISTS
+        (SELECT 1 FROM check_offs n WHERE n.habit_id = c.habit_id AND n.period_key = c.period_key + 1)
+        ORDER BY period_key LIMIT 1""", (habit_id, key))
+    run_end = cur.fetchone()[0]
+    streak_column = STREAK_COLUMNS[periodicity]
+    cur.execute(f"UPDATE check_offs SET {streak_column} = {streak_column} + ? "
+                "WHERE habit_id = ? AND period_key BETWEEN ? AND ?", (delta, habit_id, key + 1, run_end))
+
+
+def _refresh_streak_state(cur, habit_id, periodicity):
+    """
+    Recompute the streak state of a habit from its stored streak counts.
+    Every query is a seek on the (habit_id, period_key) or (habit_id, streak count) index, a run of length n has
+    exactly one row with count n, so the record ties are the rows holding the maximum count.
+    """
+    streak_column = STREAK_COLUMNS[periodicity]
+    cur.execute(f"SELECT {streak_column}, period_key FROM check_offs WHERE habit_id = ? "
+                "ORDER BY period_key DESC LIMIT 1", (habit_id,))
+    last = cur.fetchone()
+    if last is None:
+        cur.execute("DELETE FROM habit_streak_state WHERE habit_id = ?", (habit_id,))
+        return
+    cur.execute(f"SELECT MAX({streak_column}) FROM check_offs WHERE habit_id = ?", (habit_id,))
+    longest_streak = cur.fetchone()[0]
+    cur.execute(f"SELECT MAX(period_key), COUNT(*) FROM check_offs WHERE habit_id = ? AND {streak_column} = ?",
+                (habit_id, longest_streak))
+    longest_streak_end, longest_streak_ties = cur.fetchone()
+    cur.execute("INSERT OR REPLACE INTO habit_streak_state VALUES (?, ?, ?, ?, ?, ?)",
+                (habit_id, last[0], last[1], longest_streak, longest_streak_end, longest_streak_ties))
+
+
+def add_rollup_counts(cur, habit_weeks, days, weeks):
+    """
+    Add check-off counts to the rollup tables, for bulk loaders that count their rows themselves.
+
+    :param cur: Cursor inside the transaction that inserts the check-offs.
+    :param habit_weeks: Iterable of (habit_id, week_key, count) tuples.
+    :param days: Iterable of (day_key, count) tuples over all habits.
+    :param weeks: Iterable of (week_key, count) tuples over all habits.
+    """
+    cur.executemany("INSERT INTO habit_week_rollups VALUES (?, ?, ?) ON CONFLICT (habit_id, week_key) "
+                    "DO UPDATE SET check_offs = check_offs + excluded.check_offs", habit_weeks)
+    cur.executemany("INSERT INTO day_rollups VALUES (?, ?) "
+                    "ON CONFLICT (day_key) DO UPDATE SET check_offs = check_offs + excluded.check_offs", days)
+    cur.executemany("INSERT INTO week_rollups VALUES (?, ?) "
+                    "ON CONFLICT (week_key) DO UPDATE SET check_offs = check_offs + excluded.check_offs", weeks)
+
+
+def _rollup_check_offs(cur, check_offs):
+    """
+    Count newly inserted check-offs, given as (habit_id, check_off_date) pairs, into the rollup tables.
+    """
+    habit_weeks, days, weeks = Counter(), Counter(), Counter()
+    for habit_id, check_off_date in check_offs:
+        day, week = day_key(check_off_date), week_key(check_off_date)
+        habit_weeks[habit_id, week] += 1
+        days[day] += 1
+        weeks[week] += 1
+    add_rollup_counts(cur, [(habit_id, week, count) for (habit_id, week), count in habit_weeks.items()],
+                      days.items(), weeks.items())
+
+
+def _remove_from_rollups(cur, condition, parameters):
+    """
+    Subtract the check-offs of the habits matching `condition` (an SQL condition on habits) from the rollups over all
+    habits, before the habits are deleted, and drop the days and weeks left without check-offs. Their own
+    habit_week_rollups rows follow through ON DELETE CASCADE.
+    """
+    habit_ids = f"SELECT habit_id FROM habits WHERE {condition}"
+    cur.execute(f"""UPDATE day_rollups SET check_offs = day_rollups.check_offs - removed.check_offs
+        FROM (SELECT {ROLLUP_DAY_KEY} AS day, COUNT(*) AS check_offs FROM check_offs
+              WHERE habit_id IN ({habit_ids}) GROUP BY day) AS removed
+        WHERE day_rollups.day_key = removed.day""", parameters)
+    cur.execute(f"""UPDATE week_rollups SET check_offs = week_rollups.check_offs - removed.check_offs
+        FROM (SELECT week_key, SUM(check_offs) AS check_offs FROM habit_week_rollups
+              WHERE habit_id IN ({habit_ids}) GROUP BY week_key) AS removed
+        WHERE week_rollups.week_key = removed.week_key""", parameters)
+    cur.execute("DELETE FROM day_rollups WHERE check_offs = 0")
+    cur.execute("DELETE FROM week_rollups WHERE check_offs = 0")
+
+
+@instrumented
+def rebuild_rollups(db):
+    """
+    Recompute the day and week rollups from the check_offs table, e.g. after check-offs were written around this
+    module.
+
+    :param db: SQLite database connection object or ConnectionPool.
+    :return: Dictionary with the number of rollup rows: days, weeks and habit_weeks.
+    """
+    db = resolve_connection(db)
+    cur = db.cursor()
+    with write_transaction(db):
+        for table in ("day_rollups", "week_rollups", "habit_week_rollups"):
+            cur.execute(f"DELETE FROM {table}")
+        _fill_rollups(cur)
+        rows = {name: cur.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for name, table in (("days", "day_rollups"), ("weeks", "week_rollups"),
+                                    ("habit_weeks", "habit_week_rollups"))}
+    logger.info("Rollups have been rebuilt: %s", rows)
+    return rows
+
+
+@instrumented
+def check_off_many(db, records):
+    """
+    Record many check-offs at once, e.g. for imports and backfills.
+    Periodicities are resolved from the habits table, check-offs for periods that are already stored (or appear twice
+    in the records) and for unknown habits are skipped. Streak counts are computed in memory in period order and all
+    rows are written with one executemany in a single transaction. Records may be in any order and fill gaps in the
+    stored history, only the stored rows between the new periods and the streak directly after them are renumbered.
 
     :param db: SQLite database connection object.
-    :param periodicity: Filter habits by "daily", "weekly", or None for all habits.
-    :return: PrettyTable object containing the habits table.
+    :param records: Iterable of (name, check_off_date, check_off_time) tuples. Dates may be date objects or ISO strings,
+                    a time of None stands for the current time.
+    :return: Dictionary with the number of "inserted" and "skipped" check-offs.
+    """
+    db = resolve_connection(db)
+    cur = db.cursor()
+    now = datetime.now().strftime("%H:%M")
+    summary = {"inserted": 0, "skipped": 0}
+
+    # group the records by habit
+    records_by_habit = {}
+    for name, check_off_date, check_off_time in records:
+        if isinstance(check_off_date, str):
+            check_off_date = date.fromisoformat(check_off_date)
+        records_by_habit.setdefault(name, []).append((check_off_date, check_off_time or now))
+
+    # reads and writes share one transaction, so concurrent writers can't interleave
+    with write_transaction(db):
+        cur.execute("SELECT name, habit_id, periodicity FROM habits")
+        habits = {name: (habit_id, periodicity) for name, habit_id, periodicity in cur.fetchall()}
+
+        rows = []
+        rollups = []
+        updates = {}
+        shifts = []
+        touched = {}
+        for name, entries in records_by_habit.items():
+            if name not in habits:  # unknown habit
+                summary["skipped"] += len(entries)
+                continue
+            habit_id, periodicity = habits[name]
+
+            # first record of a period wins
+            new_check_offs = {}
+            for check_off_date, check_off_time in entries:
+                new_check_offs.setdefault(period_key(check_off_date, periodicity), (check_off_date, check_off_time))
+            keys = sorted(new_check_offs)
+            summary["skipped"] += len(entries) - len(keys)
+            touched[habit_id] = periodicity
+
+            # one range read gives the stored periods to dedupe against and the streak counts to continue from
+            streak_column = STREAK_COLUMNS[periodicity]
+            cur.execute(f"SELECT period_key, {streak_column} FROM check_offs WHERE habit_id = ? AND period_key BETWEEN ? AND ?",
+                        (habit_id, keys[0] - 1, keys[-1]))
+            stored = dict(cur.fetchall())
+
+            # walk the range in period order: new periods get a row, stored ones that now continue a longer streak are renumbered
+            streak_counts = {keys[0] - 1: stored.get(keys[0] - 1, 0)}
+            for key in sorted(key for key in stored.keys() | new_check_offs.keys() if key >= keys[0]):
+                streak_count = streak_counts[key - 1] + 1 if key - 1 in streak_counts else 1
+                streak_counts[key] = streak_count
+                if key in stored:
+                    if key in new_check_offs:  # already checked off in this period
+                        summary["skipped"] += 1
+                    if stored[key] != streak_count:
+                        updates.setdefault(streak_column, []).append((streak_count, habit_id, key))
+                    continue
+                check_off_date, check_off_time = new_check_offs[key]
+                rollups.append((habit_id, check_off_date))
+                if periodicity == "daily":
+                    rows.append((str(check_off_date), check_off_time, habit_id, key, streak_count, None))
+                else:
+                    rows.append((str(check_off_date), check_off_time, habit_id, key, None, streak_count))
+            # stored rows right after the range continue from its last period
+            shifts.append((habit_id, periodicity, keys[-1], streak_counts[keys[-1]] - stored.get(keys[-1], 0)))
+
+        cur.executemany(
+            "INSERT INTO check_offs "
+            "(check_off_date, check_off_time, habit_id, period_key, streak_day_count, streak_week_count) "
+            "VALUES (?, ?, ?, ?, ?, ?)", rows)
+        _rollup_check_offs(cur, rollups)
+        for streak_column, parameters in updates.items():
+            cur.executemany(f"UPDATE check_offs SET {streak_column} = ? WHERE habit_id = ? AND period_key = ?", parameters)
+        for habit_id, periodicity, key, delta in shifts:
+            _shift_following_run(cur, habit_id, periodicity, key, delta)
+        for habit_id, periodicity in touched.items():
+            _refresh_streak_state(cur, habit_id, periodicity)
+    summary["inserted"] = len(rows)
+    return summary
+
+
+def _require_foreign_keys(cur):
     """
+    Deletes rely on ON DELETE CASCADE, which only runs while foreign keys are on. get_db and ConnectionPool turn them
+    on per connection; the pragma can't change inside a transaction, so a connection without them is an error.
+    """
+    if not cur.execute("PRAGMA foreign_keys").fetchone()[0]:
+        raise ValueError("foreign keys are off on this connection, the delete would leave check-offs behind; "
+                         "open it with get_db or run PRAGMA foreign_keys = ON first")
+
+
+@instrumented
+def delete_habit(db, name):
+    """
+    Delete a habit together with its check-offs, streak state and rollups, which follow through ON DELETE CASCADE.
+
+    :param db: SQLite database connection object.
+    :param name: Name of the habit.
+    :raises ValueError: If foreign keys are off on the connection.
+    """
+    if isinstance(db, StorageBackend):
+        return db.delete_habit(name)
+    db = resolve_connection(db)
+    with write_transaction(db):
+        _require_foreign_keys(db.cursor())
+        _remove_from_rollups(db.cursor(), "name = ?", (name,))
+        db.execute("DELETE FROM habits WHERE name=?", (name,))
+    invalidate_habit_cache(db)
+
+
+@instrumented
+def delete_habits_by_source(db, source):
+    """
+    Delete all habits of one source (e.g. the mock habits or an import batch) with one DELETE on the source index,
+    their check-offs, streak states and rollups follow through ON DELETE CASCADE.
+
+    :param db: SQLite database connection object or ConnectionPool.
+    :param source: Source of the habits to delete.
+    :return: Number of deleted habits.
+    :raises ValueError: If foreign keys are off on the connection.
+    """
+    db = resolve_connection(db)
+    with write_transaction(db):
+        _require_foreign_keys(db.cursor())
+        _remove_from_rollups(db.cursor(), "source = ?", (source,))
+        deleted = db.execute("DELETE FROM habits WHERE source = ?", (source,)).rowcount
+    invalidate_habit_cache(db)
+    logger.info("%d habits of source '%s' have been deleted", deleted, source)
+    return deleted
+
+
+def habit_sources(db):
+    """
+    Number of habits per source, counted on the source index.
+
+    :param db: SQLite database connection object or ConnectionPool.
+    :return: Dictionary mapping source to number of habits.
+    """
+    return dict(resolve_connection(db).execute("SELECT source, COUNT(*) FROM habits GROUP BY source ORDER BY source"))
+
+
+@instrumented
+def rename_habit(db, name, new_name):
+    """
+    Rename a habit. Check-offs and streak state reference the habit by id, so only the habits row changes.
+
+    :param db: SQLite database connection object.
+    :param name: Current name of the habit.
+    :param new_name: New name of the habit.
+    :return: Dictionary with status (RENAMED, or DUPLICATE if another habit has the new name) and habit (new name).
+    :raises KeyError: If the habit doesn't exist.
+    """
+    db = resolve_connection(db)
     cur = db.cursor()
+    with write_transaction(db):
+        cur.execute("SELECT 1 FROM habits WHERE name=?", (new_name,))
+        if cur.fetchone():
+            logger.info("Habit '%s' already exists", new_name)
+            return {"status": DUPLICATE, "habit": new_name}
+        cur.execute("UPDATE habits SET name=? WHERE name=?", (new_name, name))
+        if cur.rowcount == 0:
+            raise KeyError(f"Habit '{name}' doesn't exist")
+    invalidate_habit_cache(db)
+    logger.info("Habit '%s' has been renamed to '%s'", name, new_name)
+    return {"status": RENAMED, "habit": new_name}
+
+
+PAGE_SIZE = 500
+HABIT_FIELDS = ["name", "description", "periodicity", "create_date"]
+CHECK_OFF_FIELDS = {"daily": ["Check-Off-Dates", "Check-Off-Time", "Streak-Count"],
+                    "weekly": ["Check-Off-Dates", "Check-Off-Time", "Check-Off-Week", "Streak-Count"]}
+
+
+@instrumented
+def fetch_habits_page(db, periodicity=None, page_size=PAGE_SIZE, after=None, source=None):
+    """
+    Fetch one page of habits ordered by periodicity, create date and name (keyset pagination).
+
+    :param db: SQLite database connection object or ConnectionPool.
+    :param periodicity: Filter habits by "daily", "weekly", or None for all habits.
+    :param page_size: Maximum number of habits per page.
+    :param after: Cursor returned with the previous page, None for the first page.
+    :param source: Only habits of this source, None for all habits.
+    :return: Tuple (rows, cursor) with (name, description, periodicity, create_date) rows, cursor is None after the
+             last page.
+    """
+    cur = resolve_connection(db).cursor()
+    query = "SELECT name, description, periodicity, create_date FROM habits WHERE 1"
+    parameters = []
+    if periodicity is not None:
+        query += " AND periodicity = ?"
+        parameters.append(periodicity)
+    if source is not None:
+        # (source, periodicity, create_date, name) index, the batch is read in display order
+        query += " AND source = ?"
+        parameters.append(source)
+    if after is not None:
+        # seek past the last row of the previous page on the (periodicity, create_date, name) index
+        query += " AND (periodicity, create_date, name) > (?, ?, ?)"
+        parameters.extend(after)
+    cur.execute(query + " ORDER BY periodicity, create_date, name LIMIT ?", parameters + [page_size])
+    rows = cur.fetchall()
+    cursor = (rows[-1][2], rows[-1][3], rows[-1][0]) if len(rows) == page_size else None
+    return rows, cursor
 
-    # Build the query dynamically based on the filter
-    query = "SELECT * FROM habits"
-    if periodicity == "daily":
-        query += " WHERE periodicity = 'daily'"
-    elif periodicity == "weekly":
-        query += " WHERE periodicity = 'weekly'"
-    query += " ORDER BY periodicity, create_date"  # Add ordering
 
-    cur.execute(query)
-    # fetch all rows
+@instrumented
+def fetch_check_offs_page(db, habit_name, page_size=PAGE_SIZE, after=None):
+    """
+    Fetch one page of a habit's check-offs ordered by period (keyset pagination).
+
+    :param db: SQLite database connection object or ConnectionPool.
+    :param habit_name: Name of the habit.
+    :param page_size: Maximum number of check-offs per page.
+    :param after: Cursor returned with the previous page, None for the first page.
+    :return: Tuple (rows, cursor) with (check_off_date, check_off_time, period_key, streak_count) rows, cursor is None
+             after the last page.
+    """
+    cur = resolve_connection(db).cursor()
+    cur.execute("""SELECT check_off_date, check_off_time, period_key, COALESCE(streak_day_count, streak_week_count)
+        FROM check_offs WHERE habit_id = (SELECT habit_id FROM habits WHERE name = ?) AND period_key > ?
+        ORDER BY period_key LIMIT ?""",
+                (habit_name, after if after is not None else -2**63, page_size))
     rows = cur.fetchall()
-    # fetch column headers
-    column_names = [description[0] for description in cur.description]
+    cursor = rows[-1][2] if len(rows) == page_size else None
+    return rows, cursor
+
 
+def _iter_pages(fetch_page, *args, page_size=PAGE_SIZE, after=None, **filters):
+    """
+    Yield the pages of a fetch_*_page function until the last one.
+    """
+    while True:
+        rows, after = fetch_page(*args, page_size=page_size, after=after, **filters)
+        if rows:
+            yield rows
+        if after is None:
+            return
+
+
+def iter_habits(db, periodicity=None, page_size=PAGE_SIZE, after=None, source=None):
+    """
+    Iterate over habits page by page, holding only one page in memory.
+
+    :param db: SQLite database connection object or ConnectionPool.
+    :param periodicity: Filter habits by "daily", "weekly", or None for all habits.
+    :param page_size: Number of habits fetched per query.
+    :param after: Cursor of fetch_habits_page to resume from.
+    :param source: Only habits of this source, None for all habits.
+    :return: Generator of (name, description, periodicity, create_date) rows.
+    """
+    for page in _iter_pages(fetch_habits_page, db, periodicity, page_size=page_size, after=after, source=source):
+        yield from page
+
+
+def iter_check_offs(db, habit_name, page_size=PAGE_SIZE, after=None):
+    """
+    Iterate over a habit's check-offs page by page, holding only one page in memory.
+
+    :param db: SQLite database connection object or ConnectionPool.
+    :param habit_name: Name of the habit.
+    :param page_size: Number of check-offs fetched per query.
+    :param after: Cursor of fetch_check_offs_page (a period key) to resume from.
+    :return: Generator of (check_off_date, check_off_time, period_key, streak_count) rows.
+    """
+    if isinstance(db, StorageBackend):
+        yield from db.check_offs(habit_name, after)
+        return
+    for page in _iter_pages(fetch_check_offs_page, db, habit_name, page_size=page_size, after=after):
+        yield from page
+
+
+def _check_off_table_row(row, periodicity):
+    check_off_date, check_off_time, key, streak_count = row
+    if periodicity == "weekly":
+        # the week is only turned into its "week-year" form for display
+        return [check_off_date, check_off_time, week_label(key), streak_count]
+    return [check_off_date, check_off_time, streak_count]
+
+
+def habits_table_pages(db, periodicity=None, page_size=PAGE_SIZE):
+    """
+    Render the habits table incrementally, one PrettyTable per page.
+
+    :param db: SQLite database connection object or ConnectionPool.
+    :param periodicity: Filter habits by "daily", "weekly", or None for all habits.
+    :param page_size: Number of habits per table.
+    :return: Generator of PrettyTable objects.
+    """
+    from prettytable import PrettyTable  # only needed for display, kept out of the CLI startup
+    for page in _iter_pages(fetch_habits_page, db, periodicity, page_size=page_size):
+        table = PrettyTable()
+        table.field_names = HABIT_FIELDS
+        table.add_rows(page)
+        yield table
+
+
+def check_offs_table_pages(db, habit_name, periodicity, page_size=PAGE_SIZE):
+    """
+    Render a habit's check-offs incrementally, one PrettyTable per page.
+
+    :param db: SQLite database connection object or ConnectionPool.
+    :param habit_name: Name of the habit.
+    :param periodicity: Periodicity of the habit (daily or weekly).
+    :param page_size: Number of check-offs per table.
+    :return: Generator of PrettyTable objects.
+    """
+    from prettytable import PrettyTable
+    for page in _iter_pages(fetch_check_offs_page, db, habit_name, page_size=page_size):
+        table = PrettyTable()
+        table.field_names = CHECK_OFF_FIELDS[periodicity]
+        table.add_rows([_check_off_table_row(row, periodicity) for row in page])
+        yield table
+
+
+@instrumented
+def export_check_offs_csv(db, habit_name, periodicity, file, page_size=PAGE_SIZE):
+    """
+    Stream a habit's check-offs as CSV with the columns of the check-offs table, in constant memory.
+
+    :param db: SQLite database connection object or ConnectionPool.
+    :param habit_name: Name of the habit.
+    :param periodicity: Periodicity of the habit (daily or weekly).
+    :param file: Writable text file object (opened with newline="").
+    :param page_size: Number of check-offs fetched per query.
+    :return: Number of exported check-offs.
+    """
+    writer = csv.writer(file)
+    writer.writerow(CHECK_OFF_FIELDS[periodicity])
+    count = 0
+    for page in _iter_pages(fetch_check_offs_page, db, habit_name, page_size=page_size):
+        writer.writerows(_check_off_table_row(row, periodicity) for row in page)
+        count += len(page)
+    return count
+
+
+@instrumented
+def display_habits_table(db,periodicity=None):
+    """
+    Display the habits table with optional filtering by periodicity.
+
+    :param db: SQLite database connection object.
+    :param periodicity: Filter habits by "daily", "weekly", or None for all habits.
+    :return: PrettyTable object containing the habits table.
+    """
+    from prettytable import PrettyTable
     # create PrettyTable
     table = PrettyTable()
-    table.field_names = column_names
-    for row in rows:
+    table.field_names = HABIT_FIELDS
+    for row in iter_habits(db, periodicity):
         table.add_row(row)
 
     return table
 
 
-
+@instrumented
 def display_check_offs_table(db, habit_name, periodicity):
     """
     Display the check_offs table filtered by habit name and periodicity.
@@ -192,34 +1080,17 @@ def display_check_offs_table(db, habit_name, periodicity):
     :param periodicity: Periodicity of the habit (daily or weekly)
     :return: PrettyTable object containing the filtered check_offs data
     """
-    cur = db.cursor()
-
-    # Build the query dynamically based on the filters
-    if periodicity == "weekly":
-        query = f"""SELECT check_off_date AS "Check-Off-Dates", check_off_time AS "Check-Off-Time", 
-                calendar_week AS "Check-Off-Week", streak_week_count AS "Streak-Count" 
-                FROM check_offs WHERE habit_name = '{habit_name}' ORDER BY check_off_date"""
-    else:  # periodicity == "daily"
-        query = f"""SELECT check_off_date AS "Check-Off-Dates", check_off_time AS "Check-Off-Time", 
-                streak_day_count AS "Streak-Count" 
-                FROM check_offs WHERE habit_name = '{habit_name}' ORDER BY check_off_date"""
-
-
-    cur.execute(query)
-    #fetch all rows
-    rows = cur.fetchall()
-    # Fetch column names
-    column_names = [description[0] for description in cur.description]
-
+    from prettytable import PrettyTable
     # create PrettyTable
     table = PrettyTable()
-    table.field_names = column_names
-    for row in rows:
-        table.add_row(row)
+    table.field_names = CHECK_OFF_FIELDS[periodicity]
+    for row in iter_check_offs(db, habit_name):
+        table.add_row(_check_off_table_row(row, periodicity))
 
     return table
 
 
+@instrumented
 def fetch_habit_from_db(db, name):
     """
     Fetch a habit's attributes from the database by providing its name.
@@ -228,6 +1099,16 @@ def fetch_habit_from_db(db, name):
     :param name: Name of the habit.
     :return: Tuple containing habit attributes (name, description, periodicity, create_date).
     """
+    if isinstance(db, StorageBackend):
+        return db.habit(name)
+    db = resolve_connection(db)
+    cache = getattr(db, "habit_cache", None)
+    if cache is not None:
+        return cache.get_record(name, lambda name: _load_habit(db, name))
+    return _load_habit(db, name)
+
+
+def _load_habit(db, name):
     cursor = db.cursor()
     cursor.execute(
         "SELECT description, periodicity, create_date FROM habits WHERE name=?",
@@ -235,3 +1116,53 @@ def fetch_habit_from_db(db, name):
     habit_data = cursor.fetchone()
     habit_attributes = (name, habit_data[0], habit_data[1], habit_data[2])
     return habit_attributes
+
+
+# orderings of fetch_habit_names, names are compared case-insensitively
+HABIT_NAME_ORDERS = {
+    "name": "SELECT name FROM habits ORDER BY name COLLATE NOCASE",
+    "periodicity": "SELECT name FROM habits ORDER BY periodicity, name COLLATE NOCASE",
+}
+
+
+@instrumented
+def fetch_habit_names(db, order="name"):
+    """
+    Fetch the sorted names of all habits, served from the habit cache between writes.
+
+    :param db: SQLite database connection object or ConnectionPool.
+    :param order: "name" to sort by name, "periodicity" to sort daily habits before weekly ones and then by name.
+    :return: List of habit names.
+    """
+    db = resolve_connection(db)
+    query = HABIT_NAME_ORDERS[order]
+
+    def load():
+        return [row[0] for row in db.execute(query)]
+
+    cache = getattr(db, "habit_cache", None)
+    if cache is not None:
+        return cache.get_names(order, load)
+    return load()
+
+
+def invalidate_habit_cache(db):
+    """
+    Drop the cached habit metadata after habits were added, renamed or deleted outside of add_habit/delete_habit.
+
+    :param db: SQLite database connection object or ConnectionPool.
+    """
+    cache = getattr(resolve_connection(db), "habit_cache", None)
+    if cache is not None:
+        cache.invalidate()
+
+
+def habit_cache_stats(db):
+    """
+    Hit/miss statistics of the habit cache.
+
+    :param db: SQLite database connection object or ConnectionPool.
+    :return: Dictionary with hits, misses, size and maxsize, None for connections without a cache.
+    """
+    cache = getattr(resolve_connection(db), "habit_cache", None)
+    return cache.stats() if cache is not None else None
@@ -1,9 +1,26 @@
+import sys
+from datetime import date
 from analyse import current_streak_calculation, longest_streak_calculation
-from database import add_habit, check_off_habit
+from database import add_habit, check_off_habit, resolve_connection
+from instrumentation import instrumented
 
+PERIODICITY_CODES = {"daily": 0, "weekly": 1}
+PERIODICITIES = ("daily", "weekly")
+
+# columns of a HabitCollection: periodicity code (weekly = 1), ordinal of ISO create dates (julianday of 0001-01-01
+# is 1721425.5) or 0 and the original create date for the others. julianday accepts day 31 of any month and rolls it
+# over, only dates it formats back unchanged are valid.
+_COLLECTION_COLUMNS = """SELECT name, description, periodicity = 'weekly', COALESCE(ordinal, 0),
+        CASE WHEN ordinal IS NULL THEN create_date END
+    FROM (SELECT name, description, periodicity, create_date,
+            CASE WHEN date(julian_day) = create_date THEN CAST(julian_day - 1721424.5 AS INTEGER) END AS ordinal
+        FROM (SELECT name, description, periodicity, create_date, julianday(create_date) AS julian_day FROM habits
+            WHERE ?1 IS NULL OR periodicity = ?1))"""
+_COLLECTION_COUNT = "SELECT COUNT(*) FROM habits WHERE ?1 IS NULL OR periodicity = ?1"
 
-class Habit:
 
+class Habit:
+    __slots__ = ("name", "description", "periodicity", "create_date")
 
     def __init__(self, name, description, periodicity, create_date=None):
         """
@@ -24,40 +41,184 @@ class Habit:
         return f"name: {self.name}, description: {self.description}, periodicity: {self.periodicity}, create_date: {self.create_date}"
 
 
+    @instrumented
     def store(self, db):
         """
         Store the habit in the database.
 
-        :param db: SQLite database connection object.
+        :param db: SQLite database connection object or ConnectionPool.
+        :return: Dictionary with the result of database.add_habit.
         """
-        add_habit(db, self.name, self.description, self.periodicity, self.create_date)
+        return add_habit(db, self.name, self.description, self.periodicity, self.create_date)
 
 
+    @instrumented
     def check_off(self, db,check_off_date=None, check_off_time=None):
         """
         Mark the habit as completed for a specific date and store associated check-off-data in the database.
 
-        :param db: SQLite database connection object.
+        :param db: SQLite database connection object or ConnectionPool.
         :param check_off_date: Date of the check-off (default is today).
         :param check_off_time: Time of the check-off (default is current time).
+        :return: Dictionary with the result of database.check_off_habit.
         """
-        check_off_habit(db, self.name, self.periodicity,check_off_date, check_off_time)
+        return check_off_habit(db, self.name, self.periodicity,check_off_date, check_off_time)
 
 
+    @instrumented
     def current_streak(self,db):
         """
         Calculate the current streak of the habit.
 
-        :param db: SQLite database connection object.
+        :param db: SQLite database connection object or ConnectionPool.
         :return: Dictionary with the current streak details.
         """
         return current_streak_calculation(db,self.name,self.periodicity)
 
+    @instrumented
     def longest_streak(self,db):
         """
         Calculate the longest streak of the habit.
 
-        :param db: SQLite database connection object.
+        :param db: SQLite database connection object or ConnectionPool.
         :return: Dictionary with the longest streak details.
         """
         return longest_streak_calculation(db,self.name,self.periodicity)
+
+
+class HabitCollection:
+    """
+    Column-backed collection of many habits for batch analytics.
+    Names are interned, repeated descriptions are stored once, the periodicity is stored as a small-int code
+    (PERIODICITY_CODES) and the create date as an int ordinal, so a million habits cost a few arrays instead of a
+    million objects. Create dates that aren't ISO dates (e.g. "predefined") get ordinal 0 and keep their original
+    string.
+    Habit objects are only built on access.
+    """
+    __slots__ = ("names", "descriptions", "periodicity_codes", "create_ordinals", "_other_dates")
+
+    def __init__(self, names, descriptions, periodicity_codes, create_ordinals, other_dates=None):
+        """
+        :param names: Object array of habit names.
+        :param descriptions: Object array of descriptions.
+        :param periodicity_codes: int8 array of PERIODICITY_CODES.
+        :param create_ordinals: int32 array of create date ordinals, 0 for other create dates.
+        :param other_dates: Dictionary mapping the name of habits with ordinal 0 to their create_date string.
+        """
+        self.names = names
+        self.descriptions = descriptions
+        self.periodicity_codes = periodicity_codes
+        self.create_ordinals = create_ordinals
+        self._other_dates = other_dates or {}
+
+    @classmethod
+    def from_db(cls, db, periodicity=None, chunk_size=10_000):
+        """
+        Bulk load habits from the database, reading the cursor in chunks. SQLite computes the periodicity codes and
+        create date ordinals. The arrays are allocated for the counted habits up front and every chunk is copied into
+        them column by column, so only one chunk of rows is held as Python tuples at a time.
+
+        :param db: SQLite database connection object or ConnectionPool.
+        :param periodicity: Only load "daily" or "weekly" habits, None for all habits.
+        :param chunk_size: Rows fetched per fetchmany call.
+        :return: HabitCollection in database order.
+        """
+        import numpy as np  # numpy is only imported for batch analytics, plain Habit users don't pay for it
+        connection = resolve_connection(db)
+        cur = connection.cursor()
+        # the count and the rows come from one read transaction, so the arrays fit the rows
+        owned = not connection.in_transaction
+        if owned:
+            cur.execute("BEGIN")
+        try:
+            cur.execute(_COLLECTION_COUNT, (periodicity,))
+            size = cur.fetchone()[0]
+            names, descriptions = np.empty(size, dtype=object), np.empty(size, dtype=object)
+            codes, ordinals = np.empty(size, dtype=np.int8), np.empty(size, dtype=np.int32)
+            other_dates, unique_descriptions = {}, {}
+            cur.execute(_COLLECTION_COLUMNS, (periodicity,))
+            cur.arraysize = chunk_size
+            start = 0
+            for chunk in iter(cur.fetchmany, []):
+                end = start + len(chunk)
+                chunk_names, chunk_descriptions, chunk_codes, chunk_ordinals, chunk_dates = zip(*chunk)
+                names[start:end] = np.fromiter(map(sys.intern, chunk_names), object, len(chunk))
+                descriptions[start:end] = np.fromiter(
+                    map(unique_descriptions.setdefault, chunk_descriptions, chunk_descriptions), object, len(chunk))
+                codes[start:end] = chunk_codes
+                ordinals[start:end] = chunk_ordinals
+                for index in np.flatnonzero(ordinals[start:end] == 0).tolist():
+                    other_dates[chunk_names[index]] = chunk_dates[index]
+                start = end
+        finally:
+            if owned:
+                connection.commit()
+        return cls(names, descriptions, codes, ordinals, other_dates)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, index):
+        """
+        Habit at `index`.
+        """
+        name = self.names[index]
+        ordinal = int(self.create_ordinals[index])
+        create_date = str(date.fromordinal(ordinal)) if ordinal else self._other_dates.get(name)
+        return Habit(name, self.descriptions[index], PERIODICITIES[self.periodicity_codes[index]], create_date)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def take(self, indices):
+        """
+        Sub-collection of the habits at `indices`, in that order.
+
+        :param indices: Integer or boolean index array.
+        :return: HabitCollection.
+        """
+        names = self.names[indices]
+        other_dates = {name: self._other_dates[name] for name in names if name in self._other_dates}
+        return HabitCollection(names, self.descriptions[indices], self.periodicity_codes[indices],
+                               self.create_ordinals[indices], other_dates)
+
+    def filter_periodicity(self, periodicity):
+        """
+        Habits with the given periodicity.
+
+        :param periodicity: "daily" or "weekly".
+        :return: HabitCollection.
+        """
+        return self.take(self.periodicity_codes == PERIODICITY_CODES[periodicity])
+
+    def sort(self, by="name", reverse=False):
+        """
+        Sorted copy of the collection. Names are compared case-insensitively, like in the menus.
+
+        :param by: "name", "create_date" or "periodicity" (ties ordered by create date, then name).
+        :param reverse: Sort descending.
+        :return: HabitCollection.
+        """
+        import numpy as np
+        if by == "create_date":
+            order = np.argsort(self.create_ordinals, kind="stable")
+        elif by in ("name", "periodicity"):
+            order = np.argsort(_object_array([name.casefold() for name in self.names]), kind="stable")
+            if by == "periodicity":
+                # stable sorts on the minor keys first, the name order survives as the last tie breaker
+                order = order[np.argsort(self.create_ordinals[order], kind="stable")]
+                order = order[np.argsort(self.periodicity_codes[order], kind="stable")]
+        else:
+            raise ValueError(f"can't sort by {by!r}")
+        return self.take(order[::-1] if reverse else order)
+
+
+def _object_array(values):
+    """
+    1-D object array of `values` (np.array would turn a list of strings into a fixed-width string array).
+    """
+    import numpy as np
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
@@ -0,0 +1,248 @@
+import functools
+import math
+import re
+import sqlite3
+import threading
+import time
+
+# the progress handler runs every PROGRESS_STEPS SQLite virtual machine instructions, a proxy for the rows scanned
+PROGRESS_STEPS = 100
+# bound values are inlined into the traced SQL, replace them so every statement is recorded once
+_LITERALS = re.compile(r"'(?:[^']|'')*'|(?<![\w.])-?\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_sql(sql):
+    """
+    Turn a traced SQL statement into its parameterized form, e.g. "... WHERE a = 5" into "... WHERE a = ?".
+
+    :param sql: SQL text as passed to the trace callback.
+    :return: Normalized SQL string.
+    """
+    return _WHITESPACE.sub(" ", _LITERALS.sub("?", sql)).strip()
+
+
+def _bucket(latency):
+    """
+    Upper bound in microseconds of the power-of-two histogram bucket of a latency in seconds.
+    """
+    return 1 << int(latency * 1_000_000).bit_length()
+
+
+class _Timing:
+    """
+    Call count, latency sum/max and latency histogram of one function or statement.
+    """
+    __slots__ = ("calls", "total", "max", "histogram", "vm_steps")
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.histogram = {}
+        self.vm_steps = 0
+
+    def add(self, latency):
+        self.calls += 1
+        self.total += latency
+        self.max = max(self.max, latency)
+        bucket = _bucket(latency)
+        self.histogram[bucket] = self.histogram.get(bucket, 0) + 1
+
+    def as_dict(self):
+        return {
+            "calls": self.calls,
+            "total_ms": self.total * 1000,
+            "mean_ms": self.total / self.calls * 1000 if self.calls else 0.0,
+            "max_ms": self.max * 1000,
+            "histogram_us": {f"<={bound}": count for bound, count in sorted(self.histogram.items())},
+        }
+
+
+class Profiler:
+    """
+    Opt-in instrumentation of the public database, analyse and Habit functions.
+    While enabled, every call to an @instrumented function is timed, and the SQL statements it runs are recorded through
+    the connection's trace and progress callbacks. A statement's latency is the time until the next statement starts
+    or the outermost instrumented call returns, so it includes the Python work that consumes its rows.
+    When disabled, an instrumented call costs one attribute check and no callbacks are installed.
+    Callbacks set on a database.HabitConnection keep running while it is profiled and are restored afterwards. A
+    plain sqlite3 connection can't report its callbacks, profiling it replaces and then clears them.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._functions = {}
+        self._statements = {}
+
+    def enable(self):
+        """Start recording."""
+        self.enabled = True
+
+    def disable(self):
+        """Stop recording, the collected stats are kept."""
+        self.enabled = False
+
+    def reset(self):
+        """Drop all collected stats."""
+        with self._lock:
+            self._functions = {}
+            self._statements = {}
+
+    def _record(self, table, key, latency, vm_steps=0):
+        with self._lock:
+            timing = table.get(key)
+            if timing is None:
+                timing = table[key] = _Timing()
+            timing.add(latency)
+            timing.vm_steps += vm_steps
+
+    def _close_statement(self, now):
+        """
+        Record the statement that is currently running on this thread, if any.
+        """
+        local = self._local
+        if local.statement is not None:
+            self._record(self._statements, local.statement, now - local.statement_start, local.vm_steps)
+            local.statement = None
+
+    def _trace(self, sql):
+        now = time.perf_counter()
+        self._close_statement(now)
+        self._local.statement = normalize_sql(sql)
+        self._local.statement_start = now
+        self._local.vm_steps = 0
+
+    def _progress(self):
+        self._local.vm_steps += PROGRESS_STEPS
+        return 0
+
+    def _install(self, connection):
+        """
+        Install the statement callbacks on `connection`, chained to the ones it already has.
+
+        :return: Tuple (trace_callback, progress_handler) to restore, see database.HabitConnection.
+        """
+        previous_trace = getattr(connection, "trace_callback", None)
+        previous_progress = getattr(connection, "progress_handler", None)
+        if previous_trace is None:
+            connection.set_trace_callback(self._trace)
+        else:
+            connection.set_trace_callback(lambda sql: (self._trace(sql), previous_trace(sql)))
+        if previous_progress is None:
+            connection.set_progress_handler(self._progress, PROGRESS_STEPS)
+        else:
+            handler, n = previous_progress
+            step = math.gcd(PROGRESS_STEPS, n)
+            local = self._local
+            local.previous_steps = 0
+
+            def progress():
+                # both handlers keep their own interval: ours counts steps, the caller's runs every n of them
+                local.vm_steps += step
+                local.previous_steps += step
+                if local.previous_steps < n:
+                    return 0
+                local.previous_steps = 0
+                return handler()
+
+            connection.set_progress_handler(progress, step)
+        return previous_trace, previous_progress
+
+    def call(self, name, function, connection, args, kwargs):
+        """
+        Run and time one instrumented call. The outermost call on a thread installs the statement callbacks on its
+        connection and restores the previous ones when it returns.
+        """
+        local = self._local
+        outermost = not getattr(local, "depth", 0)
+        if outermost:
+            local.depth = 0
+            local.statement = None
+            if connection is not None:
+                previous_trace, previous_progress = self._install(connection)
+        local.depth += 1
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            now = time.perf_counter()
+            local.depth -= 1
+            self._record(self._functions, name, now - start)
+            if outermost:
+                self._close_statement(now)
+                if connection is not None:
+                    connection.set_trace_callback(previous_trace)
+                    connection.set_progress_handler(*(previous_progress or (None, 0)))
+
+    def stats(self):
+        """
+        Snapshot of the collected stats.
+
+        :return: Dictionary with "functions" and "statements", each mapping the function name or normalized SQL to a
+                 dictionary with calls, total_ms, mean_ms, max_ms and histogram_us (calls per latency bucket in
+                 microseconds); statements also contain vm_steps (SQLite instructions executed, a proxy for rows scanned).
+        """
+        with self._lock:
+            functions = {name: timing.as_dict() for name, timing in self._functions.items()}
+            statements = {}
+            for sql, timing in self._statements.items():
+                statements[sql] = timing.as_dict()
+                statements[sql]["vm_steps"] = timing.vm_steps
+        return {"functions": functions, "statements": statements}
+
+    def report(self, limit=20):
+        """
+        Render the collected stats as two PrettyTables, the slowest functions and statements by total time first.
+
+        :param limit: Maximum number of statements shown.
+        :return: Report string.
+        """
+        from prettytable import PrettyTable  # only needed for the report, kept out of the CLI startup
+        stats = self.stats()
+        functions = PrettyTable()
+        functions.field_names = ["Function", "Calls", "Total ms", "Mean ms", "Max ms"]
+        for name, timing in sorted(stats["functions"].items(), key=lambda item: -item[1]["total_ms"]):
+            functions.add_row([name, timing["calls"], f"{timing['total_ms']:.3f}", f"{timing['mean_ms']:.3f}",
+                               f"{timing['max_ms']:.3f}"])
+
+        statements = PrettyTable()
+        statements.field_names = ["Statement", "Calls", "Total ms", "Mean ms", "Max ms", "VM steps"]
+        statements.align["Statement"] = "l"
+        for sql, timing in sorted(stats["statements"].items(), key=lambda item: -item[1]["total_ms"])[:limit]:
+            statements.add_row([sql[:80], timing["calls"], f"{timing['total_ms']:.3f}", f"{timing['mean_ms']:.3f}",
+                                f"{timing['max_ms']:.3f}", timing["vm_steps"]])
+        return f"{functions}\n{statements}"
+
+
+profiler = Profiler()
+
+
+def _find_connection(args):
+    """
+    The sqlite3 connection among the first two positional arguments (functions take db first, Habit methods second).
+    """
+    for arg in args[:2]:
+        if isinstance(arg, sqlite3.Connection):
+            return arg
+        connection = getattr(arg, "connection", None)
+        if callable(connection):  # ConnectionPool
+            return connection()
+    return None
+
+
+def instrumented(function):
+    """
+    Decorator that reports calls of `function` to the profiler while it is enabled.
+    """
+    name = f"{function.__module__}.{function.__qualname__}"
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not profiler.enabled:
+            return function(*args, **kwargs)
+        return profiler.call(name, function, _find_connection(args), args, kwargs)
+
+    return wrapper
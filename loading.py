@@ -1,5 +1,5 @@
-from database import get_db
-from habit import Habit
+from database import (get_db, add_habit, check_off_many, delete_habits_by_source, resolve_connection, write_transaction,
+                      SOURCE_PREDEFINED, SOURCE_MOCK)
 from datetime import date, timedelta
 import random
 
@@ -8,106 +8,72 @@ def dayminus(x):
     dateminusdays = date.today() - timedelta(days=x)
     return dateminusdays
 
-def load_predefined_habits():
+def load_predefined_habits(db=None):
     """
     Loads predefined habits.
     Stores upload flag in database, to make sure they are only loaded once at very first app usage.
 
+    :param db: SQLite database connection or ConnectionPool, defaults to a new connection to "main.db".
     No return value. Directly modifies the database.
     """
-    db = get_db()
+    db = resolve_connection(db) if db is not None else get_db()
     cur = db.cursor()
+    # every start after the first one ends with this plain read, without taking the write lock
     cur.execute("SELECT * FROM upload_flag")
     row = cur.fetchone()
-    if row is None or row[0] != "True":
-        cur.execute("INSERT INTO upload_flag (bool) VALUES ('True')")
-        db.commit()
+    if row is not None and row[0] == "True":
+        return
+    # flag check and upload are one transaction, so concurrent first starts can't upload twice
+    with write_transaction(db):
+        cur.execute("SELECT * FROM upload_flag")
+        row = cur.fetchone()
+        if row is None or row[0] != "True":
+            cur.execute("INSERT INTO upload_flag (bool) VALUES ('True')")
 
-        daily_1 = Habit("do a good deed", "be a decent human", "daily", "predefined")
-        daily_2 = Habit("stretching", "10 minutes minimum - stay flexible", "daily", "predefined")
-        daily_3 = Habit("use python", "improve those skills", "daily", "predefined")
-        weekly_1 = Habit("cook a new dish", "cook something you never cooked before", "weekly", "predefined")
-        weekly_2 = Habit("deep clean one room", "a clean space is a clear mind", "weekly", "predefined")
-        weekly_3 = Habit("meaningful conversation", "deep, uninterrupted conversation with someone close to you.", "weekly", "predefined")
-        daily_1.store(db)
-        daily_2.store(db)
-        daily_3.store(db)
-        weekly_1.store(db)
-        weekly_2.store(db)
-        weekly_3.store(db)
+            add_habit(db, "do a good deed", "be a decent human", "daily", source=SOURCE_PREDEFINED)
+            add_habit(db, "stretching", "10 minutes minimum - stay flexible", "daily", source=SOURCE_PREDEFINED)
+            add_habit(db, "use python", "improve those skills", "daily", source=SOURCE_PREDEFINED)
+            add_habit(db, "cook a new dish", "cook something you never cooked before", "weekly", source=SOURCE_PREDEFINED)
+            add_habit(db, "deep clean one room", "a clean space is a clear mind", "weekly", source=SOURCE_PREDEFINED)
+            add_habit(db, "meaningful conversation", "deep, uninterrupted conversation with someone close to you.", "weekly", source=SOURCE_PREDEFINED)
 
 
-def load_mock_data():
+def random_time():
+    return f"{random.randint(7, 23):02}:{random.randint(0, 59):02}"
+
+# mock habits: name, description, periodicity, days since creation and the days (counted back from today) they were checked off on
+MOCK_HABITS = [
+    ("MOCK - Finish Reading One Book", "finish reading any book", "weekly", 23, [28, 21, 14, 7]),
+    ("MOCK - Culture-Night", "visit theatre, opera, concert,...", "weekly", 22, [21, 14, 7]),
+    ("MOCK - Cut Toenails", "avoid nasty feet", "weekly", 18, [21, 14, 7]),
+    ("MOCK - Water Your Plants", "don't let them die", "daily", 50, [14, 13, 12, 11, 10, 8, 7, 5, 4, 3, 2, 1]),
+    ("MOCK - Play An Instrument", "play one song on any instrument", "daily", 15, [15, 14, 13, 12, 11, 9, 8, 7, 1]),
+    ("MOCK - Meditate", "meditate at least 30 minutes", "daily", 40, [40, 39, 38, 36, 35, 34, 32, 31, 30, 28, 27, 26, 2, 1]),
+]
+
+
+def load_mock_data(db=None):
     """
      Loads mock habit data into the database for user-testing.
      Creates and stores mock habits.
-     Marks these habits as completed on past dates and random times.
+     Marks these habits as completed on past dates and random times, all check-offs are written in one bulk insert.
 
+     :param db: SQLite database connection or ConnectionPool, defaults to a new connection to "main.db".
      No return value. Directly modifies the database.
      """
-    db = get_db()
-
-    book = Habit("MOCK - Finish Reading One Book", "finish reading any book", "weekly", dayminus(23))
-    book.store(db)
-    book.check_off(db,dayminus(28),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
-    book.check_off(db,dayminus(21),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
-    book.check_off(db,dayminus(14),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
-    book.check_off(db,dayminus(7),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
+    db = resolve_connection(db) if db is not None else get_db()
 
-    culture = Habit("MOCK - Culture-Night", "visit theatre, opera, concert,...", "weekly", dayminus(22))
-    culture.store(db)
-    culture.check_off(db,dayminus(21),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
-    culture.check_off(db,dayminus(14),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
-    culture.check_off(db,dayminus(7),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
+    records = []
+    for name, description, periodicity, created, days in MOCK_HABITS:
+        add_habit(db, name, description, periodicity, str(dayminus(created)), SOURCE_MOCK)
+        records.extend((name, dayminus(x), random_time()) for x in days)
+    check_off_many(db, records)
 
-    toenails = Habit("MOCK - Cut Toenails", "avoid nasty feet", "weekly", dayminus(18))
-    toenails.store(db)
-    toenails.check_off(db,dayminus(21),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
-    toenails.check_off(db,dayminus(14),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
-    toenails.check_off(db,dayminus(7),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
 
-    water = Habit("MOCK - Water Your Plants", "don't let them die", "daily", dayminus(50))
-    water.store(db)
-    water.check_off(db,dayminus(14),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
-    water.check_off(db,dayminus(13),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
-    water.check_off(db,dayminus(12),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
-    water.check_off(db,dayminus(11),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
-    water.check_off(db,dayminus(10),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
-    water.check_off(db,dayminus(8),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
-    water.check_off(db,dayminus(7),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
-    water.check_off(db,dayminus(5),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
-    water.check_off(db,dayminus(4),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
-    water.check_off(db,dayminus(3),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
-    water.check_off(db,dayminus(2),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
-    water.check_off(db,dayminus(1),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
-
-    instrument = Habit("MOCK - Play An Instrument", "play one song on any instrument", "daily", dayminus(15))
-    instrument.store(db)
-    instrument.check_off(db,dayminus(15),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
-    instrument.check_off(db,dayminus(14),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
-    instrument.check_off(db,dayminus(13),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
-    instrument.check_off(db,dayminus(12),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
-    instrument.check_off(db,dayminus(11),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
-    instrument.check_off(db,dayminus(9),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
-    instrument.check_off(db,dayminus(8),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
-    instrument.check_off(db,dayminus(7),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
-    instrument.check_off(db,dayminus(1),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
-
-    meditate = Habit("MOCK - Meditate", "meditate at least 30 minutes", "daily", dayminus(40))
-    meditate.store(db)
-    meditate.check_off(db,dayminus(40),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
-    meditate.check_off(db,dayminus(39),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
-    meditate.check_off(db,dayminus(38),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
-    meditate.check_off(db,dayminus(36),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
-    meditate.check_off(db,dayminus(35),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
-    meditate.check_off(db,dayminus(34),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
-    meditate.check_off(db,dayminus(32),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
-    meditate.check_off(db,dayminus(31),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
-    meditate.check_off(db,dayminus(30),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
-    meditate.check_off(db,dayminus(28),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
-    meditate.check_off(db,dayminus(27),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
-    meditate.check_off(db,dayminus(26),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
-    meditate.check_off(db,dayminus(2),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
-    meditate.check_off(db,dayminus(1),f"{random.randint(7, 23):02}:{random.randint(0, 59):02}")
+def delete_mock_data(db):
+    """
+    Deletes all mock habits, their check-offs and streak state follow through ON DELETE CASCADE.
 
-    db.commit()
+    :param db: SQLite database connection or ConnectionPool.
+    """
+    delete_habits_by_source(db, SOURCE_MOCK)
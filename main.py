@@ -1,10 +1,10 @@
 import questionary
 from datetime import date, timedelta
 from auxiliary import print_green, print_red, print_yellow, input_validator, helptext
-from habit import Habit
-from database import get_db, display_habits_table, display_check_offs_table, fetch_habit_from_db
-from analyse import hyper_streak_daily, hyper_streak_weekly
-from loading import load_mock_data, load_predefined_habits
+from database import get_db, habits_table_pages, check_offs_table_pages, fetch_habit_from_db, fetch_habit_names, delete_habit, rename_habit, day_key, week_key, INSERTED, RENAMED
+from loading import load_mock_data, delete_mock_data, load_predefined_habits
+from instrumentation import profiler
+# habit and analyse are imported in the menu branches that use them, so they don't delay the first menu
 
 
 def statistics_loop(db):
@@ -14,7 +14,6 @@ def statistics_loop(db):
 
     :param db: an initialized sqlite3 database connection
     """
-    cur = db.cursor()
     stats = True
     while stats:
         # Display the statistics menu
@@ -26,24 +25,22 @@ def statistics_loop(db):
             periodicity = questionary.select(
                 "\nWhich Habits do you want to view?",
                 choices=["daily", "weekly", "all"]).ask()
-            if periodicity == "all":
-                # Use default function and don't filter
-                print_yellow(display_habits_table(db))
-            else:
-                print_yellow(display_habits_table(db, periodicity))
+            # print page by page so long lists show up right away and never sit in memory as a whole
+            for table in habits_table_pages(db, None if periodicity == "all" else periodicity):
+                print_yellow(table)
 
             questionary.text("Press Enter to go back to STATISTICS.").ask()
 
 
         elif stats_choice == "Individual Habit & Streak Analysis":
             # user chooses habit name
-            cur.execute(
-                "SELECT name, periodicity FROM habits ORDER BY periodicity, name COLLATE NOCASE")  # Fetch unique habit names, nocase for case insentivity
-            unique_habits_list = [n[0] for n in cur.fetchall()]
+            # unique habit names, daily first, nocase for case insentivity (cached until habits change)
+            unique_habits_list = fetch_habit_names(db, "periodicity")
 
             if not unique_habits_list:
                 print_red("\nThere are no stored habits in the app.")
             else:
+                from habit import Habit
                 name = questionary.select(
                     "\nWhich habit do you want to take a closer look at?",
                     choices=unique_habits_list).ask()
@@ -53,8 +50,9 @@ def statistics_loop(db):
                 habit = Habit(habit_attributes[0], habit_attributes[1], habit_attributes[2], habit_attributes[3])
                 periodicity = habit.periodicity
 
-                # retun prettytable with all check offs
-                print_yellow(display_check_offs_table(db, name, periodicity))
+                # print all check offs, one prettytable per page
+                for table in check_offs_table_pages(db, name, periodicity):
+                    print_yellow(table)
 
                 # current streak handling
                 cur_streak_dict = habit.current_streak(db)
@@ -74,6 +72,7 @@ def statistics_loop(db):
 
 
         elif stats_choice == "Your Record Streaks":
+            from analyse import hyper_streak_daily, hyper_streak_weekly
             # Display daily streak(s)
             streak_daily = hyper_streak_daily(db)
             if not streak_daily:
@@ -112,26 +111,26 @@ def statistics_loop(db):
 
 
 
-def main_loop():
+def main_loop(db=None):
     """
     Handles the MAIN MENU and its sub-options.
 
     The main menu provides options to manage habits, view statistics, and load/delete mock data.
+
+    :param db: an initialized sqlite3 database connection, defaults to a new connection to "main.db"
     """
 
-    db = get_db()
+    if db is None:
+        db = get_db()
     cur = db.cursor()
     stop = False
     while not stop:
         today = date.today()
-        year, week, _ = today.isocalendar()
-        calendar_week = f"{week}-{year}"
-        cur.execute("SELECT name FROM habits ORDER BY name COLLATE NOCASE")  # give me all unique habit names ordered case-insensitively
-        unique_habits_list = [n[0] for n in cur.fetchall()]  # list of unique names
+        unique_habits_list = fetch_habit_names(db)  # all unique habit names ordered case-insensitively, cached until habits change
 
         choice = questionary.select(
             "\nMAIN MENU: please choose",
-            choices=["Create New Habit", "Check-Off Habit", "Remove Habit",
+            choices=["Create New Habit", "Check-Off Habit", "Remove Habit", "Rename Habit",
                      "STATISTICS MENU", "Helpcenter", "Mock Data", "Exit"]).ask()
 
         if choice == "Helpcenter":
@@ -148,21 +147,21 @@ def main_loop():
                 periodicity = questionary.select("Which Periodicity?", choices=["daily", "weekly"]).ask()
                 # restrict description to 70 characters
                 desc = questionary.text("What's the description of your habit?",validate=input_validator(70)).ask()
+                from habit import Habit
                 habit = Habit(name, desc, periodicity)
                 habit.store(db)
                 print_green(f'\nThe new {periodicity} habit "{name}" has been created.')
 
         elif choice == "Check-Off Habit":
+            from habit import Habit
             periodicity = questionary.select(
                 "Which kind of habit do you want to check-off?",
                 choices=["daily","weekly"]).ask()
 
             if periodicity == "daily":
-                today1 = str(today) # to prevent error for the sqlite query execution
-
-                # only select habits that haven't been checked-off today
-                cur.execute("""SELECT name FROM habits WHERE periodicity = 'daily' AND name NOT IN (SELECT habit_name FROM check_offs 
-                                                WHERE check_off_date = ?) ORDER BY name COLLATE NOCASE""", (today1,))
+                # only select habits that haven't been checked-off today, NOT EXISTS lets sqlite seek the (habit_id, period_key) index per habit
+                cur.execute("""SELECT name FROM habits WHERE periodicity = 'daily' AND NOT EXISTS (SELECT 1 FROM check_offs 
+                                                WHERE habit_id = habits.habit_id AND period_key = ?) ORDER BY name COLLATE NOCASE""", (day_key(today),))
                 check_off_choices = [n[0] for n in cur.fetchall()]
                 if not check_off_choices:
                     print_red("\nThere are no habits to check off today. Maybe you checked them all off already?")
@@ -178,14 +177,17 @@ def main_loop():
                         # restore habit from name and check it off
                         habit_attributes = fetch_habit_from_db(db,name)
                         habit = Habit(habit_attributes[0],habit_attributes[1],habit_attributes[2],habit_attributes[3])
-                        habit.check_off(db)
-                        print_green(f'\nCongrats, you completed "{name}" for today!')
+                        result = habit.check_off(db)
+                        if result["status"] == INSERTED:
+                            print_green(f'\nCongrats, you completed "{name}" for today!')
+                        else:  # checked off elsewhere since the list was shown
+                            print_red(f'\n"{name}" is already checked off for today.')
 
             else:  # periodicity == weekly
                 # only select habits that haven't been checked-off this week
                 cur.execute("""SELECT name FROM habits WHERE periodicity = 'weekly' AND 
-                name NOT IN (SELECT habit_name FROM check_offs WHERE calendar_week = ?) ORDER BY name COLLATE NOCASE""",
-                            (calendar_week,))
+                NOT EXISTS (SELECT 1 FROM check_offs WHERE habit_id = habits.habit_id AND period_key = ?) ORDER BY name COLLATE NOCASE""",
+                            (week_key(today),))
 
                 check_off_choices = [n[0] for n in cur.fetchall()]
                 if not check_off_choices:
@@ -202,8 +204,11 @@ def main_loop():
                         # restore habit from name and check it off
                         habit_attributes = fetch_habit_from_db(db, name)
                         habit = Habit(habit_attributes[0], habit_attributes[1], habit_attributes[2], habit_attributes[3])
-                        habit.check_off(db)
-                        print_green(f'\nCongrats, you completed "{name}" for this week!')
+                        result = habit.check_off(db)
+                        if result["status"] == INSERTED:
+                            print_green(f'\nCongrats, you completed "{name}" for this week!')
+                        else:  # checked off elsewhere since the list was shown
+                            print_red(f'\n"{name}" is already checked off for this week.')
 
 
 
@@ -219,11 +224,21 @@ def main_loop():
                 if security_check == False:
                     continue
                 else:
-                    cur.execute("DELETE FROM habits WHERE name=?", (name,))
-                    cur.execute("DELETE FROM check_offs WHERE habit_name=?", (name,))
-                    db.commit()
+                    delete_habit(db, name)
                     print_green(f'\nYour habit "{name}" and all the related data has been deleted from the application.')
 
+        elif choice == "Rename Habit":
+            name = questionary.select(
+                "\nWhich habit do you want to rename?",
+                choices=unique_habits_list + ["CANCEL & BACK TO MAIN MENU"]).ask()
+            if name == "CANCEL & BACK TO MAIN MENU":
+                continue
+            new_name = questionary.text("What's the new name of your habit?", validate=input_validator(30)).ask()
+            if rename_habit(db, name, new_name)["status"] == RENAMED:
+                print_green(f'\nYour habit "{name}" is now called "{new_name}", its check-offs and streaks are kept.')
+            else:
+                print_red(f'\nA habit named "{new_name}" already exists.')
+
         elif choice == "STATISTICS MENU":
             statistics_loop(db)
 
@@ -234,12 +249,10 @@ def main_loop():
             if mock_choice == "CANCEL & BACK TO MAIN MENU":
                 continue
             elif mock_choice == "Load Mock Data":
-                load_mock_data()
+                load_mock_data(db)
                 print_green("\nMock habits have been successfully added to the app. \nYou can check them off and explore their details in the Statistics menu.")
             else: # "Delete Mock Data"
-                cur.execute("DELETE FROM habits WHERE name LIKE ?", ("MOCK%",)) # name starts with "MOCK"
-                cur.execute("DELETE FROM check_offs WHERE habit_name LIKE ?", ("MOCK%",))
-                db.commit()
+                delete_mock_data(db)
                 print_green("\nMock data has been deleted successfully.")
 
 
@@ -249,5 +262,20 @@ def main_loop():
 
 
 if __name__ == "__main__":
-    load_predefined_habits()
-    main_loop()
+    import argparse
+    import sys
+    import cli
+    if sys.argv[1:2] and sys.argv[1] in cli.COMMANDS:
+        # scripted use: python main.py checkoff NAME..., see cli.py
+        sys.exit(cli.main())
+    parser = argparse.ArgumentParser(description="Habit tracking app")
+    parser.add_argument("--profile", action="store_true", help="time functions and SQL statements, print a report on exit")
+    args = parser.parse_args()
+    if args.profile:
+        profiler.enable()
+    # one connection for the whole session: the schema check and the predefined-habit flag run once on it
+    db = get_db()
+    load_predefined_habits(db)
+    main_loop(db)
+    if args.profile:
+        print(profiler.report())
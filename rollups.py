@@ -0,0 +1,120 @@
+"""
+Dense check-off counts per day and per ISO week for calendar heatmaps, read from the rollup tables.
+
+The counts over all habits come from day_rollups and week_rollups, a habit's weekly counts from habit_week_rollups,
+so a heatmap reads one row per cell no matter how many check-offs it covers. A habit has at most one check-off per
+day, its daily cells are read from its own check-offs. database.rebuild_rollups (or `python cli.py rebuild-rollups`)
+recomputes the tables.
+"""
+import numpy as np
+from instrumentation import instrumented
+from database import day_key, week_key, period_key, resolve_connection, EPOCH_ORDINAL, EPOCH_MONDAY_ORDINAL
+
+
+def rollup_counts(habit_ids, days):
+    """
+    Count check-offs given as arrays into the rows of database.add_rollup_counts, for bulk loaders.
+
+    :param habit_ids: Int array of habit ids.
+    :param days: Int array of the check-off days (days since 1970-01-01), aligned with habit_ids.
+    :return: Tuple of lists (habit_weeks, days, weeks) of (habit_id, week_key, count), (day_key, count) and
+             (week_key, count) tuples.
+    """
+    weeks = (days + (EPOCH_ORDINAL - EPOCH_MONDAY_ORDINAL)) // 7
+    unique_weeks, week_indexes, week_counts = np.unique(weeks, return_inverse=True, return_counts=True)
+    # one integer per (habit, week) pair, a 1-d unique is much faster than unique rows
+    span = max(len(unique_weeks), 1)
+    habit_weeks, habit_week_counts = np.unique(habit_ids * span + week_indexes, return_counts=True)
+    unique_days, day_counts = np.unique(days, return_counts=True)
+    return (list(zip((habit_weeks // span).tolist(), unique_weeks[habit_weeks % span].tolist(),
+                     habit_week_counts.tolist())),
+            list(zip(unique_days.tolist(), day_counts.tolist())),
+            list(zip(unique_weeks.tolist(), week_counts.tolist())))
+
+
+def _dense(rows, first, length):
+    """
+    Counts array of `length` cells starting at key `first`, filled from (key, count) rows.
+    """
+    counts = np.zeros(length, dtype=np.int64)
+    if rows:
+        keys, values = np.array(rows, dtype=np.int64).T
+        counts[keys - first] = values
+    return counts
+
+
+def _habit(cur, name):
+    cur.execute("SELECT habit_id, periodicity FROM habits WHERE name = ?", (name,))
+    habit = cur.fetchone()
+    if habit is None:
+        raise KeyError(f"Habit '{name}' doesn't exist")
+    return habit
+
+
+@instrumented
+def day_counts(db, start, end, name=None):
+    """
+    Check-offs per day from `start` to `end` (inclusive), of all habits or of one habit.
+
+    :param db: SQLite database connection object or ConnectionPool.
+    :param start: First date.
+    :param end: Last date.
+    :param name: Name of a habit, None for all habits.
+    :return: Int64 array with one cell per day, 0 for days without check-offs.
+    :raises KeyError: If the habit doesn't exist.
+    """
+    cur = resolve_connection(db).cursor()
+    first, last = day_key(start), day_key(end)
+    if name is None:
+        cur.execute("SELECT day_key, check_offs FROM day_rollups WHERE day_key BETWEEN ? AND ?", (first, last))
+        return _dense(cur.fetchall(), first, max(last - first + 1, 0))
+    habit_id, periodicity = _habit(cur, name)
+    cur.execute("SELECT check_off_date FROM check_offs WHERE habit_id = ? AND period_key BETWEEN ? AND ?",
+                (habit_id, period_key(start, periodicity), period_key(end, periodicity)))
+    days = np.array([row[0] for row in cur.fetchall()], dtype="datetime64[D]").astype(np.int64)
+    days = days[(days >= first) & (days <= last)]  # the first and last week of a weekly habit reach past the range
+    counts = np.zeros(max(last - first + 1, 0), dtype=np.int64)
+    counts[days - first] = 1
+    return counts
+
+
+@instrumented
+def week_counts(db, start, end, name=None):
+    """
+    Check-offs per ISO week from the week of `start` to the week of `end`, of all habits or of one habit.
+
+    :param db: SQLite database connection object or ConnectionPool.
+    :param start: A date in the first week.
+    :param end: A date in the last week.
+    :param name: Name of a habit, None for all habits.
+    :return: Int64 array with one cell per week, 0 for weeks without check-offs.
+    :raises KeyError: If the habit doesn't exist.
+    """
+    cur = resolve_connection(db).cursor()
+    first, last = week_key(start), week_key(end)
+    if name is None:
+        cur.execute("SELECT week_key, check_offs FROM week_rollups WHERE week_key BETWEEN ? AND ?", (first, last))
+    else:
+        habit_id, _ = _habit(cur, name)
+        cur.execute("SELECT week_key, check_offs FROM habit_week_rollups "
+                    "WHERE habit_id = ? AND week_key BETWEEN ? AND ?", (habit_id, first, last))
+    return _dense(cur.fetchall(), first, max(last - first + 1, 0))
+
+
+def heatmap(db, start, end, name=None):
+    """
+    GitHub-style calendar of the check-offs per day: one column per ISO week, one row per weekday.
+
+    :param db: SQLite database connection object or ConnectionPool.
+    :param start: First date.
+    :param end: Last date.
+    :param name: Name of a habit, None for all habits.
+    :return: Int64 array of shape (7, weeks), row 0 is Monday; cells before `start` and after `end` are -1.
+    """
+    if end < start:
+        return np.empty((7, 0), dtype=np.int64)
+    weeks = week_key(end) - week_key(start) + 1
+    cells = np.full(weeks * 7, -1, dtype=np.int64)
+    counts = day_counts(db, start, end, name)
+    cells[start.weekday():start.weekday() + len(counts)] = counts
+    return cells.reshape(weeks, 7).T
@@ -0,0 +1,263 @@
+import bisect
+import json
+import logging
+import mmap
+import os
+import struct
+from database import (StorageBackend, INSERTED, DUPLICATE, ALREADY_CHECKED_OFF, add_habit, check_off_habit,
+                      fetch_streak_state, fetch_habit_from_db, iter_check_offs, delete_habit, day_key, period_key,
+                      key_to_date, week_label)
+
+logger = logging.getLogger(__name__)
+
+# one check-off: habit id, day key (the period key of weekly habits is derived from it), minute of the day
+RECORD = struct.Struct("<IiH")
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    The SQLite database behind the StorageBackend interface.
+    """
+
+    def __init__(self, db):
+        """
+        :param db: SQLite database connection object or ConnectionPool.
+        """
+        self.db = db
+
+    def add_habit(self, name, description, periodicity, create_date):
+        return add_habit(self.db, name, description, periodicity, create_date)
+
+    def check_off(self, name, periodicity, check_off_date, check_off_time):
+        return check_off_habit(self.db, name, periodicity, check_off_date, check_off_time)
+
+    def streak_state(self, name):
+        return fetch_streak_state(self.db, name)
+
+    def habit(self, name):
+        return fetch_habit_from_db(self.db, name)
+
+    def check_offs(self, name, after=None):
+        return iter_check_offs(self.db, name, after=after)
+
+    def delete_habit(self, name):
+        return delete_habit(self.db, name)
+
+    def close(self):
+        self.db.close()
+
+
+class MmapLogBackend(StorageBackend):
+    """
+    Append-only storage: check-offs are fixed-width RECORDs appended to `path`, habits are JSON lines in
+    `path`.habits. On open the log is read through mmap and a per-habit index of sorted period keys and record offsets
+    is rebuilt in memory, so a check-off is one small append and streaks are computed without any SQL.
+    Deleting a habit retires its id, its records stay in the log and are skipped from then on. Check-off times are
+    kept to the minute, HH:MM:SS times are read back as HH:MM.
+    Single-process, single-writer storage: it has no locking between processes.
+    """
+
+    def __init__(self, path, sync=False):
+        """
+        :param path: Path of the check-off log, created if missing.
+        :param sync: fsync after every write, otherwise writes are flushed to the OS only.
+        """
+        self.path = path
+        self.sync = sync
+        self._habits = {}  # name -> [id, description, periodicity, create_date]
+        self._keys = {}  # id -> sorted period keys
+        self._offsets = {}  # id -> record offsets, parallel to the keys
+        self._states = {}  # id -> streak state tuple, dropped when a backdated check-off invalidates it
+        self._next_id = 0
+        self._load_habits()
+        self._log = open(path, "ab")
+        self._map = None
+        self._rebuild_index()
+
+    def _load_habits(self):
+        try:
+            with open(self.path + ".habits", encoding="utf-8") as file:
+                for line in file:
+                    entry = json.loads(line)
+                    if "deleted" in entry:
+                        self._habits.pop(entry["deleted"], None)
+                        continue
+                    self._habits[entry["name"]] = [entry["id"], entry["description"], entry["periodicity"],
+                                                   entry["create_date"]]
+                    self._next_id = max(self._next_id, entry["id"] + 1)
+        except FileNotFoundError:
+            pass
+        self._registry = open(self.path + ".habits", "a", encoding="utf-8")
+        for habit_id, _, _, _ in self._habits.values():
+            self._keys[habit_id] = []
+            self._offsets[habit_id] = []
+
+    def _rebuild_index(self):
+        """
+        Scan the log once and index the records of all live habits.
+        """
+        size = os.path.getsize(self.path)
+        if size % RECORD.size:
+            # a write torn by a crash, the partial record was never acknowledged
+            logger.warning("Truncating %d bytes of a partial record in %s", size % RECORD.size, self.path)
+            size -= size % RECORD.size
+            self._log.truncate(size)
+        self._size = size
+        periodicities = {habit_id: periodicity for habit_id, _, periodicity, _ in self._habits.values()}
+        entries = {habit_id: [] for habit_id in periodicities}
+        for offset, (habit_id, day, _) in zip(range(0, size, RECORD.size), RECORD.iter_unpack(self._view())):
+            if habit_id in entries:
+                key = day if periodicities[habit_id] == "daily" else period_key(key_to_date(day, "daily"), "weekly")
+                entries[habit_id].append((key, offset))
+        for habit_id, habit_entries in entries.items():
+            habit_entries.sort()
+            self._keys[habit_id] = [key for key, _ in habit_entries]
+            self._offsets[habit_id] = [offset for _, offset in habit_entries]
+
+    def _view(self):
+        """
+        Read-only mmap of the log covering all written records.
+        """
+        if self._map is None or len(self._map) < self._size:
+            if self._map is not None:
+                self._map.close()
+            self._map = None
+            if self._size:
+                with open(self.path, "rb") as file:
+                    self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map if self._map is not None else b""
+
+    def _write(self, file):
+        file.flush()
+        if self.sync:
+            os.fsync(file.fileno())
+
+    def add_habit(self, name, description, periodicity, create_date):
+        if name in self._habits:
+            logger.info("Habit '%s' already exists", name)
+            return {"status": DUPLICATE, "habit": name}
+        habit_id = self._next_id
+        self._next_id += 1
+        self._registry.write(json.dumps({"id": habit_id, "name": name, "description": description,
+                                         "periodicity": periodicity, "create_date": str(create_date)}) + "\n")
+        self._write(self._registry)
+        self._habits[name] = [habit_id, description, periodicity, str(create_date)]
+        self._keys[habit_id] = []
+        self._offsets[habit_id] = []
+        logger.info("Habit '%s' has been added", name)
+        return {"status": INSERTED, "habit": name}
+
+    def check_off(self, name, periodicity, check_off_date, check_off_time):
+        habit_id = self._habit_id(name)
+        key = period_key(check_off_date, periodicity)
+        period = check_off_date if periodicity == "daily" else week_label(key)
+        keys = self._keys[habit_id]
+        position = bisect.bisect_left(keys, key)
+        if position < len(keys) and keys[position] == key:
+            logger.info("Habit '%s' is already checked off for %s", name, period)
+            return {"status": ALREADY_CHECKED_OFF, "habit": name, "period": period, "streak_count": None}
+
+        hours, minutes = check_off_time.split(":")[:2]  # a record keeps the minute, seconds are dropped
+        self._log.write(RECORD.pack(habit_id, day_key(check_off_date), int(hours) * 60 + int(minutes)))
+        self._write(self._log)
+        keys.insert(position, key)
+        self._offsets[habit_id].insert(position, self._size)
+        self._size += RECORD.size
+
+        state = self._states.get(habit_id)
+        if position == len(keys) - 1 and (state is not None or position == 0):
+            # appending: the streak continues the cached state, like the SQLite streak state
+            streak_count = state[0] + 1 if state is not None and state[1] == key - 1 else 1
+            self._states[habit_id] = _advance(state, key, streak_count)
+        else:
+            streak_count = _run_length(keys, position)
+            self._states.pop(habit_id, None)
+        logger.info("Habit '%s' has been checked off for %s with streak %d", name, period, streak_count)
+        return {"status": INSERTED, "habit": name, "period": period, "streak_count": streak_count}
+
+    def streak_state(self, name):
+        habit = self._habits.get(name)
+        if habit is None or not self._keys[habit[0]]:
+            return None
+        habit_id = habit[0]
+        state = self._states.get(habit_id)
+        if state is None:
+            state = self._states[habit_id] = _streak_state(self._keys[habit_id])
+        return state
+
+    def habit(self, name):
+        habit = self._habits.get(name)
+        if habit is None:
+            return None
+        return (name, habit[1], habit[2], habit[3])
+
+    def check_offs(self, name, after=None):
+        habit_id = self._habit_id(name)
+        view = self._view()
+        streak_count, previous = 0, None
+        for key, offset in zip(self._keys[habit_id], self._offsets[habit_id]):
+            streak_count = streak_count + 1 if previous == key - 1 else 1
+            previous = key
+            if after is not None and key <= after:
+                continue
+            _, day, minute = RECORD.unpack_from(view, offset)
+            yield str(key_to_date(day, "daily")), f"{minute // 60:02}:{minute % 60:02}", key, streak_count
+
+    def delete_habit(self, name):
+        habit = self._habits.pop(name, None)
+        if habit is None:
+            return
+        self._registry.write(json.dumps({"deleted": name}) + "\n")
+        self._write(self._registry)
+        for index in (self._keys, self._offsets, self._states):
+            index.pop(habit[0], None)
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._log.close()
+        self._registry.close()
+
+    def _habit_id(self, name):
+        habit = self._habits.get(name)
+        if habit is None:
+            raise KeyError(f"Habit '{name}' doesn't exist")
+        return habit[0]
+
+
+def _run_length(keys, position):
+    """
+    Length of the streak ending at keys[position].
+    """
+    start = position
+    while start > 0 and keys[start - 1] == keys[start] - 1:
+        start -= 1
+    return position - start + 1
+
+
+def _advance(state, key, streak_count):
+    """
+    Streak state after appending `key` with `streak_count`, see database._advance_streak_state.
+    """
+    if state is None:
+        return streak_count, key, streak_count, key, 1
+    _, _, longest_streak, longest_streak_end, longest_streak_ties = state
+    if streak_count > longest_streak:
+        return streak_count, key, streak_count, key, 1
+    if streak_count == longest_streak:
+        return streak_count, key, longest_streak, key, longest_streak_ties + 1
+    return streak_count, key, longest_streak, longest_streak_end, longest_streak_ties
+
+
+def _streak_state(keys):
+    """
+    Streak state tuple computed from a habit's sorted period keys, by appending them one after another.
+    """
+    state = None
+    streak_count, previous = 0, None
+    for key in keys:
+        streak_count = streak_count + 1 if previous == key - 1 else 1
+        previous = key
+        state = _advance(state, key, streak_count)
+    return state
@@ -0,0 +1,167 @@
+import numpy as np
+from datetime import date
+from database import period_key, key_to_date, week_label, resolve_connection
+
+
+def load_period_keys(db, periodicity=None):
+    """
+    Load the period keys of all check-offs into NumPy arrays, grouped by habit and sorted by period.
+
+    :param db: SQLite database connection object.
+    :param periodicity: Only load "daily" or "weekly" habits, None for all habits.
+    :return: Tuple (names, habit_ids, keys): list of habit names and two int64 arrays, habit_ids[i] indexes names.
+    """
+    cur = resolve_connection(db).cursor()
+    query = ("SELECT (SELECT name FROM habits WHERE habits.habit_id = check_offs.habit_id) AS name, COUNT(*), "
+             "group_concat(period_key) FROM check_offs")
+    parameters = ()
+    if periodicity is not None:
+        query += " WHERE habit_id IN (SELECT habit_id FROM habits WHERE periodicity = ?)"
+        parameters = (periodicity,)
+    # one row per habit instead of one per check-off keeps the Python object overhead out of the hot loop,
+    # the group is read from the covering (habit_id, period_key) index
+    cur.execute(query + " GROUP BY habit_id ORDER BY name", parameters)
+    rows = cur.fetchall()
+    if not rows:
+        return [], np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    names, counts, concatenated_keys = zip(*rows)
+    keys = np.fromstring(",".join(concatenated_keys), dtype=np.int64, sep=",")
+    habit_ids = np.repeat(np.arange(len(names), dtype=np.int64), counts)
+    # group_concat follows the index order in practice, but SQLite doesn't promise it
+    if np.any((np.diff(keys) <= 0) & (np.diff(habit_ids) == 0)):
+        order = np.lexsort((keys, habit_ids))
+        keys = keys[order]
+    return list(names), habit_ids, keys
+
+
+def compute_streaks(habit_ids, keys):
+    """
+    Run-length encode the check-offs of all habits at once.
+    A run (streak) starts wherever the habit changes or the period key doesn't follow the previous one.
+
+    :param habit_ids: int64 array of habit indexes, sorted.
+    :param keys: int64 array of period keys, sorted within every habit.
+    :return: Dictionary of arrays. "run_habit", "run_length" and "run_end" describe every run, all other entries
+             are indexed by habit: "first_key", "last_key", "check_offs", "last_run" (length of the run ending in
+             last_key), "longest", "longest_end" (end of the most recent longest run) and "longest_ties".
+    """
+    count = len(keys)
+    if count == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return {name: empty for name in ("run_habit", "run_length", "run_end", "first_key", "last_key", "check_offs",
+                                         "last_run", "longest", "longest_end", "longest_ties")}
+
+    run_start = np.ones(count, dtype=bool)
+    run_start[1:] = (habit_ids[1:] != habit_ids[:-1]) | (keys[1:] != keys[:-1] + 1)
+    run_starts = np.flatnonzero(run_start)
+    run_ends = np.append(run_starts[1:], count) - 1
+    run_habit = habit_ids[run_starts]
+    run_length = run_ends - run_starts + 1
+    run_end = keys[run_ends]
+
+    # runs and check-offs are sorted by habit, so every habit is one contiguous segment
+    habit_first_run = np.flatnonzero(np.diff(run_habit, prepend=-1))
+    habit_last_run = np.append(habit_first_run[1:], len(run_habit)) - 1
+    habit_first_row = np.flatnonzero(np.diff(habit_ids, prepend=-1))
+
+    longest = np.maximum.reduceat(run_length, habit_first_run)
+    is_longest = run_length == longest[run_habit]
+    return {
+        "run_habit": run_habit,
+        "run_length": run_length,
+        "run_end": run_end,
+        "first_key": keys[habit_first_row],
+        "last_key": run_end[habit_last_run],
+        "check_offs": np.diff(np.append(habit_first_row, count)),
+        "last_run": run_length[habit_last_run],
+        "longest": longest,
+        "longest_end": np.maximum.reduceat(np.where(is_longest, run_end, np.iinfo(np.int64).min), habit_first_run),
+        "longest_ties": np.add.reduceat(is_longest.astype(np.int64), habit_first_run),
+    }
+
+
+def _habit_periodicities(db, names):
+    """
+    Periodicity code per habit name: 0 for daily, 1 for weekly.
+    """
+    cur = resolve_connection(db).cursor()
+    cur.execute("SELECT name, periodicity FROM habits")
+    periodicities = dict(cur.fetchall())
+    return np.fromiter((periodicities.get(name) == "weekly" for name in names), dtype=np.int64, count=len(names))
+
+
+def streak_summary(db, today=None, periodicity=None, limit=None):
+    """
+    Current streak, longest streak and completion rate for every checked-off habit, ranked by longest and then
+    current streak. Computed from the period keys alone, so it doesn't depend on the stored streak counters.
+
+    :param db: SQLite database connection object.
+    :param today: Reference date for current streaks and completion rates, defaults to today's date.
+    :param periodicity: Only rank "daily" or "weekly" habits, None for all habits.
+    :param limit: Only return the top `limit` habits, None for all.
+    :return: List of dictionaries with habit, periodicity, current_streak, longest_streak, longest_streak_end (date),
+             longest_streak_ties, streaks (number of runs) and completion_rate (check-offs per period since the first).
+    """
+    if today is None:
+        today = date.today()
+    names, habit_ids, keys = load_period_keys(db, periodicity)
+    streaks = compute_streaks(habit_ids, keys)
+    weekly = _habit_periodicities(db, names)
+
+    today_key = np.where(weekly == 1, period_key(today, "weekly"), period_key(today, "daily"))
+    current = np.where(streaks["last_key"] == today_key, streaks["last_run"], 0)
+    periods = np.maximum(today_key - streaks["first_key"] + 1, streaks["check_offs"])
+    completion_rate = streaks["check_offs"] / periods
+    runs = np.bincount(streaks["run_habit"], minlength=len(names))
+
+    order = np.lexsort((-current, -streaks["longest"]))
+    if limit is not None:
+        order = order[:limit]
+    summary = []
+    for habit in order.tolist():
+        habit_periodicity = "weekly" if weekly[habit] else "daily"
+        summary.append({
+            "habit": names[habit],
+            "periodicity": habit_periodicity,
+            "current_streak": int(current[habit]),
+            "longest_streak": int(streaks["longest"][habit]),
+            "longest_streak_end": key_to_date(int(streaks["longest_end"][habit]), habit_periodicity),
+            "longest_streak_ties": int(streaks["longest_ties"][habit]),
+            "streaks": int(runs[habit]),
+            "completion_rate": float(completion_rate[habit]),
+        })
+    return summary
+
+
+def hyper_streaks(db, periodicity):
+    """
+    All longest streaks across the habits of one periodicity, computed from the period keys.
+    Same result as analyse.hyper_streak_daily/hyper_streak_weekly, without reading the stored streak counters.
+
+    :param db: SQLite database connection object.
+    :param periodicity: "daily" or "weekly".
+    :return: List of dictionaries with habit, streak, last_date (and last_week for weekly habits), None if there are
+             no check-offs.
+    """
+    names, habit_ids, keys = load_period_keys(db, periodicity)
+    if not names:
+        return None
+    streaks = compute_streaks(habit_ids, keys)
+    record = streaks["run_length"].max()
+    record_runs = np.flatnonzero(streaks["run_length"] == record)
+
+    cur = resolve_connection(db).cursor()
+    longest_streaks = []
+    for run in record_runs.tolist():
+        name = names[streaks["run_habit"][run]]
+        end = int(streaks["run_end"][run])
+        # the few record runs look up the actual date they ended on
+        cur.execute("SELECT check_off_date FROM check_offs WHERE habit_id = (SELECT habit_id FROM habits WHERE name = ?) "
+                    "AND period_key = ?", (name, end))
+        entry = {"habit": name, "streak": int(record), "last_date": cur.fetchone()[0]}
+        if periodicity == "weekly":
+            entry["last_week"] = week_label(end)
+        longest_streaks.append(entry)
+    longest_streaks.sort(key=lambda entry: entry["last_date"])
+    return longest_streaks
@@ -0,0 +1,270 @@
+"""
+Seeded synthetic habits and check-offs for load testing.
+
+Run from the repository root:
+    python synthetic.py load_test.db --habits 10000 --years 5 --seed 1
+    python synthetic.py load_test.db --delete
+"""
+import argparse
+import time
+from datetime import date, timedelta
+import numpy as np
+from database import (get_db, resolve_connection, write_transaction, delete_habits_by_source, invalidate_habit_cache,
+                      add_rollup_counts, day_key, week_key, STREAK_COLUMNS, EPOCH_ORDINAL, EPOCH_MONDAY_ORDINAL)
+from loading import MOCK_HABITS
+from rollups import rollup_counts
+from streak_engine import compute_streaks
+
+SOURCE = "synthetic"
+# the mock habits serve as templates, names get the source and a number instead of the "MOCK - " prefix
+TEMPLATES = {periodicity: [(name.removeprefix("MOCK - "), description)
+                           for name, description, template_periodicity, _, _ in MOCK_HABITS
+                           if template_periodicity == periodicity]
+             for periodicity in ("daily", "weekly")}
+TIMES = np.array([f"{minute // 60:02}:{minute % 60:02}" for minute in range(24 * 60)], dtype=object)
+
+
+def _geometric(rng, mean, size):
+    return rng.geometric(1 / mean, size)
+
+
+def _poisson(rng, mean, size):
+    return 1 + rng.poisson(mean - 1, size)
+
+
+def _lognormal(rng, mean, size):
+    # sigma 1 gives a long tail of rare, very long streaks
+    return np.maximum(1, np.rint(rng.lognormal(np.log(mean) - 0.5, 1.0, size))).astype(np.int64)
+
+
+# streak length distributions, all with lengths >= 1 and (about) the given mean
+STREAK_DISTRIBUTIONS = {"geometric": _geometric, "poisson": _poisson, "lognormal": _lognormal}
+
+
+def synthetic_habits(count, seed=0, weekly_share=0.3, adherence=0.8, concentration=10.0):
+    """
+    Generate habit metadata with a per-habit adherence.
+
+    :param count: Number of habits.
+    :param seed: Random seed, the same arguments always give the same habits.
+    :param weekly_share: Share of weekly habits.
+    :param adherence: Mean share of checked-off periods, between 0 and 1 (exclusive).
+    :param concentration: How closely the habits' adherence follows the mean (beta distribution a + b).
+    :return: Dictionary with the lists "names", "descriptions" and "periodicities" and the float array "adherence".
+    """
+    if not 0 < adherence < 1:
+        raise ValueError(f"adherence must be between 0 and 1, not {adherence!r}")
+    rng = np.random.default_rng([seed, 0])
+    weekly = rng.random(count) < weekly_share
+    templates = rng.integers(0, 1 << 30, count)
+    names, descriptions, periodicities = [], [], []
+    for number, (is_weekly, template) in enumerate(zip(weekly.tolist(), templates.tolist())):
+        periodicity = "weekly" if is_weekly else "daily"
+        name, description = TEMPLATES[periodicity][template % len(TEMPLATES[periodicity])]
+        names.append(f"{name} {number:06}")
+        descriptions.append(description)
+        periodicities.append(periodicity)
+    habit_adherence = rng.beta(adherence * concentration, (1 - adherence) * concentration, count)
+    return {"names": names, "descriptions": descriptions, "periodicities": periodicities,
+            "adherence": np.clip(habit_adherence, 0.01, 0.99)}
+
+
+def checked_off_periods(rng, periods, adherence, mean_streak=7.0, distribution="geometric"):
+    """
+    Checked-off periods of a group of habits, modelled as alternating runs of checked-off periods (streaks) and
+    missed periods. Streak lengths follow `distribution`, gap lengths are geometric with the mean that gives every
+    habit its adherence.
+
+    :param rng: numpy.random.Generator.
+    :param periods: Number of periods of every habit's history.
+    :param adherence: Float array with the share of checked-off periods per habit.
+    :param mean_streak: Mean streak length in periods.
+    :param distribution: Name of a STREAK_DISTRIBUTIONS entry.
+    :return: Tuple (habits, periods) of int64 arrays, habit indexes and period indexes sorted by habit and period.
+    """
+    count = len(adherence)
+    mean_gap = mean_streak * (1 - adherence) / adherence
+    runs = int(periods / (mean_streak + mean_gap.min()) * 1.2) + 8
+    streaks, gaps = [], []
+    span = np.zeros(count, dtype=np.int64)
+    while count and span.min() < periods:  # one round nearly always covers the history
+        streaks.append(STREAK_DISTRIBUTIONS[distribution](rng, mean_streak, (count, runs)))
+        gaps.append(rng.geometric(1 / (mean_gap[:, None] + 1), (count, runs)) - 1)  # gaps of 0 merge two streaks
+        span += streaks[-1].sum(axis=1) + gaps[-1].sum(axis=1)
+    if not count:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    streaks, gaps = np.hstack(streaks), np.hstack(gaps)
+
+    # every streak starts after its gap, streaks beyond the history are cut off
+    starts = np.cumsum(streaks + gaps, axis=1) - streaks
+    lengths = np.clip(np.minimum(streaks, periods - starts), 0, None).ravel()
+    total = lengths.sum()
+    habits = np.repeat(np.arange(count), lengths.reshape(count, -1).sum(axis=1))
+    offsets = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return habits, np.repeat(starts.ravel(), lengths) + offsets
+
+
+def synthetic_check_offs(habits, start, end, seed=0, mean_streak=7.0, distribution="geometric", chunk_size=1000):
+    """
+    Generate check-offs of synthetic habits in vectorized batches, one periodicity and up to `chunk_size` habits at a
+    time. Every habit has a preferred time of day, check-off times scatter around it.
+
+    :param habits: Dictionary of synthetic_habits.
+    :param start: First date of the history.
+    :param end: Last date of the history.
+    :param seed: Random seed, the same arguments always give the same check-offs.
+    :param mean_streak: Mean streak length in periods.
+    :param distribution: Name of a STREAK_DISTRIBUTIONS entry.
+    :param chunk_size: Number of habits per batch.
+    :return: Generator of (periodicity, batch) tuples, batch is a dictionary of int64 arrays "habit" (index into
+             `habits`), "day" (days since 1970-01-01), "minute", "key" (period key) and "streak_count", sorted by
+             habit and period.
+    """
+    rng = np.random.default_rng([seed, 1])
+    first_day, last_day = day_key(start), day_key(end)
+    periodicities = np.array(habits["periodicities"])
+    for periodicity in ("daily", "weekly"):
+        indexes = np.flatnonzero(periodicities == periodicity)
+        if periodicity == "daily":
+            first_key, periods = first_day, last_day - first_day + 1
+        else:
+            first_key = week_key(start)
+            periods = week_key(end) - first_key + 1
+        for chunk_start in range(0, len(indexes), chunk_size):
+            chunk = indexes[chunk_start:chunk_start + chunk_size]
+            habit, period = checked_off_periods(rng, periods, habits["adherence"][chunk], mean_streak, distribution)
+            keys = first_key + period
+            if periodicity == "daily":
+                days = keys
+            else:
+                # any day of the week, within the history
+                monday = keys * 7 + (EPOCH_MONDAY_ORDINAL - EPOCH_ORDINAL)
+                days = np.clip(monday + rng.integers(0, 7, len(keys)), first_day, last_day)
+            preferred = rng.integers(6 * 60, 22 * 60, len(chunk))
+            minutes = np.clip(preferred[habit] + rng.normal(0, 30, len(keys)).astype(np.int64), 0, 24 * 60 - 1)
+
+            positions = np.arange(len(keys))
+            run_start = np.ones(len(keys), dtype=bool)
+            run_start[1:] = (habit[1:] != habit[:-1]) | (keys[1:] != keys[:-1] + 1)
+            streak_counts = positions - np.maximum.accumulate(np.where(run_start, positions, 0)) + 1
+            yield periodicity, {"habit": chunk[habit], "day": days, "minute": minutes, "key": keys,
+                                "streak_count": streak_counts}
+
+
+def load_synthetic_data(db=None, habits=10_000, years=5, seed=0, end=None, weekly_share=0.3, adherence=0.8,
+                        mean_streak=7.0, distribution="geometric", source=SOURCE, chunk_size=1000):
+    """
+    Load a reproducible synthetic dataset, e.g. 10k habits × 5 years (about 10M check-offs), for load testing.
+    Rows are written with one executemany per batch in a single transaction, streak counts, streak states and rollup
+    counts are computed with NumPy instead of per check-off. The habits are tagged with `source`,
+    delete_synthetic_data drops them again.
+
+    :param db: SQLite database connection or ConnectionPool, defaults to a new connection to "main.db".
+    :param habits: Number of habits.
+    :param years: Years of history, ending on `end`.
+    :param seed: Random seed, the same arguments always give the same dataset.
+    :param end: Last date of the history, defaults to today's date.
+    :param weekly_share: Share of weekly habits.
+    :param adherence: Mean share of checked-off periods, between 0 and 1 (exclusive).
+    :param mean_streak: Mean streak length in periods.
+    :param distribution: Streak length distribution, one of STREAK_DISTRIBUTIONS.
+    :param source: Source tag of the habits, must not be in use yet.
+    :param chunk_size: Habits generated and written per batch.
+    :return: Dictionary with the number of habits and check_offs.
+    """
+    if distribution not in STREAK_DISTRIBUTIONS:
+        raise ValueError(f"distribution must be one of {sorted(STREAK_DISTRIBUTIONS)}, not {distribution!r}")
+    db = resolve_connection(db) if db is not None else get_db()
+    end = end or date.today()
+    start = end - timedelta(days=round(365.25 * years) - 1)
+    habit_data = synthetic_habits(habits, seed, weekly_share, adherence)
+    # date strings of the whole history, looked up per check-off instead of formatted
+    dates = np.arange(start, end + timedelta(days=1), dtype="datetime64[D]").astype(str).astype(object)
+    first_day = day_key(start)
+
+    cur = db.cursor()
+    check_offs = 0
+    cur.execute("CREATE TEMP TABLE IF NOT EXISTS synthetic_check_offs(habit_id INTEGER, check_off_date TEXT, "
+                "check_off_time TEXT, period_key INTEGER, streak_count INTEGER)")
+    # every row references a habit inserted right before it, the per-row parent lookups are skipped (the pragma is a
+    # no-op inside an open transaction)
+    foreign_keys = cur.execute("PRAGMA foreign_keys").fetchone()[0]
+    cur.execute("PRAGMA foreign_keys = OFF")
+    try:
+        with write_transaction(db):
+            if cur.execute("SELECT 1 FROM habits WHERE source = ? LIMIT 1", (source,)).fetchone():
+                raise ValueError(f"source '{source}' is already loaded, delete it first")
+            # consecutive ids after the existing habits, so check-offs need no lookup by name
+            first_id = cur.execute("SELECT COALESCE(MAX(habit_id), 0) + 1 FROM habits").fetchone()[0]
+            # the source in the name keeps several datasets in one database apart
+            cur.executemany(
+                "INSERT INTO habits (habit_id, name, description, periodicity, create_date, source) VALUES (?, ?, ?, ?, ?, ?)",
+                zip(range(first_id, first_id + habits), [f"{name} [{source}]" for name in habit_data["names"]],
+                    habit_data["descriptions"], habit_data["periodicities"], [str(start)] * habits, [source] * habits))
+            for periodicity, batch in synthetic_check_offs(habit_data, start, end, seed, mean_streak, distribution,
+                                                           chunk_size):
+                habit_ids = batch["habit"] + first_id
+                # check_offs is AUTOINCREMENT, every single-row INSERT rewrites sqlite_sequence, one INSERT ... SELECT
+                # per batch from an unindexed staging table updates it once
+                cur.executemany("INSERT INTO synthetic_check_offs VALUES (?, ?, ?, ?, ?)",
+                                zip(habit_ids.tolist(), dates[batch["day"] - first_day].tolist(),
+                                    TIMES[batch["minute"]].tolist(), batch["key"].tolist(),
+                                    batch["streak_count"].tolist()))
+                cur.execute(f"INSERT INTO check_offs (habit_id, check_off_date, check_off_time, period_key, "
+                            f"{STREAK_COLUMNS[periodicity]}) SELECT * FROM synthetic_check_offs")
+                cur.execute("DELETE FROM synthetic_check_offs")
+                checked_off, habit_indexes = np.unique(habit_ids, return_inverse=True)
+                streaks = compute_streaks(habit_indexes, batch["key"])
+                cur.executemany("INSERT INTO habit_streak_state VALUES (?, ?, ?, ?, ?, ?)",
+                                zip(checked_off.tolist(), streaks["last_run"].tolist(),
+                                    streaks["last_key"].tolist(), streaks["longest"].tolist(),
+                                    streaks["longest_end"].tolist(), streaks["longest_ties"].tolist()))
+                add_rollup_counts(cur, *rollup_counts(habit_ids, batch["day"]))
+                check_offs += len(habit_ids)
+    finally:
+        cur.execute("DROP TABLE temp.synthetic_check_offs")
+        cur.execute(f"PRAGMA foreign_keys = {foreign_keys}")
+    invalidate_habit_cache(db)
+    return {"habits": habits, "check_offs": check_offs}
+
+
+def delete_synthetic_data(db, source=SOURCE):
+    """
+    Delete a synthetic dataset with its check-offs and streak states.
+
+    :param db: SQLite database connection or ConnectionPool.
+    :param source: Source tag the dataset was loaded with.
+    :return: Number of deleted habits.
+    """
+    return delete_habits_by_source(db, source)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("database")
+    parser.add_argument("--habits", type=int, default=10_000)
+    parser.add_argument("--years", type=float, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--end", type=date.fromisoformat, default=None, help="last date, defaults to today")
+    parser.add_argument("--weekly-share", type=float, default=0.3)
+    parser.add_argument("--adherence", type=float, default=0.8, help="mean share of checked-off periods")
+    parser.add_argument("--mean-streak", type=float, default=7.0, help="mean streak length in periods")
+    parser.add_argument("--distribution", choices=sorted(STREAK_DISTRIBUTIONS), default="geometric")
+    parser.add_argument("--source", default=SOURCE, help="source tag of the dataset")
+    parser.add_argument("--delete", action="store_true", help="delete the dataset of --source instead")
+    args = parser.parse_args()
+
+    db = get_db(args.database)
+    start = time.perf_counter()
+    if args.delete:
+        print(f"{delete_synthetic_data(db, args.source)} habits deleted in {time.perf_counter() - start:.1f} s")
+    else:
+        loaded = load_synthetic_data(db, args.habits, args.years, args.seed, args.end, args.weekly_share,
+                                     args.adherence, args.mean_streak, args.distribution, args.source)
+        print(f"{loaded['habits']} habits, {loaded['check_offs']} check-offs loaded in "
+              f"{time.perf_counter() - start:.1f} s")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
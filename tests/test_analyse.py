@@ -1,8 +1,9 @@
 import pytest
 from habit import Habit
-from datetime import date
+from datetime import date, timedelta
 from database import get_db
-from analyse import hyper_streak_daily, hyper_streak_weekly
+from analyse import hyper_streak_daily, hyper_streak_weekly, dashboard
+from storage import MmapLogBackend
 
 
 @pytest.fixture
@@ -165,4 +166,48 @@ def test_hyper_streak_weekly_multiple_habits(db_connection):
     result = hyper_streak_weekly(db)
 
     expected = [{"habit": "Weekly Habit 4", "streak": 4,  "last_week": "35-2024", "last_date": "2024-08-27"}]
-    assert result == expected
\ No newline at end of file
+    assert result == expected
+
+
+def test_dashboard(db_connection):
+    """Test the all-habits overview against the per-habit streak functions."""
+    db = db_connection
+    today = date.today()
+
+    daily = Habit("Daily Habit", "a description", "daily")
+    daily.store(db)
+    for days in (5, 4, 3, 1, 0):
+        daily.check_off(db, today - timedelta(days=days))
+    weekly = Habit("Weekly Habit", "another description", "weekly")
+    weekly.store(db)
+    weekly.check_off(db, today - timedelta(weeks=2))
+    weekly.check_off(db, today - timedelta(weeks=1))
+    Habit("New Habit", "never checked off", "daily").store(db)
+
+    result = dashboard(db)
+    expected = [
+        {"habit": "Daily Habit", "periodicity": "daily", "current_streak": 2, "longest_streak": 3,
+         "last_check_off": str(today), "due": False},
+        {"habit": "New Habit", "periodicity": "daily", "current_streak": 0, "longest_streak": 0,
+         "last_check_off": None, "due": True},
+        {"habit": "Weekly Habit", "periodicity": "weekly", "current_streak": 0, "longest_streak": 2,
+         "last_check_off": str(today - timedelta(weeks=1)), "due": True},
+    ]
+    assert result == expected
+    for entry, habit in zip(result, [daily, None, weekly]):
+        if habit is not None:
+            assert entry["current_streak"] == habit.current_streak(db)["current_streak"]
+            assert entry["longest_streak"] == habit.longest_streak(db)["longest_streak"]
+
+    # an explicit reference date makes the overview reproducible
+    assert dashboard(db, today + timedelta(days=1))[0]["due"] is True
+
+
+@pytest.mark.parametrize("report", [hyper_streak_daily, hyper_streak_weekly, dashboard])
+def test_reports_need_sqlite(tmp_path, report):
+    """Test that the cross-habit reports reject a storage backend with a clear error."""
+    backend = MmapLogBackend(str(tmp_path / "check_offs.log"))
+    Habit("Exercise", "Daily workout", "daily").store(backend)
+    with pytest.raises(TypeError, match="SQLite"):
+        report(backend)
+    backend.close()
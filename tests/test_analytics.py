@@ -0,0 +1,141 @@
+import random
+import pytest
+from datetime import date, timedelta
+from habit import Habit
+from database import get_db, check_off_many, day_key, week_key, key_to_date, week_label
+from analytics import completion_rates, completion_report, rolling_completion, weekly_trend, WINDOWS
+
+AS_OF = date(2024, 6, 12)
+
+
+@pytest.fixture
+def db_connection():
+    """Fixture for an in-memory database with random daily and weekly histories, some of them after AS_OF."""
+    db = get_db(":memory:")
+    rng = random.Random(11)
+    records = []
+    for number in range(12):
+        periodicity = "daily" if number % 3 else "weekly"
+        step = timedelta(days=1) if periodicity == "daily" else timedelta(weeks=1)
+        Habit(f"Habit {number}", "random history", periodicity, "2024-01-01").store(db)
+        first = date(2024, 1, 1) + rng.randrange(120) * step
+        records.extend((f"Habit {number}", first + i * step, "08:00") for i in range(200) if rng.random() < 0.7)
+    Habit("Never", "not checked off", "daily", "2024-01-01").store(db)
+    check_off_many(db, records)
+    yield db
+    db.close()
+
+
+def checked_off_keys(db, as_of=AS_OF):
+    """Reference data: periodicity and set of period keys up to as_of per habit."""
+    keys = {}
+    for name, periodicity in db.execute("SELECT name, periodicity FROM habits"):
+        keys[name] = (periodicity, set())
+    for name, key in db.execute("SELECT name, period_key FROM check_offs JOIN habits USING (habit_id)"):
+        periodicity, habit_keys = keys[name]
+        if key <= (week_key(as_of) if periodicity == "weekly" else day_key(as_of)):
+            habit_keys.add(key)
+    return keys
+
+
+@pytest.mark.parametrize("window", WINDOWS)
+def test_completion_rates(db_connection, window):
+    """Test the completion rates against a count in Python."""
+    db = db_connection
+    rates = completion_rates(db, window, AS_OF)
+    assert [entry["habit"] for entry in rates][:2] == ["Habit 1", "Habit 10"]
+    for entry in rates:
+        periodicity, keys = checked_off_keys(db)[entry["habit"]]
+        last = week_key(AS_OF) if periodicity == "weekly" else day_key(AS_OF)
+        start = max(last - window + 1, min(keys, default=last - window + 1))
+        assert entry["check_offs"] == len([key for key in keys if key > last - window])
+        assert entry["periods"] == last - start + 1
+        assert entry["completion_rate"] == pytest.approx(entry["check_offs"] / entry["periods"])
+    for periodicity in ("daily", "weekly"):
+        ranked = sorted((entry for entry in rates if entry["periodicity"] == periodicity), key=lambda e: e["rank"])
+        assert ranked[0]["rank"] == 1
+        assert ranked[0]["completion_rate"] == max(entry["completion_rate"] for entry in ranked)
+    assert completion_rates(db, window, AS_OF, "weekly") == [entry for entry in rates
+                                                            if entry["periodicity"] == "weekly"]
+
+
+def test_completion_report_as_of(db_connection):
+    """Test that a report only depends on the check-offs up to its as-of date."""
+    db = db_connection
+    report = completion_report(db, as_of=AS_OF)
+    assert set(report[0]["completion_rates"]) == set(WINDOWS)
+    never = next(entry for entry in report if entry["habit"] == "Never")
+    assert never["completion_rates"] == {window: 0.0 for window in WINDOWS}
+
+    for window in WINDOWS:
+        rates = {entry["habit"]: entry["completion_rate"] for entry in completion_rates(db, window, AS_OF)}
+        assert rates == {entry["habit"]: entry["completion_rates"][window] for entry in report}
+    assert completion_report(db, windows=(), as_of=AS_OF) == []
+
+    check_off_many(db, [("Never", AS_OF + timedelta(days=1), "08:00"), ("Habit 1", AS_OF + timedelta(days=2), "08:00")])
+    assert completion_report(db, as_of=AS_OF) == report
+    assert completion_report(db, as_of=AS_OF + timedelta(days=1)) != report
+
+
+def test_rolling_completion(db_connection):
+    """Test the rolling averages against a calculation in Python."""
+    db = db_connection
+    rolling = rolling_completion(db, window=5, periods=20, as_of=AS_OF)
+    reference = checked_off_keys(db)
+    assert len(rolling) == len(reference)
+    for entry in rolling:
+        periodicity, keys = reference[entry["habit"]]
+        last = week_key(AS_OF) if periodicity == "weekly" else day_key(AS_OF)
+        first = min(keys, default=None)
+        assert entry["periods"] == [key_to_date(key, periodicity) for key in range(last - 19, last + 1)]
+        for key, checked_off, rate in zip(range(last - 19, last + 1), entry["checked_off"], entry["rolling_rate"]):
+            tracked = [k for k in range(key - 4, key + 1) if first is None or k >= first]
+            assert checked_off == (None if first is not None and key < first else key in keys)
+            if tracked:
+                assert rate == pytest.approx(len([k for k in tracked if k in keys]) / len(tracked))
+            else:
+                assert rate is None
+
+
+def test_weekly_trend(db_connection):
+    """Test the weekly rates and week-over-week deltas against a calculation in Python."""
+    db = db_connection
+    trend = weekly_trend(db, weeks=8, as_of=AS_OF)
+    reference = checked_off_keys(db)
+    for entry in trend:
+        periodicity, keys = reference[entry["habit"]]
+        first = min(keys, default=None)
+        previous = None
+        for week in range(week_key(AS_OF) - 8, week_key(AS_OF) + 1):
+            if periodicity == "weekly":
+                periods = [week]
+            else:
+                monday = key_to_date(week, "weekly")
+                periods = [day_key(monday) + day for day in range(7) if monday + timedelta(days=day) <= AS_OF]
+            periods = [key for key in periods if first is None or key >= first]
+            rate = len([key for key in periods if key in keys]) / len(periods) if periods else None
+            if week > week_key(AS_OF) - 8:
+                row = entry["weeks"][week - week_key(AS_OF) + 7]
+                assert row["week"] == week_label(week)
+                assert row["periods"] == len(periods)
+                assert row["completion_rate"] == pytest.approx(rate)
+                assert row["delta"] == (pytest.approx(rate - previous) if None not in (rate, previous) else None)
+            previous = rate
+    last_week = trend[0]["weeks"][-1]
+    assert last_week["periods"] == AS_OF.weekday() + 1
+
+
+def test_case_variant_names_stay_separate():
+    """Test that habits whose names differ only by case come back as one entry each, not as interleaved fragments."""
+    db = get_db(":memory:")
+    for name in ("Run", "run"):
+        Habit(name, "case variant", "daily", "2024-01-01").store(db)
+    check_off_many(db, [(name, AS_OF - timedelta(days=day), "08:00") for name in ("Run", "run") for day in range(3)])
+    rolling = rolling_completion(db, window=2, periods=3, as_of=AS_OF)
+    assert sorted(entry["habit"] for entry in rolling) == ["Run", "run"]
+    assert all(entry["checked_off"] == [True, True, True] for entry in rolling)
+    trend = weekly_trend(db, weeks=2, as_of=AS_OF)
+    assert sorted(entry["habit"] for entry in trend) == ["Run", "run"]
+    assert all(len(entry["weeks"]) == 2 for entry in trend)
+    assert len(completion_report(db, as_of=AS_OF)) == 2
+    db.close()
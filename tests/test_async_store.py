@@ -0,0 +1,96 @@
+import asyncio
+import time
+import pytest
+from datetime import date, timedelta
+from async_store import AsyncHabitStore
+
+
+async def measure_loop_lag(stop, interval=0.005):
+    """Heartbeat task: largest delay of a sleep(interval) wake-up, i.e. how long the event loop was blocked."""
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+
+def test_async_store_streaks(tmp_path):
+    """Test the async mirrors of the database and analyse functions."""
+    async def scenario():
+        async with AsyncHabitStore(str(tmp_path / "async.db")) as store:
+            await store.add_habit("Exercise", "Daily workout", "daily")
+            await store.add_habit("Study", "Weekly study session", "weekly")
+            for days in range(3, -1, -1):
+                await store.check_off_habit("Exercise", "daily", date.today() - timedelta(days=days), "08:00")
+            await store.check_off_many([("Study", date.today(), "09:00")])
+            return (await store.current_streak_calculation("Exercise", "daily"),
+                    await store.longest_streak_calculation("Study", "weekly"),
+                    await store.hyper_streak_daily(),
+                    await store.hyper_streak_weekly())
+
+    current, longest, daily, weekly = asyncio.run(scenario())
+    assert current["current_streak"] == 4
+    assert longest["longest_streak"] == 1
+    assert daily == [{"habit": "Exercise", "streak": 4, "last_date": str(date.today())}]
+    assert weekly[0]["habit"] == "Study"
+
+
+def test_async_store_event_loop_stays_responsive(tmp_path):
+    """Load test: the event loop keeps ticking while hundreds of check-offs and reads run concurrently."""
+    async def scenario():
+        async with AsyncHabitStore(str(tmp_path / "async.db")) as store:
+            for number in range(10):
+                await store.add_habit(f"Habit {number}", "load test", "daily")
+            stop = asyncio.Event()
+            heartbeat = asyncio.create_task(measure_loop_lag(stop))
+            calls = []
+            for day in range(30):
+                for number in range(10):
+                    calls.append(store.check_off_habit(f"Habit {number}", "daily", date(2024, 1, 1) + timedelta(days=day), "08:00"))
+                    calls.append(store.longest_streak_calculation(f"Habit {number}", "daily"))
+            await asyncio.gather(*calls)
+            stop.set()
+            lag = await heartbeat
+            return lag, await store.longest_streak_calculation("Habit 9", "daily")
+
+    lag, longest = asyncio.run(scenario())
+    assert longest["longest_streak"] == 30
+    assert lag < 0.1  # generous bound for slow CI machines, typically a few milliseconds
+
+
+def test_async_store_timeout_interrupts_query(tmp_path):
+    """Test that a timed-out read is interrupted and frees its reader thread."""
+    def endless_query(db):
+        return db.execute("WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c) SELECT COUNT(*) FROM c").fetchone()
+
+    async def scenario():
+        async with AsyncHabitStore(str(tmp_path / "async.db"), readers=1) as store:
+            with pytest.raises(asyncio.TimeoutError):
+                await store.read(endless_query, timeout=0.2)
+            # the only reader thread is free again
+            return await store.hyper_streak_daily(timeout=5)
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_async_store_timed_out_call_keeps_its_slot(tmp_path):
+    """Test that a timed-out call holds its slot until its thread is done, and the next call isn't interrupted."""
+    events = []
+
+    def slow(db):
+        time.sleep(0.3)  # Python work, no statement to interrupt
+        events.append("slow done")
+
+    def quick(db):
+        events.append("quick")
+        return db.execute("SELECT 2").fetchone()[0]
+
+    async def scenario():
+        async with AsyncHabitStore(str(tmp_path / "async.db"), readers=2, max_pending=1) as store:
+            with pytest.raises(asyncio.TimeoutError):
+                await store.read(slow, timeout=0.05)
+            return await store.read(quick, timeout=5)
+
+    assert asyncio.run(scenario()) == 2
+    assert events == ["slow done", "quick"]
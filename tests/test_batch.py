@@ -0,0 +1,43 @@
+import sqlite3
+import pytest
+from datetime import date, timedelta
+from batch import find_databases, recompute_all, build_report, analyse_database
+from database import get_db, check_off_many
+from habit import Habit
+
+
+@pytest.fixture
+def tenant_dir(tmp_path):
+    """Fixture for a directory with three user databases, user n has an n+1 day streak."""
+    for user in range(3):
+        db = get_db(str(tmp_path / f"user{user}.db"))
+        Habit("Exercise", "Daily workout", "daily", "2024-12-01").store(db)
+        Habit("Study", "Weekly study session", "weekly", "2024-12-01").store(db)
+        check_off_many(db, [("Exercise", date(2024, 12, 1) + timedelta(days=day), "08:00") for day in range(user + 1)])
+        db.close()
+    return tmp_path
+
+
+def test_recompute_all_in_worker_processes(tenant_dir):
+    """Test that all databases are analysed by the process pool and aggregated into one report."""
+    paths = find_databases([tenant_dir])
+    assert [path.rsplit("/", 1)[1] for path in paths] == ["user0.db", "user1.db", "user2.db"]
+
+    results = recompute_all(paths, workers=2, chunk_size=1)
+    assert [result["longest_streaks"] for result in results] == [{"Exercise": 1}, {"Exercise": 2}, {"Exercise": 3}]
+    assert results[2]["hyper_streak_daily"][0]["streak"] == 3
+    assert results[0]["hyper_streak_weekly"] is None
+
+    summary = build_report(results)["summary"]
+    assert summary == {"databases": 3, "failed": 0, "best_daily_streak": 3, "best_weekly_streak": 0, "habits": 3}
+
+
+def test_analyse_database_is_read_only(tenant_dir):
+    """Test that broken or outdated databases are reported without being created or migrated."""
+    missing = str(tenant_dir / "missing.db")
+    assert "error" in analyse_database(missing)
+    assert not (tenant_dir / "missing.db").exists()
+
+    old = str(tenant_dir / "old.db")
+    sqlite3.connect(old).close()
+    assert analyse_database(old)["error"].startswith("schema version 0")
@@ -0,0 +1,57 @@
+import pytest
+from cache import HabitCache
+from database import get_db, add_habit, delete_habit, fetch_habit_from_db, fetch_habit_names, habit_cache_stats, habit_sources, SOURCE_MOCK
+from loading import load_mock_data, delete_mock_data, MOCK_HABITS
+
+
+@pytest.fixture
+def db_connection():
+    """Fixture for an in-memory database with two habits."""
+    db = get_db(":memory:")
+    add_habit(db, "b habit", "Daily Habit", "daily", "2024-12-01")
+    add_habit(db, "A habit", "Weekly Habit", "weekly", "2024-12-01")
+    yield db
+    db.close()
+
+
+def test_lru_eviction():
+    """Test that the least recently used record is dropped and that hits and misses are counted."""
+    cache = HabitCache(maxsize=2)
+    cache.get_record("a", str.upper)
+    cache.get_record("b", str.upper)
+    cache.get_record("a", str.upper)  # a is now more recent than b
+    cache.get_record("c", str.upper)  # evicts b
+    assert cache.stats() == {"hits": 1, "misses": 3, "size": 2, "maxsize": 2}
+    assert cache.get_record("b", lambda name: "reloaded") == "reloaded"
+
+
+def test_habit_lookups_are_cached(db_connection):
+    """Test that repeated lookups are served from the cache."""
+    db = db_connection
+    assert fetch_habit_names(db) == ["A habit", "b habit"]
+    assert fetch_habit_names(db, "periodicity") == ["b habit", "A habit"]
+    assert fetch_habit_from_db(db, "b habit") == ("b habit", "Daily Habit", "daily", "2024-12-01")
+
+    # a change the cache doesn't know about stays invisible until the next invalidation
+    db.execute("UPDATE habits SET description = 'changed' WHERE name = 'b habit'")
+    assert fetch_habit_from_db(db, "b habit")[1] == "Daily Habit"
+    assert fetch_habit_names(db) == ["A habit", "b habit"]
+    assert habit_cache_stats(db)["hits"] == 2
+
+
+def test_writes_invalidate_cache(db_connection):
+    """Test that adding, deleting and mock loading/deleting refresh the cached habits."""
+    db = db_connection
+    fetch_habit_names(db)
+    add_habit(db, "c habit", "Daily Habit", "daily")
+    assert fetch_habit_names(db) == ["A habit", "b habit", "c habit"]
+
+    fetch_habit_from_db(db, "b habit")
+    delete_habit(db, "b habit")
+    assert fetch_habit_names(db) == ["A habit", "c habit"]
+
+    load_mock_data(db)
+    assert any(name.startswith("MOCK") for name in fetch_habit_names(db))
+    assert habit_sources(db)[SOURCE_MOCK] == len(MOCK_HABITS)
+    delete_mock_data(db)
+    assert fetch_habit_names(db) == ["A habit", "c habit"]
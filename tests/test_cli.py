@@ -0,0 +1,151 @@
+import json
+import pytest
+from cli import main
+from database import get_db
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """Fixture for the path of a database with one daily and one weekly habit."""
+    path = str(tmp_path / "habits.db")
+    assert main(["add", "Read", "--periodicity", "daily", "--create-date", "2024-11-01", "--db", path]) == 0
+    assert main(["add", "Study", "--periodicity", "weekly", "--create-date", "2024-11-01", "--db", path]) == 0
+    return path
+
+
+def run_json(capsys, *argv):
+    """Run a command with --json and return its exit status and parsed output."""
+    capsys.readouterr()
+    status = main([*argv, "--json"])
+    return status, json.loads(capsys.readouterr().out)
+
+
+def test_checkoff_json(capsys, db_path):
+    """Test that check-offs report period and streak count and that a repeat is reported as already checked off."""
+    status, output = run_json(capsys, "checkoff", "Read", "Study", "--date", "2024-12-02", "--time", "07:30",
+                              "--db", db_path)
+    assert status == 0
+    assert output["results"] == [
+        {"status": "inserted", "habit": "Read", "period": "2024-12-02", "streak_count": 1},
+        {"status": "inserted", "habit": "Study", "period": "49-2024", "streak_count": 1},
+    ]
+    status, output = run_json(capsys, "checkoff", "Read", "--date", "2024-12-02", "--db", db_path)
+    assert status == 0
+    assert output["results"][0]["status"] == "already_checked_off"
+
+
+def test_checkoff_unknown_habit(capsys, db_path):
+    """Test that an unknown habit is an error with exit status 1 while the other habits are still checked off."""
+    status, output = run_json(capsys, "checkoff", "Nope", "Read", "--date", "2024-12-02", "--db", db_path)
+    assert status == 1
+    assert output["results"][0] == {"status": "error", "habit": "Nope", "error": "unknown habit"}
+    assert output["results"][1]["status"] == "inserted"
+
+
+def test_import_and_stats(capsys, tmp_path, db_path):
+    """Test a CSV import followed by the streak statistics of the imported habits."""
+    csv_path = tmp_path / "check_offs.csv"
+    csv_path.write_text("# habit,date,time\nRead,2024-12-01,07:00\nRead,2024-12-02\nRead,2024-12-03,07:10\n"
+                        "Study,2024-12-02,18:00\nUnknown,2024-12-01,08:00\n")
+    status, output = run_json(capsys, "import", str(csv_path), "--db", db_path)
+    assert status == 1
+    assert output == {"inserted": 4, "skipped": 1, "unknown": ["Unknown"]}
+
+    status, output = run_json(capsys, "stats", "--today", "2024-12-03", "--db", db_path)
+    assert status == 0
+    stats = {entry["habit"]: entry for entry in output["habits"]}
+    assert stats["Read"]["current_streak"] == 3
+    assert stats["Read"]["last_check_off"] == "2024-12-03"
+    assert stats["Study"]["current_streak"] == 1
+
+
+@pytest.mark.parametrize("content", ["Read,2024-12-01\nRead,2024-13-45\n", "Read,2024-12-01\nRead\n",
+                                     "Read,2024-12-01\nRead,2024-12-02,zz:99\n"])
+def test_import_invalid_rows(capsys, tmp_path, db_path, content):
+    """Test that an invalid date or a short row is an error with exit status 1 and nothing is imported."""
+    csv_path = tmp_path / "check_offs.csv"
+    csv_path.write_text(content)
+    status, output = run_json(capsys, "import", str(csv_path), "--db", db_path)
+    assert status == 1
+    assert output["status"] == "error"
+    assert output["error"].startswith("line 2:")
+    db = get_db(db_path)
+    assert db.execute("SELECT COUNT(*) FROM check_offs").fetchone()[0] == 0
+    db.close()
+
+
+@pytest.mark.parametrize("argv", [["add", "Write", "--periodicity", "daily", "--create-date", "garbage"],
+                                  ["checkoff", "Read", "--time", "not a time"],
+                                  ["checkoff", "Read", "--time", "25:00"]])
+def test_invalid_arguments(capsys, db_path, argv):
+    """Test that malformed dates and times are rejected by the argument parser and nothing is stored."""
+    with pytest.raises(SystemExit) as exit_info:
+        main([*argv, "--db", db_path])
+    assert exit_info.value.code == 2
+    assert "invalid" in capsys.readouterr().err
+    db = get_db(db_path)
+    assert db.execute("SELECT COUNT(*) FROM habits").fetchone()[0] == 2
+    assert db.execute("SELECT COUNT(*) FROM check_offs").fetchone()[0] == 0
+    db.close()
+
+
+def test_import_missing_file(capsys, tmp_path, db_path):
+    """Test that a missing CSV file is reported on stderr with exit status 1."""
+    capsys.readouterr()
+    assert main(["import", str(tmp_path / "missing.csv"), "--db", db_path]) == 1
+    assert capsys.readouterr().err.startswith("error:")
+
+
+def test_read_commands_skip_write_lock(capsys, db_path):
+    """Test that stats and report run while another connection holds the write lock."""
+    writer = get_db(db_path)
+    writer.execute("BEGIN IMMEDIATE")
+    try:
+        assert run_json(capsys, "stats", "--today", "2024-12-03", "--db", db_path)[0] == 0
+        assert run_json(capsys, "report", "--as-of", "2024-12-03", "--db", db_path)[0] == 0
+    finally:
+        writer.rollback()
+        writer.close()
+
+
+def test_one_transaction_per_invocation(db_path, monkeypatch):
+    """Test that a failing command rolls back the check-offs it already made."""
+    import cli
+
+    def fail(db, args):
+        cli.check_off_habit(db, "Read", "daily", None, None)
+        raise RuntimeError("interrupted")
+
+    monkeypatch.setattr(cli, "command_checkoff", fail)
+    with pytest.raises(RuntimeError):
+        main(["checkoff", "Read", "--db", db_path])
+    db = get_db(db_path)
+    assert db.execute("SELECT COUNT(*) FROM check_offs").fetchone()[0] == 0
+    db.close()
+
+
+def test_report(capsys, db_path):
+    """Test that the report gives completion rates per window as of the given date."""
+    assert main(["checkoff", "Read", "--date", "2024-12-02", "--db", db_path]) == 0
+    assert main(["checkoff", "Read", "Study", "--date", "2024-12-04", "--db", db_path]) == 0
+    status, output = run_json(capsys, "report", "--as-of", "2024-12-05", "--windows", "2", "7", "--db", db_path)
+    assert status == 0
+    assert output["as_of"] == "2024-12-05"
+    rates = {entry["habit"]: entry["completion_rates"] for entry in output["habits"]}
+    assert rates == {"Read": {"2": 0.5, "7": 0.5}, "Study": {"2": 1.0, "7": 1.0}}
+
+    capsys.readouterr()
+    assert main(["report", "--as-of", "2024-12-05", "--db", db_path]) == 0
+    assert "Last 365" in capsys.readouterr().out
+
+
+def test_rebuild_rollups(capsys, db_path):
+    """Test that rebuild-rollups recomputes the heatmap counts from the check-offs."""
+    assert main(["checkoff", "Read", "Study", "--date", "2024-12-04", "--db", db_path]) == 0
+    db = get_db(db_path)
+    db.execute("DELETE FROM day_rollups")
+    db.commit()
+    db.close()
+    status, output = run_json(capsys, "rebuild-rollups", "--db", db_path)
+    assert status == 0
+    assert output == {"days": 1, "weeks": 1, "habit_weeks": 2}
@@ -1,8 +1,14 @@
+import csv
+import io
+import random
+import sqlite3
+import threading
 import pytest
 from prettytable import PrettyTable
-from database import get_db, display_habits_table, display_check_offs_table, fetch_habit_from_db
+from database import get_db, create_tables, migrate, SCHEMA_VERSION, day_key, week_key, key_to_date, week_label, display_habits_table, display_check_offs_table, fetch_habit_from_db, fetch_habit_names, check_off_habit, check_off_many, fetch_streak_state, delete_habit, period_key, STREAK_COLUMNS, ConnectionPool, add_habit, rename_habit, delete_habits_by_source, habit_sources, SOURCE_USER, SOURCE_PREDEFINED, SOURCE_MOCK, INSERTED, DUPLICATE, ALREADY_CHECKED_OFF, RENAMED, fetch_check_offs_page, iter_check_offs, fetch_habits_page, iter_habits, habits_table_pages, check_offs_table_pages, export_check_offs_csv
 from habit import Habit
-from datetime import date
+from loading import load_predefined_habits
+from datetime import date, timedelta
 
 @pytest.fixture
 def db_connection():
@@ -98,3 +104,364 @@ def test_fetch_habit_from_db(db_connection):
     # Test fetching Habit 2
     fetched_habit_data = fetch_habit_from_db(db, "Habit 2")
     assert fetched_habit_data == ("Habit 2", "Weekly Habit 1", "weekly", "2024-11-19")
+
+
+def test_migrate_upgrades_existing_db(tmp_path):
+    """Test that get_db upgrades an unversioned database file in place and keeps its data."""
+    path = str(tmp_path / "old.db")
+    old_db = sqlite3.connect(path)
+    create_tables(old_db)  # schema as shipped before the migrations existed
+    old_db.execute("INSERT INTO habits VALUES ('Habit 1', 'Daily Habit 1', 'daily', '2024-12-01')")
+    old_db.execute("INSERT INTO habits VALUES ('Habit 2', 'Weekly Habit 1', 'weekly', '2024-11-19')")
+    old_db.execute("INSERT INTO habits VALUES ('stretching', 'stay flexible', 'daily', 'predefined')")
+    old_db.execute("INSERT INTO habits VALUES ('MOCK - Meditate', 'meditate', 'daily', '2024-11-01')")
+    old_db.execute("INSERT INTO check_offs (habit_name, check_off_date, check_off_time, streak_day_count) "
+                   "VALUES ('stretching', '2024-11-05', '07:00', 1)")
+    old_db.execute("INSERT INTO check_offs (habit_name, check_off_date, check_off_time, streak_day_count) "
+                   "VALUES ('Habit 1', '2024-12-01', '08:00', 1)")
+    old_db.execute("INSERT INTO check_offs (habit_name, check_off_date, check_off_time, calendar_week, streak_week_count) "
+                   "VALUES ('Habit 2', '2024-11-17', '09:00', '46-2024', 1)")
+    old_db.execute("INSERT INTO check_offs (habit_name, check_off_date, check_off_time, calendar_week, streak_week_count) "
+                   "VALUES ('Habit 2', '1969-12-20', '09:00', '51-1969', 1)")  # a week key below zero
+    old_db.execute("INSERT INTO check_offs (habit_name, check_off_date, check_off_time, streak_day_count) "
+                   "VALUES ('Deleted habit', '2024-12-01', '08:00', 1)")  # left behind without foreign keys
+    old_db.commit()
+    old_db.close()
+
+    db = get_db(path)
+    cur = db.cursor()
+    cur.execute("PRAGMA user_version")
+    assert cur.fetchone()[0] == SCHEMA_VERSION
+    cur.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'check_offs'")
+    indexes = {row[0] for row in cur.fetchall()}
+    assert "idx_check_offs_habit_period" in indexes
+    # the "week-year" text column has been replaced by integer period keys, the name by the habit's id
+    cur.execute("SELECT name, period_key FROM check_offs JOIN habits USING (habit_id) ORDER BY name, period_key")
+    assert cur.fetchall() == [("Habit 1", day_key(date(2024, 12, 1))), ("Habit 2", week_key(date(1969, 12, 20))),
+                              ("Habit 2", week_key(date(2024, 11, 17))), ("stretching", day_key(date(2024, 11, 5)))]
+    cur.execute("SELECT COUNT(*) FROM check_offs")
+    assert cur.fetchone()[0] == 4  # the orphaned check-off is gone
+    cur.execute("PRAGMA foreign_key_list(check_offs)")
+    assert [(row[2], row[3], row[6]) for row in cur.fetchall()] == [("habits", "habit_id", "CASCADE")]
+    assert fetch_habit_from_db(db, "Habit 1") == ("Habit 1", "Daily Habit 1", "daily", "2024-12-01")
+    # predefined and mock habits are tagged, the predefined one dates from its first check-off
+    cur.execute("SELECT name, source, create_date FROM habits ORDER BY habit_id")
+    assert cur.fetchall() == [("Habit 1", SOURCE_USER, "2024-12-01"), ("Habit 2", SOURCE_USER, "2024-11-19"),
+                              ("stretching", SOURCE_PREDEFINED, "2024-11-05"),
+                              ("MOCK - Meditate", SOURCE_MOCK, "2024-11-01")]
+
+    # the streak state is backfilled from the stored check-offs
+    assert fetch_streak_state(db, "Habit 2") == (1, week_key(date(2024, 11, 17)), 1, week_key(date(2024, 11, 17)), 2)
+    # and so are the heatmap rollups
+    cur.execute("SELECT week_key, check_offs FROM week_rollups ORDER BY week_key")
+    assert cur.fetchall() == [(week_key(date(1969, 12, 20)), 1), (week_key(date(2024, 11, 5)), 1),
+                              (week_key(date(2024, 11, 17)), 1),
+                              (week_key(date(2024, 12, 1)), 1)]
+
+    # running the migrations again is a no-op
+    assert migrate(db) == SCHEMA_VERSION
+    db.close()
+
+
+def test_check_off_lookup_uses_index(db_connection):
+    """Test that the per-habit check-off lookup is an index seek instead of a table scan."""
+    db = db_connection
+    cur = db.cursor()
+    cur.execute("EXPLAIN QUERY PLAN SELECT streak_day_count FROM check_offs WHERE habit_id = ? AND streak_day_count = ?",
+                (1, 2))
+    plan = " ".join(row[3] for row in cur.fetchall())
+    assert "USING COVERING INDEX" in plan
+
+
+def test_period_keys():
+    """Test that consecutive periods have consecutive integer keys, also across year boundaries."""
+    assert day_key(date(1970, 1, 1)) == 0
+    assert day_key(date(2024, 1, 1)) - day_key(date(2023, 12, 31)) == 1
+    assert week_key(date(2024, 12, 30)) - week_key(date(2024, 12, 29)) == 1  # Monday of ISO week 1-2025
+    assert week_key(date(2024, 11, 11)) == week_key(date(2024, 11, 17))  # same ISO week
+    assert key_to_date(day_key(date(2024, 12, 1)), "daily") == date(2024, 12, 1)
+    assert week_label(week_key(date(2024, 11, 11))) == "46-2024"
+    assert week_label(week_key(date(2024, 12, 30))) == "1-2025"
+
+
+def test_check_off_many(db_connection):
+    """Test bulk check-offs: streaks continue from stored rows, duplicates and unknown habits are skipped."""
+    db = db_connection
+    records = [
+        ("Habit 1", date.fromisoformat("2024-12-04"), "07:00"),
+        ("Habit 1", "2024-12-03", "07:30"),  # continues the stored 2-day streak, ISO strings are accepted
+        ("Habit 1", date.fromisoformat("2024-12-02"), "07:45"),  # already stored
+        ("Habit 1", date.fromisoformat("2024-12-03"), "08:00"),  # same day twice in the batch
+        ("Habit 2", date.fromisoformat("2024-11-18"), "09:00"),  # week after the stored weekly check-off
+        ("Habit 2", date.fromisoformat("2024-11-19"), "09:00"),  # same week
+        ("Unknown Habit", date.fromisoformat("2024-11-18"), "09:00"),
+    ]
+    summary = check_off_many(db, records)
+    assert summary == {"inserted": 3, "skipped": 4}
+
+    daily_table = display_check_offs_table(db, "Habit 1", "daily")
+    expected_daily_table = PrettyTable()
+    expected_daily_table.field_names = ["Check-Off-Dates", "Check-Off-Time", "Streak-Count"]
+    expected_daily_table.add_row(["2024-12-01", "08:00", 1])
+    expected_daily_table.add_row(["2024-12-02", "10:00", 2])
+    expected_daily_table.add_row(["2024-12-03", "07:30", 3])
+    expected_daily_table.add_row(["2024-12-04", "07:00", 4])
+    assert daily_table.get_string() == expected_daily_table.get_string()
+
+    cur = db.cursor()
+    cur.execute("SELECT streak_week_count FROM check_offs JOIN habits USING (habit_id) WHERE name = ? AND period_key = ?",
+                ("Habit 2", week_key(date.fromisoformat("2024-11-18"))))
+    assert cur.fetchone()[0] == 2
+
+
+def test_streak_state(db_connection):
+    """Test that check-offs keep the materialized streak state up to date, also for backdated check-offs."""
+    db = db_connection
+    december_2 = day_key(date(2024, 12, 2))
+    assert fetch_streak_state(db, "Habit 1") == (2, december_2, 2, december_2, 1)
+    assert fetch_streak_state(db, "Habit 3") is None  # never checked off
+
+    habit_1 = Habit("Habit 1", "Daily Habit 1", "daily")
+    habit_1.check_off(db, date.fromisoformat("2024-12-05"), "08:00")
+    habit_1.check_off(db, date.fromisoformat("2024-12-06"), "08:00")  # ties the record
+    december_6 = day_key(date(2024, 12, 6))
+    assert fetch_streak_state(db, "Habit 1") == (2, december_6, 2, december_6, 2)
+
+    habit_1.check_off(db, date.fromisoformat("2024-11-20"), "08:00")  # backdated, doesn't touch the current streak
+    assert fetch_streak_state(db, "Habit 1") == (2, december_6, 2, december_6, 2)
+
+
+def test_delete_habit(db_connection):
+    """Test that deleting a habit removes its check-offs and streak state."""
+    db = db_connection
+    cur = db.cursor()
+    cur.execute("SELECT habit_id FROM habits WHERE name = ?", ("Habit 1",))
+    habit_id = cur.fetchone()[0]
+    delete_habit(db, "Habit 1")
+
+    cur.execute("SELECT COUNT(*) FROM check_offs WHERE habit_id = ?", (habit_id,))
+    assert cur.fetchone()[0] == 0
+    cur.execute("SELECT COUNT(*) FROM habit_streak_state WHERE habit_id = ?", (habit_id,))
+    assert cur.fetchone()[0] == 0
+    assert fetch_streak_state(db, "Habit 1") is None
+    assert fetch_streak_state(db, "Habit 2") is not None
+
+
+def test_delete_needs_foreign_keys(tmp_path):
+    """Test that deletes on a connection without foreign keys raise instead of orphaning check-offs."""
+    path = str(tmp_path / "habits.db")
+    db = get_db(path)
+    Habit("Habit 1", "Daily Habit 1", "daily", "2024-12-01").store(db)
+    Habit("Habit 1", "Daily Habit 1", "daily").check_off(db, date(2024, 12, 1), "08:00")
+    db.close()
+
+    plain = sqlite3.connect(path)
+    for delete in (lambda: delete_habit(plain, "Habit 1"), lambda: delete_habits_by_source(plain, SOURCE_USER)):
+        with pytest.raises(ValueError, match="foreign keys"):
+            delete()
+    assert plain.execute("SELECT COUNT(*) FROM habits").fetchone()[0] == 1
+    assert plain.execute("SELECT COUNT(*) FROM check_offs").fetchone()[0] == 1
+    plain.execute("PRAGMA foreign_keys = ON")
+    delete_habit(plain, "Habit 1")
+    assert plain.execute("SELECT COUNT(*) FROM check_offs").fetchone()[0] == 0
+    plain.close()
+
+
+def test_rename_habit(db_connection):
+    """Test that a renamed habit keeps its check-offs and streak state and that names stay unique."""
+    db = db_connection
+    state = fetch_streak_state(db, "Habit 1")
+    assert fetch_habit_from_db(db, "Habit 1") is not None  # cached under the old name
+
+    assert rename_habit(db, "Habit 1", "Morning walk") == {"status": RENAMED, "habit": "Morning walk"}
+    assert fetch_habit_from_db(db, "Morning walk") == ("Morning walk", "Daily Habit 1", "daily", "2024-12-01")
+    assert fetch_streak_state(db, "Morning walk") == state
+    assert [row[0] for row in iter_check_offs(db, "Morning walk")] == ["2024-12-01", "2024-12-02"]
+    assert check_off_habit(db, "Morning walk", "daily", date(2024, 12, 3), "08:00")["streak_count"] == 3
+
+    assert rename_habit(db, "Morning walk", "Habit 2")["status"] == DUPLICATE
+    with pytest.raises(KeyError):
+        rename_habit(db, "Habit 1", "Evening walk")
+
+
+def test_habit_sources(db_connection):
+    """Test that a batch of habits is listed and deleted by its source, together with its check-offs."""
+    db = db_connection
+    for number in range(5):
+        add_habit(db, f"Load test {number}", "synthetic", "daily", "2024-12-01", source="batch-7")
+    check_off_many(db, [(f"Load test {number}", date(2024, 12, day), "08:00") for number in range(5) for day in (1, 2)])
+    assert habit_sources(db) == {"batch-7": 5, SOURCE_USER: 3}
+    assert [row[0] for row in iter_habits(db, source="batch-7", page_size=2)] == [f"Load test {n}" for n in range(5)]
+
+    plan = " ".join(row[3] for row in db.execute("EXPLAIN QUERY PLAN DELETE FROM habits WHERE source = ?", ("batch-7",)))
+    assert "idx_habits_source" in plan
+    assert delete_habits_by_source(db, "batch-7") == 5
+    assert habit_sources(db) == {SOURCE_USER: 3}
+    assert db.execute("SELECT COUNT(*) FROM check_offs").fetchone()[0] == 3  # the fixture's check-offs
+    assert fetch_habit_names(db) == ["Habit 1", "Habit 2", "Habit 3"]
+
+
+def test_predefined_habits_source():
+    """Test that predefined habits are tagged by their source and get a real create date."""
+    db = get_db(":memory:")
+    load_predefined_habits(db)
+    assert habit_sources(db) == {SOURCE_PREDEFINED: 6}
+    assert {row[3] for row in iter_habits(db)} == {str(date.today())}
+    db.close()
+
+
+def test_check_off_unknown_habit(db_connection):
+    """Test that check-offs need an existing habit."""
+    with pytest.raises(KeyError):
+        check_off_habit(db_connection, "Unknown", "daily", date(2024, 12, 1), "08:00")
+    with pytest.raises(sqlite3.IntegrityError):
+        db_connection.execute("INSERT INTO check_offs (habit_id, period_key) VALUES (999, 1)")
+
+
+def test_write_results(db_connection, caplog):
+    """Test the result dictionaries of add_habit and check_off_habit and that they log instead of printing."""
+    db = db_connection
+    assert add_habit(db, "Habit 4", "Daily Habit 3", "daily") == {"status": INSERTED, "habit": "Habit 4"}
+    assert add_habit(db, "Habit 4", "Daily Habit 3", "daily") == {"status": DUPLICATE, "habit": "Habit 4"}
+
+    with caplog.at_level("INFO", logger="database"):
+        result = check_off_habit(db, "Habit 1", "daily", date(2024, 12, 3), "08:00")
+    assert result == {"status": INSERTED, "habit": "Habit 1", "period": date(2024, 12, 3), "streak_count": 3}
+    assert "Habit 1" in caplog.text
+
+    result = check_off_habit(db, "Habit 2", "weekly", date(2024, 11, 13), "08:00")
+    assert result == {"status": ALREADY_CHECKED_OFF, "habit": "Habit 2", "period": "46-2024", "streak_count": None}
+
+
+def test_check_offs_pagination(db_connection):
+    """Test keyset pagination over check-offs and resuming from a cursor."""
+    db = db_connection
+    check_off_many(db, [("Habit 3", date(2024, 12, 5) + timedelta(days=offset), "07:00") for offset in range(5)])
+
+    rows, cursor = fetch_check_offs_page(db, "Habit 3", page_size=2)
+    assert [row[0] for row in rows] == ["2024-12-05", "2024-12-06"]
+    assert cursor == day_key(date(2024, 12, 6))
+
+    # resume after the first page
+    rest = list(iter_check_offs(db, "Habit 3", page_size=2, after=cursor))
+    assert [row[0] for row in rest] == ["2024-12-07", "2024-12-08", "2024-12-09"]
+    assert [row[3] for row in rest] == [3, 4, 5]
+
+    assert len(list(iter_check_offs(db, "Habit 3", page_size=5))) == 5
+    assert [len(table.rows) for table in check_offs_table_pages(db, "Habit 3", "daily", page_size=2)] == [2, 2, 1]
+
+
+def test_habits_pagination(db_connection):
+    """Test that paginated habits keep the display order across pages."""
+    db = db_connection
+    rows, cursor = fetch_habits_page(db, page_size=1)
+    assert rows == [("Habit 1", "Daily Habit 1", "daily", "2024-12-01")]
+
+    assert [row[0] for row in iter_habits(db, page_size=1, after=cursor)] == ["Habit 3", "Habit 2"]
+    assert [row[0] for row in iter_habits(db, "daily", page_size=1)] == ["Habit 1", "Habit 3"]
+    assert [len(table.rows) for table in habits_table_pages(db, page_size=2)] == [2, 1]
+
+
+def test_export_check_offs_csv(db_connection):
+    """Test streaming check-offs to CSV."""
+    db = db_connection
+    file = io.StringIO(newline="")
+    assert export_check_offs_csv(db, "Habit 2", "weekly", file, page_size=1) == 1
+
+    file.seek(0)
+    assert list(csv.reader(file)) == [["Check-Off-Dates", "Check-Off-Time", "Check-Off-Week", "Streak-Count"],
+                                      ["2024-11-11", "09:00", "46-2024", "1"]]
+
+
+def recompute_streaks(keys):
+    """Reference implementation: streak count of every period key, computed from scratch."""
+    streaks = {}
+    for key in sorted(keys):
+        streaks[key] = streaks.get(key - 1, 0) + 1
+    return streaks
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("periodicity", ["daily", "weekly"])
+def test_out_of_order_check_offs_match_recomputation(seed, periodicity):
+    """
+    Property test: check-offs in random order, single and in bulk, store the same streak counts and streak state
+    as a from-scratch recomputation.
+    """
+    rng = random.Random(seed)
+    db = get_db(":memory:")
+    Habit("Habit", "random history", periodicity).store(db)
+    step = timedelta(days=1) if periodicity == "daily" else timedelta(weeks=1)
+    dates = [date(2024, 1, 1) + i * step for i in range(60) if rng.random() < 0.7]
+    rng.shuffle(dates)
+
+    # first half one by one, second half in randomly sized batches
+    half = len(dates) // 2
+    for check_off_date in dates[:half]:
+        check_off_habit(db, "Habit", periodicity, check_off_date, "08:00")
+    rest = dates[half:]
+    while rest:
+        size = rng.randint(1, 10)
+        check_off_many(db, [("Habit", check_off_date, "08:00") for check_off_date in rest[:size]])
+        rest = rest[size:]
+
+    expected = recompute_streaks(period_key(check_off_date, periodicity) for check_off_date in dates)
+    cur = db.cursor()
+    cur.execute(f"SELECT period_key, {STREAK_COLUMNS[periodicity]} FROM check_offs")
+    assert dict(cur.fetchall()) == expected
+
+    last_key = max(expected)
+    longest = max(expected.values())
+    ends = [key for key, count in expected.items() if count == longest]
+    assert fetch_streak_state(db, "Habit") == (expected[last_key], last_key, longest, max(ends), len(ends))
+    db.close()
+
+
+def test_connection_pool(tmp_path):
+    """Test that the pool hands out one WAL connection per thread and checks the schema once."""
+    pool = ConnectionPool(str(tmp_path / "pool.db"), busy_timeout=2000)
+    db = pool.connection()
+    assert pool.connection() is db  # reused within a thread
+    assert db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert db.execute("PRAGMA busy_timeout").fetchone()[0] == 2000
+    assert db.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(pool.connection()))
+    thread.start()
+    thread.join()
+    assert other[0] is not db
+    pool.close()
+
+    with pytest.raises(ValueError):
+        ConnectionPool(str(tmp_path / "pool.db"), synchronous="SOMETIMES")
+
+
+def test_connection_pool_concurrent_check_offs(tmp_path):
+    """Test that concurrent check-offs through a pool neither fail with "database is locked" nor corrupt streaks."""
+    pool = ConnectionPool(str(tmp_path / "pool.db"))
+    Habit("Shared", "checked off by every thread", "daily").store(pool)
+    errors = []
+
+    def worker(number):
+        try:
+            habit = Habit(f"Habit {number}", "own habit", "daily")
+            habit.store(pool)
+            for day in range(30):
+                check_off_date = date(2024, 1, 1) + timedelta(days=day)
+                habit.check_off(pool, check_off_date, "08:00")
+                check_off_habit(pool, "Shared", "daily", check_off_date, "08:00")  # same days from every thread
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=worker, args=(number,)) for number in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    january_30 = day_key(date(2024, 1, 30))
+    assert fetch_streak_state(pool, "Shared") == (30, january_30, 30, january_30, 1)
+    assert fetch_streak_state(pool, "Habit 7") == (30, january_30, 30, january_30, 1)
+    pool.close()
@@ -1,7 +1,10 @@
+import sys
 import pytest
+import numpy as np
 from datetime import date, timedelta, datetime
-from habit import Habit
-from database import get_db
+from habit import Habit, HabitCollection
+from database import get_db, week_key
+from storage import SQLiteBackend, MmapLogBackend
 
 
 @pytest.fixture
@@ -27,6 +30,30 @@ def setup_weekly_habit(db_connection):
     habit.store(db)  # Store the habit in the database
     return db, habit
 
+@pytest.fixture(params=["sqlite", "mmap"])
+def any_backend(request, tmp_path):
+    """Fixture for an empty storage backend, the streak tests run against every backend."""
+    if request.param == "sqlite":
+        backend = SQLiteBackend(get_db(":memory:"))
+    else:
+        backend = MmapLogBackend(str(tmp_path / "check_offs.log"))
+    yield backend
+    backend.close()
+
+@pytest.fixture
+def daily_habit_any_backend(any_backend):
+    """Fixture for setting up a daily habit in every storage backend."""
+    habit = Habit(name="Exercise", description="Daily workout", periodicity="daily")
+    habit.store(any_backend)
+    return any_backend, habit
+
+@pytest.fixture
+def weekly_habit_any_backend(any_backend):
+    """Fixture for setting up a weekly habit in every storage backend."""
+    habit = Habit(name="Study", description="Weekly study session", periodicity="weekly")
+    habit.store(any_backend)
+    return any_backend, habit
+
 #date.today() - timedelta(days=x)
 def test_habit_creation():
     """Test creation of Habit objects."""
@@ -48,7 +75,7 @@ def test_store_habit(db_connection):
 
     # Verify the habit exists in the database
     cur = db.cursor()
-    cur.execute("SELECT * FROM habits WHERE name=?", (habit.name,))
+    cur.execute("SELECT name, description, periodicity, create_date FROM habits WHERE name=?", (habit.name,))
     result = cur.fetchone()
     assert result is not None
     assert result[0] == "Test Habit"
@@ -74,7 +101,7 @@ def test_check_off_daily_habit_default_date(setup_daily_habit):
     now = datetime.now()
     check_off_time = now.strftime("%H:%M")
     cur = db.cursor()
-    cur.execute("SELECT * FROM check_offs WHERE habit_name=?", (habit.name,))
+    cur.execute("SELECT check_offs.* FROM check_offs JOIN habits USING (habit_id) WHERE name=?", (habit.name,))
     result = cur.fetchone()
 
     assert result is not None
@@ -97,7 +124,7 @@ def test_streak_day_increment(setup_daily_habit):
 
     cur = db.cursor()
     cur.execute(
-        "SELECT streak_day_count FROM check_offs WHERE habit_name=? AND check_off_date=?",
+        "SELECT streak_day_count FROM check_offs JOIN habits USING (habit_id) WHERE name=? AND check_off_date=?",
         (habit.name, "2024-11-14"))
     result = cur.fetchone()
     assert result[0] == 4
@@ -111,7 +138,7 @@ def test_streak_day_reset(setup_daily_habit):
     habit.check_off(db, date.fromisoformat("2024-11-14"))  # Skip one day
 
     cur = db.cursor()
-    cur.execute("SELECT streak_day_count FROM check_offs WHERE habit_name=? AND check_off_date=?",
+    cur.execute("SELECT streak_day_count FROM check_offs JOIN habits USING (habit_id) WHERE name=? AND check_off_date=?",
         (habit.name, "2024-11-14"),)
     result = cur.fetchone()
     assert result[0] == 1  # Streak reset
@@ -131,8 +158,8 @@ def test_weekly_streak_increment(setup_weekly_habit):
 
     cur = db.cursor()
     cur.execute(
-        "SELECT streak_week_count FROM check_offs WHERE habit_name=? AND calendar_week=?",
-        (habit.name, "48-2024"),
+        "SELECT streak_week_count FROM check_offs JOIN habits USING (habit_id) WHERE name=? AND period_key=?",
+        (habit.name, week_key(date.fromisoformat("2024-11-29"))),
     )
     result = cur.fetchone()
     assert result[0] == 3  # Third week in a row
@@ -147,8 +174,8 @@ def test_weekly_streak_reset(setup_weekly_habit):
 
     cur = db.cursor()
     cur.execute(
-        "SELECT streak_week_count FROM check_offs WHERE habit_name=? AND calendar_week=?",
-        (habit.name, "50-2024"))
+        "SELECT streak_week_count FROM check_offs JOIN habits USING (habit_id) WHERE name=? AND period_key=?",
+        (habit.name, week_key(date.fromisoformat("2024-12-10"))))
     result = cur.fetchone()
     assert result[0] == 1  # Streak reset
 
@@ -161,7 +188,7 @@ def test_prevent_double_check_off(setup_daily_habit):
 
     cur = db.cursor()
     cur.execute(
-        "SELECT * FROM check_offs WHERE habit_name=? AND check_off_date=?",
+        "SELECT check_offs.* FROM check_offs JOIN habits USING (habit_id) WHERE name=? AND check_off_date=?",
         (habit.name, "2024-11-14"))
     result = cur.fetchall()
     assert len(result) == 1  # Only one entry exists
@@ -175,33 +202,33 @@ def test_prevent_double_week_check_off(setup_weekly_habit):
 
     cur = db.cursor()
     cur.execute(
-        "SELECT * FROM check_offs WHERE habit_name=? AND calendar_week=?",
-        (habit.name, "50-2024"))
+        "SELECT check_offs.* FROM check_offs JOIN habits USING (habit_id) WHERE name=? AND period_key=?",
+        (habit.name, week_key(date.fromisoformat("2024-12-10"))))
     result = cur.fetchall()
     assert len(result) == 1  # Only one entry exists for the week
 
 
 # Current streak tests
-def test_current_streak_no_check_off_daily(setup_daily_habit):
+def test_current_streak_no_check_off_daily(daily_habit_any_backend):
     """Test current streak method for a daily habit with no check-offs."""
-    db, habit = setup_daily_habit
+    db, habit = daily_habit_any_backend
     result = habit.current_streak(db)
     assert result["current_streak"] == 0
     assert "Check \"Exercise\" off today to continue or start a streak." in result["message"]
 
 
-def test_current_streak_started_daily(setup_daily_habit):
+def test_current_streak_started_daily(daily_habit_any_backend):
     """Test current streak method for a daily habit with a single check-off."""
-    db, habit = setup_daily_habit
+    db, habit = daily_habit_any_backend
     habit.check_off(db)  # Check off the habit today
     result = habit.current_streak(db)
     assert result["current_streak"] == 1
     assert "You just started your \"Exercise\"-streak today. Keep going!" in result["message"]
 
 
-def test_current_streak_ongoing_daily(setup_daily_habit):
+def test_current_streak_ongoing_daily(daily_habit_any_backend):
     """Test current streak method for a daily habit with multiple consecutive check-offs."""
-    db, habit = setup_daily_habit
+    db, habit = daily_habit_any_backend
     habit.check_off(db, date.today() - timedelta(days=6))
     habit.check_off(db, date.today() - timedelta(days=5))
     habit.check_off(db, date.today() - timedelta(days=4))
@@ -214,26 +241,26 @@ def test_current_streak_ongoing_daily(setup_daily_habit):
     assert "Well done! You've kept your \"Exercise\"-streak alive for 7 consecutive days already." in result["message"]
 
 
-def test_current_streak_no_check_off_weekly(setup_weekly_habit):
+def test_current_streak_no_check_off_weekly(weekly_habit_any_backend):
     """Test current streak method for a weekly habit with no check-offs."""
-    db, habit = setup_weekly_habit
+    db, habit = weekly_habit_any_backend
     result = habit.current_streak(db)
     assert result["current_streak"] == 0
     assert "Check \"Study\" off this week to continue or start a streak." in result["message"]
 
 
-def test_current_streak_started_weekly(setup_weekly_habit):
+def test_current_streak_started_weekly(weekly_habit_any_backend):
     """Test current streak method for a weekly habit with a single check-off."""
-    db, habit = setup_weekly_habit
+    db, habit = weekly_habit_any_backend
     habit.check_off(db)  # Check off the habit today
     result = habit.current_streak(db)
     assert result["current_streak"] == 1
     assert "You just started your \"Study\"-streak this week. Keep going!" in result["message"]
 
 
-def test_current_streak_ongoing_weekly(setup_weekly_habit):
+def test_current_streak_ongoing_weekly(weekly_habit_any_backend):
     """Test current streak method for a weekly habit with multiple consecutive check-offs."""
-    db, habit = setup_weekly_habit
+    db, habit = weekly_habit_any_backend
     habit.check_off(db, date.today() - timedelta(weeks=3))
     habit.check_off(db, date.today() - timedelta(weeks=2))
     habit.check_off(db, date.today() - timedelta(weeks=1))
@@ -244,20 +271,20 @@ def test_current_streak_ongoing_weekly(setup_weekly_habit):
 
 
 # Longest streak tests
-def test_longest_streak_no_check_off_daily(setup_daily_habit):
+def test_longest_streak_no_check_off_daily(daily_habit_any_backend):
     """Test longest streak method for a daily habit with no check-offs."""
-    db, habit = setup_daily_habit
+    db, habit = daily_habit_any_backend
     result = habit.longest_streak(db)
     assert result["longest_streak"] == 0
     assert "You haven't started checking off \"Exercise\" yet." in result["message"]
 
-def test_longest_streak_single_streak_daily(setup_daily_habit):
+def test_longest_streak_single_streak_daily(daily_habit_any_backend):
     """
     Test longest streak method for a daily habit with a single streak.
     Check for differentiation between longest = ongoing vs. finished streak.
     """
     # finished streak
-    db, habit = setup_daily_habit
+    db, habit = daily_habit_any_backend
     habit.check_off(db, date.today() - timedelta(days=10))
     habit.check_off(db, date.today() - timedelta(days=9))
     habit.check_off(db, date.today() - timedelta(days=8)) # end of a 3-streak
@@ -282,12 +309,12 @@ def test_longest_streak_single_streak_daily(setup_daily_habit):
     assert f"Your longest \"Exercise\"-streak is 7 day(s) and is still going. Don't stop here." in result["message"]
 
 
-def test_longest_streak_multiple_streaks_daily(setup_daily_habit):
+def test_longest_streak_multiple_streaks_daily(daily_habit_any_backend):
     """
     Test longest streak method for a daily habit with multiple longest streaks.
     Check for differentiation between longest = ongoing vs. finished streak
     """
-    db, habit = setup_daily_habit
+    db, habit = daily_habit_any_backend
     # Create three separate 2-day streaks. no ongoing one
     habit.check_off(db, date.today() - timedelta(days=10))
     habit.check_off(db, date.today() - timedelta(days=9))
@@ -309,12 +336,12 @@ def test_longest_streak_multiple_streaks_daily(setup_daily_habit):
 
 
 
-def test_longest_streak_single_streak_weekly(setup_weekly_habit):
+def test_longest_streak_single_streak_weekly(weekly_habit_any_backend):
     """
     Test longest streak method for a weekly habit with single longest streak.
     Check for differentiation between longest = ongoing vs. finished streak.
     """
-    db, habit = setup_weekly_habit
+    db, habit = weekly_habit_any_backend
     habit.check_off(db, date.today() - timedelta(weeks=8))
     habit.check_off(db, date.today() - timedelta(weeks=7))
     habit.check_off(db, date.today() - timedelta(weeks=6))
@@ -334,12 +361,12 @@ def test_longest_streak_single_streak_weekly(setup_weekly_habit):
     assert f"Your longest \"Study\"-streak is 9 week(s) and is still going." in result["message"]
 
 
-def test_longest_streak_multiple_streaks_weekly(setup_weekly_habit):
+def test_longest_streak_multiple_streaks_weekly(weekly_habit_any_backend):
     """
     Test longest streak method for a weekly habit with multiple longest streaks.
     Check for differentiation between longest = ongoing vs. finished streak
     """
-    db, habit = setup_weekly_habit
+    db, habit = weekly_habit_any_backend
     # Create two separate 3-day streaks. no ongoing one
     habit.check_off(db, date.today() - timedelta(weeks=10))
     habit.check_off(db, date.today() - timedelta(weeks=9))
@@ -360,3 +387,43 @@ def test_longest_streak_multiple_streaks_weekly(setup_weekly_habit):
     assert result["longest_streak"] == 3
     expected_message = f"\nLongest Streak: You've had 3 separate longest streaks of 3 week(s) for \"Study\". Check it off next week to set a new record."
     assert expected_message in result["message"]
+
+
+def test_habit_has_no_instance_dict():
+    """Test that Habit objects use __slots__."""
+    habit = Habit("Exercise", "Daily workout", "daily")
+    assert not hasattr(habit, "__dict__")
+    with pytest.raises(AttributeError):
+        habit.streak = 1
+
+
+def test_habit_collection(db_connection):
+    """Test bulk loading, filtering and sorting a HabitCollection."""
+    db = db_connection
+    Habit("b daily", "Daily", "daily", "2024-12-02").store(db)
+    Habit("A weekly", "Weekly", "weekly", "2024-12-01").store(db)
+    Habit("c daily", "Daily", "daily", "predefined").store(db)
+
+    Habit("d weekly", "Weekly", "weekly", "2024-02-30").store(db)
+
+    habits = HabitCollection.from_db(db, chunk_size=2).take(np.arange(3))
+    assert len(habits) == 3
+    assert habits.create_ordinals.tolist() == [date(2024, 12, 2).toordinal(), date(2024, 12, 1).toordinal(), 0]
+    assert habits.periodicity_codes.tolist() == [0, 1, 0]
+    assert habits.names[0] is sys.intern("b daily")
+    weekly = HabitCollection.from_db(db, "weekly")
+    assert list(weekly.names) == ["A weekly", "d weekly"]
+    assert weekly[1].create_date == "2024-02-30"
+    db.execute("BEGIN")
+    assert len(HabitCollection.from_db(db)) == 4
+    assert db.in_transaction  # a caller's transaction is left open
+    db.rollback()
+    assert [habit.name for habit in habits.sort()] == ["A weekly", "b daily", "c daily"]
+    assert [habit.name for habit in habits.sort("periodicity")] == ["c daily", "b daily", "A weekly"]
+    assert list(habits.sort("create_date", reverse=True).names) == ["b daily", "A weekly", "c daily"]
+
+    daily = habits.filter_periodicity("daily")
+    assert sorted(daily.names) == ["b daily", "c daily"]
+    habit = daily.sort()[1]
+    assert (habit.name, habit.description, habit.periodicity, habit.create_date) == ("c daily", "Daily", "daily", "predefined")
+    assert str(habits.sort()[0]) == str(Habit("A weekly", "Weekly", "weekly", "2024-12-01"))
@@ -0,0 +1,92 @@
+import pytest
+from datetime import date
+from database import get_db, ConnectionPool
+from habit import Habit
+from instrumentation import profiler, normalize_sql
+
+
+@pytest.fixture
+def db_connection():
+    """Fixture for an in-memory database with one habit and a clean, disabled profiler."""
+    db = get_db(":memory:")
+    Habit("Habit 1", "Daily Habit 1", "daily", "2024-12-01").store(db)
+    profiler.reset()
+    yield db
+    profiler.disable()
+    profiler.reset()
+    db.close()
+
+
+def test_disabled_profiler_records_nothing(db_connection):
+    """Test that nothing is recorded and no callbacks stay installed while the profiler is disabled."""
+    db = db_connection
+    Habit("Habit 1", "Daily Habit 1", "daily").check_off(db, date(2024, 12, 1), "08:00")
+    assert profiler.stats() == {"functions": {}, "statements": {}}
+
+
+def test_profiler_records_functions_and_statements(db_connection):
+    """Test that enabled profiling records nested function calls and the statements they run."""
+    db = db_connection
+    habit = Habit("Habit 1", "Daily Habit 1", "daily")
+    profiler.enable()
+    habit.check_off(db, date(2024, 12, 1), "08:00")
+    habit.check_off(db, date(2024, 12, 2), "08:00")
+    assert habit.longest_streak(db)["longest_streak"] == 2
+    profiler.disable()
+
+    stats = profiler.stats()
+    assert stats["functions"]["habit.Habit.check_off"]["calls"] == 2
+    assert stats["functions"]["database.check_off_habit"]["calls"] == 2
+    assert stats["functions"]["analyse.longest_streak_calculation"]["calls"] == 1
+    assert sum(stats["functions"]["habit.Habit.check_off"]["histogram_us"].values()) == 2
+    inserts = [sql for sql in stats["statements"] if sql.startswith("INSERT INTO check_offs")]
+    assert len(inserts) == 1 and stats["statements"][inserts[0]]["calls"] == 2
+    assert "Function" in profiler.report()
+
+    # the callbacks are removed after the call, later statements aren't recorded
+    db.execute("SELECT 1")
+    assert profiler.stats()["statements"] == stats["statements"]
+
+
+def test_profiler_with_connection_pool(tmp_path):
+    """Test that instrumented calls find the connection of a ConnectionPool."""
+    pool = ConnectionPool(str(tmp_path / "test.db"))
+    profiler.reset()
+    profiler.enable()
+    try:
+        Habit("Habit 1", "Daily Habit 1", "daily").store(pool)
+    finally:
+        profiler.disable()
+        pool.close()
+    assert any(sql.startswith("INSERT INTO habits") for sql in profiler.stats()["statements"])
+    profiler.reset()
+
+
+def test_profiler_keeps_connection_callbacks(db_connection):
+    """Test that the caller's trace and progress callbacks run while profiling and are restored afterwards."""
+    db = db_connection
+    traced, progress_calls = [], []
+
+    def progress():
+        progress_calls.append(1)
+        return 0
+
+    db.set_trace_callback(traced.append)
+    db.set_progress_handler(progress, 30)
+    profiler.enable()
+    Habit("Habit 1", "Daily Habit 1", "daily").check_off(db, date(2024, 12, 1), "08:00")
+    profiler.disable()
+    assert any("INSERT INTO check_offs" in sql for sql in traced)
+    assert progress_calls
+    assert sum(timing["vm_steps"] for timing in profiler.stats()["statements"].values()) > 0
+    assert (db.trace_callback, db.progress_handler) == (traced.append, (progress, 30))
+
+    traced.clear()
+    db.execute("SELECT COUNT(*) FROM habits").fetchone()
+    assert traced == ["SELECT COUNT(*) FROM habits"]
+
+
+def test_normalize_sql():
+    """Test that inlined parameters are replaced by placeholders."""
+    assert normalize_sql("SELECT * FROM t WHERE a = 'it''s'  AND\n b = -12.5 AND c3 = 4") == \
+           "SELECT * FROM t WHERE a = ? AND b = ? AND c3 = ?"
@@ -0,0 +1,120 @@
+import pytest
+import numpy as np
+from datetime import date, timedelta
+from database import (get_db, add_habit, check_off_habit, check_off_many, delete_habit, delete_habits_by_source,
+                      rebuild_rollups, day_key, week_key)
+from rollups import day_counts, week_counts, heatmap
+from snapshot import export_snapshot, import_snapshot
+from synthetic import load_synthetic_data, delete_synthetic_data
+
+ROLLUP_TABLES = ("day_rollups", "week_rollups", "habit_week_rollups")
+
+
+@pytest.fixture
+def db_connection():
+    """Fixture for a database with two daily habits and a weekly habit, partly checked off before 1970."""
+    db = get_db(":memory:")
+    add_habit(db, "Exercise", "Daily workout", "daily", "2024-11-01")
+    add_habit(db, "Reading", "Read a chapter", "daily", "2024-11-01")
+    add_habit(db, "Study", "Weekly study session", "weekly", "2024-11-01", source="import-1")
+    check_off_many(db, [("Exercise", date(2024, 12, 1) + timedelta(days=day), "08:00") for day in range(10)] +
+                   [("Reading", date(2024, 12, 3) + timedelta(days=day), "21:00") for day in (0, 2, 4, 5)] +
+                   [("Study", date(2024, 11, 27) + timedelta(weeks=week), "18:00") for week in (0, 1, 3)] +
+                   [("Exercise", date(1969, 12, 28), "08:00"), ("Exercise", date(1969, 12, 29), "08:00")])
+    yield db
+    db.close()
+
+
+def rollups(db):
+    """All rollup rows, to compare incrementally maintained rollups with rebuilt ones."""
+    return [db.execute(f"SELECT * FROM {table} ORDER BY 1, 2").fetchall()
+            for table in ROLLUP_TABLES]
+
+
+def assert_rollups_match_rebuild(db):
+    maintained = rollups(db)
+    rebuild_rollups(db)
+    assert rollups(db) == maintained
+
+
+def test_rollups_follow_writes(db_connection, tmp_path):
+    """Test that check-offs, deletes, snapshot imports and synthetic loads keep the rollups up to date."""
+    db = db_connection
+    assert_rollups_match_rebuild(db)
+    check_off_habit(db, "Reading", "daily", date(2024, 12, 4), "21:00")  # backdated
+    check_off_habit(db, "Study", "weekly", date(2024, 12, 2), "18:00")  # already checked off that week
+    assert_rollups_match_rebuild(db)
+
+    path = str(tmp_path / "user.habits")
+    export_snapshot(db, path)
+    delete_habit(db, "Reading")
+    assert_rollups_match_rebuild(db)
+    import_snapshot(db, path, on_conflict="replace")
+    assert_rollups_match_rebuild(db)
+    delete_habits_by_source(db, "import-1")
+    assert_rollups_match_rebuild(db)
+
+    load_synthetic_data(db, habits=20, years=1, end=date(2024, 12, 31))
+    assert_rollups_match_rebuild(db)
+    delete_synthetic_data(db)
+    assert_rollups_match_rebuild(db)
+    assert rebuild_rollups(db)["habit_weeks"] == len(rollups(db)[2])
+
+
+def test_delete_all_habits_empties_rollups(db_connection):
+    """Test that deleting every habit leaves no rollup rows behind, not even rows with count 0."""
+    db = db_connection
+    delete_habit(db, "Exercise")
+    delete_habits_by_source(db, "user")
+    delete_habits_by_source(db, "import-1")
+    for table in ROLLUP_TABLES:
+        assert db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] == 0
+
+
+def test_day_and_week_counts(db_connection):
+    """Test the dense counts of all habits and of single habits against the check-offs."""
+    db = db_connection
+    start, end = date(2024, 11, 25), date(2024, 12, 12)
+    days = day_counts(db, start, end)
+    assert len(days) == 18
+    expected = np.zeros(18, dtype=np.int64)
+    for name, check_off_date in db.execute("SELECT name, check_off_date FROM check_offs JOIN habits USING (habit_id)"):
+        check_off_date = date.fromisoformat(check_off_date)
+        if start <= check_off_date <= end:
+            expected[(check_off_date - start).days] += 1
+    assert days.tolist() == expected.tolist()
+    assert day_counts(db, start, end, "Study").tolist() == [0, 0, 1] + [0] * 6 + [1] + [0] * 8
+    assert day_counts(db, date(1969, 12, 27), date(1969, 12, 30), "Exercise").tolist() == [0, 1, 1, 0]
+
+    assert week_counts(db, start, end).tolist() == [2, 12, 2]
+    assert week_counts(db, start, end, "Reading").tolist() == [0, 4, 0]
+    assert week_counts(db, date(1969, 12, 28), date(1969, 12, 29), "Exercise").tolist() == [1, 1]
+    assert week_counts(db, date(2020, 1, 1), date(2020, 1, 31)).tolist() == [0] * 5
+    with pytest.raises(KeyError):
+        week_counts(db, start, end, "Unknown")
+
+
+def test_heatmap(db_connection):
+    """Test the calendar layout: one column per ISO week, Monday first, days outside the range marked -1."""
+    db = db_connection
+    start, end = date(2024, 12, 4), date(2024, 12, 10)  # Wednesday to Tuesday
+    cells = heatmap(db, start, end)
+    assert cells.shape == (7, 2)
+    assert cells[:2, 0].tolist() == [-1, -1]
+    assert cells[2:, 0].tolist() == day_counts(db, start, date(2024, 12, 8)).tolist()
+    assert cells[:2, 1].tolist() == day_counts(db, date(2024, 12, 9), end).tolist()
+    assert cells[2:, 1].tolist() == [-1] * 5
+    assert heatmap(db, end, start).shape == (7, 0)
+
+
+def test_heatmap_reads_rollups(db_connection):
+    """Test that the counts of all habits are read from the rollups, one row per cell."""
+    db = db_connection
+    plan = " ".join(row[3] for row in db.execute(
+        "EXPLAIN QUERY PLAN SELECT day_key, check_offs FROM day_rollups WHERE day_key BETWEEN ? AND ?",
+        (day_key(date(2024, 1, 1)), day_key(date(2024, 12, 31)))))
+    assert "day_rollups" in plan and "check_offs" not in plan.replace("day_rollups", "")
+    assert db.execute("SELECT COUNT(*) FROM day_rollups").fetchone()[0] == len(
+        {row[0] for row in db.execute("SELECT check_off_date FROM check_offs")})
+    assert db.execute("SELECT check_offs FROM week_rollups WHERE week_key = ?",
+                      (week_key(date(2024, 12, 2)),)).fetchone() == (12,)
@@ -0,0 +1,80 @@
+import gzip
+import pytest
+from datetime import date, timedelta
+from database import get_db, check_off_many, fetch_streak_state, iter_check_offs, delete_habits_by_source, habit_sources
+from habit import Habit
+from snapshot import export_snapshot, import_snapshot, read_snapshot
+
+
+@pytest.fixture
+def db_connection():
+    """Fixture for a database with a daily and a weekly habit and gaps in both histories."""
+    db = get_db(":memory:")
+    Habit("Exercise", "Daily workout", "daily", "2024-11-01").store(db)
+    Habit("Study", "Weekly study session", "weekly", "predefined").store(db)
+    Habit("Unused", "Never checked off", "daily", "2024-11-01").store(db)
+    days = [0, 1, 2, 5, 6, 7, 8, 40, 41]
+    check_off_many(db, [("Exercise", date(1969, 12, 25) + timedelta(days=day), f"{day % 24:02}:{day % 60:02}")
+                        for day in days])
+    check_off_many(db, [("Study", date(2024, 11, 11) + timedelta(weeks=week, days=week % 3), "09:30")
+                        for week in (0, 1, 3, 4, 5)])
+    yield db
+    db.close()
+
+
+def test_snapshot_round_trip(db_connection, tmp_path):
+    """Test that an imported snapshot restores habits, check-offs, streak counts and streak state."""
+    db = db_connection
+    path = str(tmp_path / "user.habits")
+    assert export_snapshot(db, path) == {"habits": 3, "check_offs": 14}
+
+    target = get_db(":memory:")
+    assert import_snapshot(target, path) == {"habits": 3, "check_offs": 14, "skipped": []}
+    for table in ("habits", "habit_streak_state"):
+        query = f"SELECT * FROM {table} ORDER BY 1"
+        assert target.execute(query).fetchall() == db.execute(query).fetchall()
+    for name in ("Exercise", "Study", "Unused"):
+        assert list(iter_check_offs(target, name)) == list(iter_check_offs(db, name))
+        assert fetch_streak_state(target, name) == fetch_streak_state(db, name)
+    target.close()
+
+
+def test_snapshot_conflicts(db_connection, tmp_path):
+    """Test that existing habits are skipped or replaced."""
+    db = db_connection
+    path = str(tmp_path / "user.habits")
+    export_snapshot(db, path, habits=["Exercise"])
+
+    target = get_db(":memory:")
+    Habit("Exercise", "Other", "daily", "2024-01-01").store(target)
+    assert import_snapshot(target, path)["skipped"] == ["Exercise"]
+    assert import_snapshot(target, path, on_conflict="replace")["check_offs"] == 9
+    assert target.execute("SELECT description FROM habits").fetchall() == [("Daily workout",)]
+    target.close()
+
+
+def test_snapshot_import_batch(db_connection, tmp_path):
+    """Test that an import tagged with a batch id can be dropped again as a whole."""
+    path = str(tmp_path / "user.habits")
+    export_snapshot(db_connection, path)
+
+    target = get_db(":memory:")
+    Habit("Own habit", "", "daily").store(target)
+    import_snapshot(target, path, source="batch-1")
+    assert habit_sources(target) == {"batch-1": 3, "user": 1}
+    assert delete_habits_by_source(target, "batch-1") == 3
+    assert target.execute("SELECT COUNT(*) FROM check_offs").fetchone()[0] == 0
+    assert target.execute("SELECT name FROM habits").fetchall() == [("Own habit",)]
+    target.close()
+
+
+def test_truncated_snapshot(db_connection, tmp_path):
+    """Test that a truncated snapshot is rejected."""
+    path = str(tmp_path / "user.habits")
+    export_snapshot(db_connection, path)
+    with gzip.open(path, "rb") as file:
+        data = file.read()
+    with gzip.open(path, "wb") as file:
+        file.write(data[:-3])
+    with pytest.raises(ValueError):
+        list(read_snapshot(path))
@@ -0,0 +1,48 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# the heavy modules the CLI defers until a menu needs them
+DEFERRED = ("numpy", "prettytable", "analyse", "habit")
+# seconds from starting a fresh interpreter until the main menu could be shown, median of STARTS runs; generous so a
+# loaded machine doesn't fail it (a typical start takes well under 0.5 s), HABIT_STARTUP_BUDGET overrides it
+STARTUP_BUDGET = float(os.environ.get("HABIT_STARTUP_BUDGET", "2.0"))
+STARTS = 5
+STARTUP = """
+import json, sys
+import main
+db = main.get_db(sys.argv[1])
+main.load_predefined_habits(db)
+print(json.dumps([name for name in sys.argv[2:] if name in sys.modules]))
+"""
+
+
+def start(db_path):
+    """
+    Run the CLI startup in a fresh interpreter.
+
+    :return: Tuple (wall time in seconds, deferred modules it imported).
+    """
+    begin = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", STARTUP, db_path, *DEFERRED], cwd=REPOSITORY, capture_output=True,
+                            text=True, check=True)
+    return time.perf_counter() - begin, json.loads(result.stdout)
+
+
+def test_cold_start_defers_heavy_modules(tmp_path):
+    """Test that a fresh interpreter reaches the main menu without importing the heavy modules."""
+    db_path = str(tmp_path / "main.db")
+    assert start(db_path)[1] == []  # the very first start creates the database and the predefined habits
+    assert start(db_path)[1] == []
+
+
+def test_cold_start_within_budget(tmp_path):
+    """Test that the median wall time of several fresh-interpreter starts stays within the budget."""
+    db_path = str(tmp_path / "main.db")
+    start(db_path)  # creates the database, not part of the measurement
+    seconds = statistics.median(start(db_path)[0] for _ in range(STARTS))
+    assert seconds < STARTUP_BUDGET, f"median cold start {seconds:.3f} s, budget {STARTUP_BUDGET} s"
@@ -0,0 +1,110 @@
+import os
+import random
+import pytest
+from datetime import date, timedelta
+from database import StorageBackend, get_db, fetch_streak_state, fetch_habit_from_db, iter_check_offs, delete_habit, ALREADY_CHECKED_OFF
+from habit import Habit
+from storage import SQLiteBackend, MmapLogBackend, RECORD
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    """Fixture for the path of a fresh check-off log."""
+    return str(tmp_path / "check_offs.log")
+
+
+def test_log_reopen_rebuilds_index(log_path):
+    """Test that habits, check-offs and streaks survive closing and reopening the log."""
+    backend = MmapLogBackend(log_path)
+    habit = Habit("Study", "Weekly study session", "weekly", "2024-11-01")
+    habit.store(backend)
+    for check_off_date in ("2024-11-11", "2024-11-20", "2024-11-29"):
+        habit.check_off(backend, date.fromisoformat(check_off_date), "09:30")
+    backend.close()
+    assert os.path.getsize(log_path) == 3 * RECORD.size
+
+    backend = MmapLogBackend(log_path)
+    assert fetch_habit_from_db(backend, "Study") == ("Study", "Weekly study session", "weekly", "2024-11-01")
+    assert fetch_streak_state(backend, "Study")[0] == 3
+    assert [row[:2] for row in iter_check_offs(backend, "Study")] == [("2024-11-11", "09:30"), ("2024-11-20", "09:30"),
+                                                                       ("2024-11-29", "09:30")]
+    assert habit.check_off(backend, date(2024, 11, 28), "10:00")["status"] == ALREADY_CHECKED_OFF
+    backend.close()
+
+
+def test_log_truncates_partial_record(log_path):
+    """Test that a torn write at the end of the log is dropped on open."""
+    backend = MmapLogBackend(log_path)
+    Habit("Exercise", "Daily workout", "daily").store(backend)
+    Habit("Exercise", "Daily workout", "daily").check_off(backend, date(2024, 12, 1), "08:00")
+    backend.close()
+    with open(log_path, "ab") as file:
+        file.write(b"\x00\x01\x02")
+
+    backend = MmapLogBackend(log_path)
+    assert os.path.getsize(log_path) == RECORD.size
+    assert len(list(iter_check_offs(backend, "Exercise"))) == 1
+    backend.close()
+
+
+def test_log_delete_habit(log_path):
+    """Test that a deleted habit's check-offs are gone, also for a new habit with the same name."""
+    backend = MmapLogBackend(log_path)
+    habit = Habit("Exercise", "Daily workout", "daily")
+    habit.store(backend)
+    habit.check_off(backend, date(2024, 12, 1), "08:00")
+    delete_habit(backend, "Exercise")
+    habit.store(backend)
+    backend.close()
+
+    backend = MmapLogBackend(log_path)
+    assert fetch_streak_state(backend, "Exercise") is None
+    assert list(iter_check_offs(backend, "Exercise")) == []
+    backend.close()
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_out_of_order_check_offs_match_sqlite(log_path, seed):
+    """Test that random out-of-order check-offs give the same streaks in the log and in SQLite."""
+    rng = random.Random(seed)
+    backends = [SQLiteBackend(get_db(":memory:")), MmapLogBackend(log_path)]
+    habits = [Habit("Daily", "", "daily", "2024-01-01"), Habit("Weekly", "", "weekly", "2024-01-01")]
+    days = [date(2024, 1, 1) + timedelta(days=rng.randrange(120)) for _ in range(80)]
+    for backend in backends:
+        for habit in habits:
+            habit.store(backend)
+    for day in days:
+        habit = rng.choice(habits)
+        results = [habit.check_off(backend, day, "08:00") for backend in backends]
+        assert results[0] == results[1]
+    for habit in habits:
+        assert fetch_streak_state(backends[0], habit.name) == fetch_streak_state(backends[1], habit.name)
+        assert list(iter_check_offs(backends[0], habit.name)) == list(iter_check_offs(backends[1], habit.name))
+    for backend in backends:
+        backend.close()
+
+
+def test_storage_backend_is_abstract():
+    """Test that a backend has to implement the whole interface."""
+    class Partial(StorageBackend):
+        def habit(self, name):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_check_off_with_seconds(log_path):
+    """Test that HH:MM:SS check-off times work in both backends, the log keeps them to the minute."""
+    backends = [SQLiteBackend(get_db(":memory:")), MmapLogBackend(log_path)]
+    habit = Habit("Exercise", "Daily workout", "daily", "2024-12-01")
+    for backend in backends:
+        habit.store(backend)
+        habit.check_off(backend, date(2024, 12, 1), "07:30:45")
+        assert habit.check_off(backend, date(2024, 12, 2), "23:59:59")["streak_count"] == 2
+    assert [row[:2] for row in iter_check_offs(backends[0], "Exercise")] == [("2024-12-01", "07:30:45"),
+                                                                            ("2024-12-02", "23:59:59")]
+    assert [row[:2] for row in iter_check_offs(backends[1], "Exercise")] == [("2024-12-01", "07:30"),
+                                                                            ("2024-12-02", "23:59")]
+    for backend in backends:
+        backend.close()
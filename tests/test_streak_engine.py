@@ -0,0 +1,73 @@
+import random
+import numpy as np
+import pytest
+from datetime import date, timedelta
+from habit import Habit
+from database import get_db, check_off_many, fetch_streak_state, key_to_date
+from analyse import hyper_streak_daily, hyper_streak_weekly
+from streak_engine import load_period_keys, compute_streaks, streak_summary, hyper_streaks
+
+
+@pytest.fixture
+def db_connection():
+    """Fixture for an in-memory database with random daily and weekly histories."""
+    db = get_db(":memory:")
+    rng = random.Random(7)
+    records = []
+    for number in range(20):
+        periodicity = "daily" if number % 2 else "weekly"
+        step = timedelta(days=1) if periodicity == "daily" else timedelta(weeks=1)
+        Habit(f"Habit {number}", "random history", periodicity).store(db)
+        records.extend((f"Habit {number}", date(2024, 1, 1) + i * step, "08:00") for i in range(80) if rng.random() < 0.75)
+    check_off_many(db, records)
+    yield db
+    db.close()
+
+
+def test_compute_streaks():
+    """Test run-length encoding on hand-made arrays."""
+    habit_ids = np.array([0, 0, 0, 0, 1, 1, 1])
+    keys = np.array([1, 2, 4, 5, 10, 11, 12])
+    streaks = compute_streaks(habit_ids, keys)
+    assert streaks["run_length"].tolist() == [2, 2, 3]
+    assert streaks["run_end"].tolist() == [2, 5, 12]
+    assert streaks["longest"].tolist() == [2, 3]
+    assert streaks["longest_end"].tolist() == [5, 12]
+    assert streaks["longest_ties"].tolist() == [2, 1]
+    assert streaks["last_run"].tolist() == [2, 3]
+    assert streaks["check_offs"].tolist() == [4, 3]
+
+
+def test_load_period_keys_empty():
+    """Test loading from an empty database."""
+    db = get_db(":memory:")
+    names, habit_ids, keys = load_period_keys(db)
+    assert names == [] and len(habit_ids) == 0 and len(keys) == 0
+    assert hyper_streaks(db, "daily") is None
+    db.close()
+
+
+def test_streak_summary_matches_streak_state(db_connection):
+    """Test that the vectorized streaks agree with the incrementally maintained streak state."""
+    db = db_connection
+    summary = streak_summary(db, today=date(2024, 3, 1))
+    assert len(summary) == 20
+    for entry in summary:
+        current, last_key, longest, longest_end, ties = fetch_streak_state(db, entry["habit"])
+        assert entry["longest_streak"] == longest
+        assert entry["longest_streak_end"] == key_to_date(longest_end, entry["periodicity"])
+        assert entry["longest_streak_ties"] == ties
+        assert 0 < entry["completion_rate"] <= 1
+
+    # ranked by longest streak
+    longest_streaks = [entry["longest_streak"] for entry in summary]
+    assert longest_streaks == sorted(longest_streaks, reverse=True)
+    assert len(streak_summary(db, periodicity="weekly", limit=3)) == 3
+
+
+def test_hyper_streaks_match_analyse(db_connection):
+    """Test that the engine finds the same record streaks as the SQL implementation."""
+    db = db_connection
+    key = lambda entry: (entry["last_date"], entry["habit"])
+    assert sorted(hyper_streaks(db, "daily"), key=key) == sorted(hyper_streak_daily(db), key=key)
+    assert sorted(hyper_streaks(db, "weekly"), key=key) == sorted(hyper_streak_weekly(db), key=key)
@@ -0,0 +1,86 @@
+import pytest
+from datetime import date
+from database import get_db, add_habit, check_off_many, habit_sources
+from synthetic import load_synthetic_data, delete_synthetic_data, synthetic_habits, STREAK_DISTRIBUTIONS
+
+END = date(2024, 12, 31)
+CHECK_OFFS = ("SELECT name, check_off_date, check_off_time, period_key, streak_day_count, streak_week_count "
+              "FROM check_offs JOIN habits USING (habit_id) ORDER BY name, period_key")
+STREAK_STATE = ("SELECT name, current_streak, last_period_key, longest_streak, longest_streak_end, longest_streak_ties "
+                "FROM habit_streak_state JOIN habits USING (habit_id) ORDER BY name")
+
+
+@pytest.fixture
+def db_connection():
+    """Fixture for an in-memory database with one user habit."""
+    db = get_db(":memory:")
+    add_habit(db, "Exercise", "Daily workout", "daily", "2024-01-01")
+    yield db
+    db.close()
+
+
+def test_load_synthetic_data_is_reproducible(db_connection):
+    """Test that the same seed gives the same dataset and a different seed a different one."""
+    db = db_connection
+    loaded = load_synthetic_data(db, habits=20, years=1, seed=3, end=END)
+    other = get_db(":memory:")
+    assert load_synthetic_data(other, habits=20, years=1, seed=3, end=END) == loaded
+    assert other.execute(CHECK_OFFS).fetchall() == db.execute(CHECK_OFFS).fetchall()
+    reseeded = get_db(":memory:")
+    load_synthetic_data(reseeded, habits=20, years=1, seed=4, end=END)
+    assert reseeded.execute(CHECK_OFFS).fetchall() != db.execute(CHECK_OFFS).fetchall()
+    other.close()
+    reseeded.close()
+
+
+@pytest.mark.parametrize("distribution", sorted(STREAK_DISTRIBUTIONS))
+def test_synthetic_streaks_match_check_off_path(db_connection, distribution):
+    """Test that the vectorized streak counts and streak states equal those of check_off_many."""
+    db = db_connection
+    loaded = load_synthetic_data(db, habits=30, years=2, seed=1, end=END, distribution=distribution, chunk_size=7)
+    assert db.execute("SELECT COUNT(*) FROM check_offs JOIN habits USING (habit_id) WHERE source = 'synthetic'"
+                      ).fetchone()[0] == loaded["check_offs"]
+
+    replayed = get_db(":memory:")
+    add_habit(replayed, "Exercise", "Daily workout", "daily", "2024-01-01")
+    for name, description, periodicity, create_date in db.execute(
+            "SELECT name, description, periodicity, create_date FROM habits WHERE source = 'synthetic'"):
+        add_habit(replayed, name, description, periodicity, create_date)
+    check_off_many(replayed, db.execute("SELECT name, check_off_date, check_off_time FROM check_offs "
+                                        "JOIN habits USING (habit_id)").fetchall())
+    assert replayed.execute(CHECK_OFFS).fetchall() == db.execute(CHECK_OFFS).fetchall()
+    assert replayed.execute(STREAK_STATE).fetchall() == db.execute(STREAK_STATE).fetchall()
+    replayed.close()
+
+
+def test_synthetic_adherence(db_connection):
+    """Test that the share of checked-off periods follows the adherence and weekly habits get one per week."""
+    db = db_connection
+    habits = synthetic_habits(200, seed=2, weekly_share=0.5, adherence=0.6)
+    assert 70 < habits["periodicities"].count("weekly") < 130
+    load_synthetic_data(db, habits=200, years=2, seed=2, end=END, weekly_share=0.5, adherence=0.6)
+    periods = {"daily": END.toordinal() - date(2023, 1, 1).toordinal() + 1, "weekly": 105}
+    for periodicity in ("daily", "weekly"):
+        habit_count, check_offs = db.execute(
+            "SELECT COUNT(DISTINCT habit_id), COUNT(*) FROM check_offs JOIN habits USING (habit_id) "
+            "WHERE source = 'synthetic' AND periodicity = ?", (periodicity,)).fetchone()
+        assert 0.5 < check_offs / habit_count / periods[periodicity] < 0.7
+    assert db.execute("SELECT MIN(check_off_date), MAX(check_off_date) FROM check_offs JOIN habits USING (habit_id) "
+                      "WHERE source = 'synthetic'").fetchone() >= ("2023-01-01", "2024-12-31")
+
+
+def test_delete_synthetic_data(db_connection):
+    """Test that a loaded source can't be loaded twice and its deletion keeps the other habits."""
+    db = db_connection
+    check_off_many(db, [("Exercise", "2024-01-02", "08:00")])
+    load_synthetic_data(db, habits=10, years=1, end=END)
+    with pytest.raises(ValueError):
+        load_synthetic_data(db, habits=10, years=1, end=END)
+    load_synthetic_data(db, habits=5, years=1, end=END, source="synthetic-2")
+    assert habit_sources(db) == {"user": 1, "synthetic": 10, "synthetic-2": 5}
+
+    assert delete_synthetic_data(db) == 10
+    assert habit_sources(db) == {"user": 1, "synthetic-2": 5}
+    assert db.execute("SELECT COUNT(*) FROM habit_streak_state").fetchone()[0] == 6
+    assert db.execute("SELECT COUNT(*) FROM check_offs WHERE habit_id NOT IN (SELECT habit_id FROM habits)"
+                      ).fetchone()[0] == 0